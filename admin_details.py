@@ -0,0 +1,95 @@
+"""
+Aggregated loaders for the admin user and system detail pages.
+
+The listing views look up each row's login, license and user one query at
+a time. A detail page shows everything about one user or one machine, so
+it is loaded in two joined queries instead:
+
+1. the user (or the machine logins for a MAC) outer-joined to machine
+   logins and the license on each login's fingerprint;
+2. the registered machines for those logins outer-joined to their active
+   sessions.
+
+Session and event history grows without bound and is not part of the
+page; the templates fetch it lazily in keyset pages (``session_history``
+and ``event_log.timeline``).
+"""
+
+from sqlalchemy import and_
+from sqlalchemy.orm import selectinload
+
+from models import db, User, Machine, MachineLogin, License, UserSession
+from pagination import newest_first
+
+
+def _with_components(query, include_components):
+    if include_components:
+        query = query.options(
+            selectinload(MachineLogin.component_set),
+            selectinload(License.component_set),
+        )
+    return query
+
+
+def _machines_with_sessions(criterion):
+    """[(machine, [active sessions])] for the matching machines, in one query"""
+    rows = db.session.query(Machine, UserSession).outerjoin(UserSession, and_(
+        UserSession.machine_id == Machine.machine_id,
+        UserSession.user_id == Machine.user_id,
+        UserSession.is_active.is_(True)
+    )).filter(criterion).order_by(Machine.last_seen.desc(), UserSession.last_activity.desc())
+
+    machines = {}
+    for machine, session in rows:
+        sessions = machines.setdefault(machine.id, (machine, []))[1]
+        if session is not None:
+            sessions.append(session)
+    return list(machines.values())
+
+
+def user_detail(user_id, include_components=False):
+    """User with logins, licenses, machines and active sessions; None if no such user"""
+    rows = _with_components(db.session.query(User, MachineLogin, License), include_components).outerjoin(
+        MachineLogin, MachineLogin.user_id == User.id
+    ).outerjoin(
+        License, License.machine_fingerprint == MachineLogin.machine_fingerprint
+    ).filter(User.id == user_id).order_by(MachineLogin.last_activity.desc()).all()
+    if not rows:
+        return None
+
+    return {
+        'user': rows[0][0],
+        'logins': [(login, license) for _, login, license in rows if login is not None],
+        'machines': _machines_with_sessions(Machine.user_id == user_id),
+    }
+
+
+def system_detail(mac_address, include_components=False):
+    """Logins on a MAC (newest first) with their users and licenses; None if never seen"""
+    rows = _with_components(db.session.query(MachineLogin, User, License), include_components).join(
+        User, User.id == MachineLogin.user_id
+    ).outerjoin(
+        License, License.machine_fingerprint == MachineLogin.machine_fingerprint
+    ).filter(MachineLogin.mac_address == mac_address).order_by(MachineLogin.last_activity.desc()).all()
+    if not rows:
+        return None
+
+    machine_ids = [login.machine_id for login, _, _ in rows]
+    return {
+        'logins': [(login, license) for login, _, license in rows],
+        'users': {user.id: user for _, user, _ in rows},
+        'machine_ids': machine_ids,
+        'machines': _machines_with_sessions(Machine.machine_id.in_(machine_ids)),
+    }
+
+
+def active_license(logins):
+    """First active license among (login, license) pairs, else the first license"""
+    licenses = [license for _, license in logins if license is not None]
+    return next((l for l in licenses if l.is_active), licenses[0] if licenses else None)
+
+
+def session_history(criterion, before=None, limit=50):
+    """Newest-first sessions matching `criterion`, after cursor `before`"""
+    query = newest_first(UserSession.query.filter(criterion), UserSession.logged_in_at, UserSession.id, before)
+    return query.limit(limit).all()
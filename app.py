@@ -2,15 +2,26 @@ import os
 from flask import Flask, jsonify
 from flask_cors import CORS
 from config import config
-from models import db
+from models import db, ScheduledJob
 import routes_auth
 import routes_users
 import routes_machines
 import routes_admin
 import routes_subscriptions
 import routes_otp
-import email_worker 
+from email_worker import start_email_worker
+from heartbeat import heartbeat_buffer
+from event_log import event_log
+from license_notifier import license_notifier
+from auth_tokens import revocation_filter
+from scheduler import scheduler
+import jobs  # registers the periodic jobs with the scheduler
+from cli import register_commands
 from request_logger import setup_request_logging
+from profiler import setup_profiling
+from wire_format import setup_wire_format
+from statement_budget import setup_statement_budgets, timeout_counts
+from db_routing import setup_db_routing, pool_stats, replica_monitor
 
 def create_app(config_name='production'):
     app = Flask(__name__)
@@ -20,6 +31,7 @@ def create_app(config_name='production'):
     
     # Initialize database
     db.init_app(app)
+    setup_db_routing(app, db)
     
     # Secure CORS
     CORS(
@@ -31,9 +43,21 @@ def create_app(config_name='production'):
     # Setup logging
     setup_request_logging(app)
     
-    # Create tables (dev only)
-    with app.app_context():
-        db.create_all()
+    # Opt-in profiling (no hooks unless configured)
+    setup_profiling(app)
+    
+    # JSON by default; MessagePack / CBOR for clients that ask
+    setup_wire_format(app)
+    
+    # Per-blueprint statement timeouts; overruns become 503s
+    setup_statement_budgets(app)
+    
+    # Schema is managed by `flask init-db`; AUTO_CREATE_TABLES keeps the old dev behaviour
+    if app.config.get("AUTO_CREATE_TABLES"):
+        with app.app_context():
+            db.create_all()
+    
+    register_commands(app)
     
     # Register blueprints
     app.register_blueprint(routes_auth.bp)
@@ -48,6 +72,32 @@ def create_app(config_name='production'):
     def health():
         return jsonify({'status': 'healthy'}), 200
     
+    # Database pools and replica health
+    @app.route('/health/db', methods=['GET'])
+    def health_db():
+        return jsonify({
+            'engines': pool_stats(db),
+            'replicas': replica_monitor.status(),
+            'statement_timeouts': timeout_counts(),
+            'event_log': {'pending': event_log.pending(), 'dropped': event_log.dropped}
+        }), 200
+    
+    # Periodic jobs: last run of each (from any worker) and this worker's role
+    @app.route('/health/jobs', methods=['GET'])
+    def health_jobs():
+        try:
+            rows = {row.name: row for row in ScheduledJob.query.all()}
+            return jsonify({
+                'worker': scheduler.status(),
+                'jobs': [
+                    dict(rows[name].to_dict() if name in rows else {'name': name},
+                         schedule=str(job.schedule), timeout=job.timeout)
+                    for name, job in sorted(scheduler.jobs.items())
+                ]
+            }), 200
+        except Exception:
+            return jsonify({'error': 'Job state unavailable'}), 500
+    
     # Home
     @app.route('/')
     def index():
@@ -55,11 +105,28 @@ def create_app(config_name='production'):
     
     return app
 
-# 🔥 REQUIRED FOR RENDER
+def init_worker(app):
+    """Per-process startup, called after fork (see gunicorn.conf.py)"""
+    # Never share pooled connections inherited from the master
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    
+    start_email_worker()
+    heartbeat_buffer.start_flusher(app)
+    event_log.start_writer(app)
+    license_notifier.start_listener(app)
+    revocation_filter.start_refresher(app)
+    scheduler.start(app)
+
+# 🔥 REQUIRED FOR RENDER (no I/O happens here)
 app = create_app()
 
 # Local only
 if __name__ == '__main__':
     env = os.getenv("FLASK_ENV", "development")
+    with app.app_context():
+        db.create_all()
+    init_worker(app)
     app.run(host='0.0.0.0', port=5000, debug=True)
 
@@ -0,0 +1,293 @@
+"""
+Stateless access tokens, persisted refresh tokens and a revocation filter.
+
+Access tokens are ``base64url(claims).base64url(HMAC-SHA256)`` and are
+verified without touching the database. Refresh tokens are random and
+stored (hashed) in ``user_sessions.login_token``. Sessions revoked or users
+deactivated within the access-token lifetime are kept in a Bloom filter
+that each worker rebuilds from a background thread every few seconds; a filter
+hit is confirmed against the database, a miss costs nothing. Deleted users
+leave no rows for the filter to find, so token_auth also loads the user
+(a primary-key read the view's own lookup then gets from the identity map).
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+from sqlalchemy import select
+
+from models import db, User, UserSession
+
+logger = logging.getLogger(__name__)
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _secret():
+    config = current_app.config
+    return (config.get('TOKEN_SECRET') or config['SECRET_KEY']).encode()
+
+
+def hash_refresh_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+# =========================
+# Access tokens
+# =========================
+def issue_access_token(user_id, session_id):
+    ttl = current_app.config.get('ACCESS_TOKEN_SECONDS', 900)
+    now = int(time.time())
+    claims = {'sub': str(user_id), 'sid': str(session_id), 'iat': now, 'exp': now + ttl}
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    signature = _b64encode(hmac.new(_secret(), payload.encode(), hashlib.sha256).digest())
+    return f"{payload}.{signature}", ttl
+
+
+def verify_access_token(token):
+    """Claims dict if the token is authentic, unexpired and not revoked; else None"""
+    try:
+        payload, signature = token.split('.')
+        expected = hmac.new(_secret(), payload.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+
+    if claims.get('exp', 0) < time.time():
+        return None
+
+    if revocation_filter.is_revoked(claims['sid'], claims['sub']):
+        return None
+
+    return claims
+
+
+# =========================
+# Refresh tokens / sessions
+# =========================
+def create_session(user, data):
+    """Persist a UserSession holding a new refresh token; returns (session, refresh_token)"""
+    refresh_token = secrets.token_urlsafe(32)
+    session = UserSession(
+        user_id=user.id,
+        machine_id=data.get('machine_id') or 'unknown',
+        machine_name=data.get('machine_name') or 'unknown',
+        mac_address=data.get('mac_address') or '',
+        os_name=data.get('os_name'),
+        os_version=data.get('os_version'),
+        login_token=hash_refresh_token(refresh_token),
+    )
+    db.session.add(session)
+    db.session.flush()
+    return session, refresh_token
+
+
+def rotate_refresh_token(refresh_token):
+    """Swap a valid refresh token for a new one; returns (session, new_token) or (None, None)"""
+    days = current_app.config.get('REFRESH_TOKEN_DAYS', 30)
+    # Deactivated users leave the revocation filter after one access-token
+    # lifetime; their refresh tokens must stop working for good
+    session = UserSession.query.join(User, User.id == UserSession.user_id).filter(
+        UserSession.login_token == hash_refresh_token(refresh_token),
+        UserSession.is_active.is_(True),
+        User.is_active.is_(True)
+    ).first()
+
+    if not session or session.last_activity < datetime.utcnow() - timedelta(days=days):
+        return None, None
+
+    new_token = secrets.token_urlsafe(32)
+    session.login_token = hash_refresh_token(new_token)
+    session.last_activity = datetime.utcnow()
+    return session, new_token
+
+
+def revoke_session(session_id):
+    session = db.session.get(UserSession, uuid.UUID(str(session_id)))
+    if session and session.is_active:
+        session.is_active = False
+        session.logged_out_at = datetime.utcnow()
+        session.login_token = None
+    revocation_filter.add(session_id=session_id)
+    return session
+
+
+def revoke_user_sessions(user_criteria):
+    """End every active session of the users matching `user_criteria` (caller commits)"""
+    for user_id in db.session.scalars(select(User.id).where(*user_criteria)):
+        revocation_filter.add(user_id=user_id)
+    return UserSession.query.filter(
+        UserSession.is_active.is_(True),
+        UserSession.user_id.in_(select(User.id).where(*user_criteria))
+    ).update({
+        UserSession.is_active: False,
+        UserSession.logged_out_at: datetime.utcnow(),
+        UserSession.login_token: None,
+    }, synchronize_session=False)
+
+
+# =========================
+# Revocation filter
+# =========================
+class BloomFilter:
+    def __init__(self, bits=1 << 16, hashes=4):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray(bits // 8)
+
+    def _positions(self, key):
+        digest = hashlib.sha256(key.encode()).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 4:i * 4 + 4], 'big') % self.bits
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self._array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationFilter:
+    """Per-worker Bloom filter of recently revoked sessions and deactivated users"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter()
+        self._refreshed_at = 0.0
+        self._refresher_pid = None
+
+    def add(self, session_id=None, user_id=None):
+        with self._lock:
+            if session_id:
+                self._bloom.add(f"s:{session_id}")
+            if user_id:
+                self._bloom.add(f"u:{user_id}")
+
+    def refresh(self):
+        """Rebuild from everything revoked within one access-token lifetime"""
+        window = current_app.config.get('ACCESS_TOKEN_SECONDS', 900)
+        since = datetime.utcnow() - timedelta(seconds=window)
+
+        bloom = BloomFilter()
+        for (session_id,) in db.session.query(UserSession.id).filter(
+            UserSession.is_active.is_(False),
+            UserSession.logged_out_at >= since
+        ):
+            bloom.add(f"s:{session_id}")
+        for (user_id,) in db.session.query(User.id).filter(
+            User.is_active.is_(False),
+            User.updated_at >= since
+        ):
+            bloom.add(f"u:{user_id}")
+
+        with self._lock:
+            self._bloom = bloom
+            self._refreshed_at = time.monotonic()
+
+    def start_refresher(self, app):
+        """Start the rebuild thread once per process (safe to call after fork)"""
+        with self._lock:
+            if self._refresher_pid == os.getpid():
+                return
+            self._refresher_pid = os.getpid()
+
+        interval = app.config.get('TOKEN_REVOCATION_REFRESH_SECONDS', 30)
+
+        def run():
+            while True:
+                with app.app_context():
+                    try:
+                        self.refresh()
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error(f"Revocation filter refresh failed: {e}")
+                    finally:
+                        db.session.remove()
+                time.sleep(interval)
+
+        threading.Thread(target=run, name="revocation-refresher", daemon=True).start()
+
+    def is_revoked(self, session_id, user_id):
+        # Without the refresher (CLI, scripts) rebuild inline, at most once per interval
+        interval = current_app.config.get('TOKEN_REVOCATION_REFRESH_SECONDS', 30)
+        if self._refresher_pid != os.getpid() and time.monotonic() - self._refreshed_at > interval:
+            try:
+                self.refresh()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Revocation filter refresh failed: {e}")
+                # Back off: a failing database must not cost every request a rebuild
+                self._refreshed_at = time.monotonic()
+
+        if f"s:{session_id}" not in self._bloom and f"u:{user_id}" not in self._bloom:
+            return False
+
+        # Possible hit (Bloom filters have false positives): confirm in the DB
+        session = db.session.get(UserSession, uuid.UUID(session_id))
+        user = db.session.get(User, uuid.UUID(user_id))
+        return not (session and session.is_active and user and user.is_active)
+
+# Singleton instance
+revocation_filter = RevocationFilter()
+
+
+# =========================
+# View decorator
+# =========================
+def token_auth(view):
+    """
+    Authenticate with `Authorization: Bearer <access token>`.
+
+    Sets g.user_id (UUID) and g.session_id. Without a header the request
+    falls through to the legacy user_id parameter while ALLOW_LEGACY_USER_ID
+    is on.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        header = request.headers.get('Authorization', '')
+        g.authenticated = False
+
+        if header.startswith('Bearer '):
+            claims = verify_access_token(header[7:].strip())
+            if claims is None:
+                return jsonify({'error': 'Invalid or expired token'}), 401
+            user_id = uuid.UUID(claims['sub'])
+            if db.session.get(User, user_id) is None:
+                return jsonify({'error': 'Invalid or expired token'}), 401
+            g.authenticated = True
+            g.user_id = user_id
+            g.session_id = claims['sid']
+        elif not current_app.config.get('ALLOW_LEGACY_USER_ID', True):
+            return jsonify({'error': 'Authorization required'}), 401
+
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def request_user_id(legacy_value):
+    """The token's user when authenticated, else the legacy user_id parameter"""
+    if g.get('authenticated'):
+        return g.user_id
+    return legacy_value
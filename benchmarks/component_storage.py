@@ -0,0 +1,219 @@
+"""
+Fingerprint component storage benchmark: inline JSON vs content-addressed sets.
+
+Simulates N machines, each with a license row and a machine login row
+carrying the same fingerprint_components. Lab machines share hardware, so
+machine i uses the component set of template i mod (N * --distinct). Both
+layouts are loaded in scratch tables and then take --reactivations
+re-activations, of which --changed carry drifted components:
+
+* inline: the components JSON on both rows, rewritten when it changes
+  (what the ORM did before migration 0008).
+* addressed: a 32-byte components_hash on both rows and one
+  fingerprint_component_sets row per distinct payload; a changed payload
+  inserts its set if missing and rewrites only the hash.
+
+Reports table size (all tables of the layout) and write volume (statements
+and bytes of bound parameters) for the load and the re-activations.
+
+    python benchmarks/component_storage.py --machines 200000 [--distinct 0.1] [--db-url postgresql://...]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import JSON, Column, Integer, MetaData, Table, create_engine, event, text
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import drift, fingerprint, fingerprint_components
+
+CHUNK = 20000
+
+
+def layouts():
+    from models import Fingerprint
+
+    metadata = MetaData()
+
+    def rows_table(name, column):
+        return Table(name, metadata,
+                     Column('id', Integer, primary_key=True),
+                     Column('machine_fingerprint', Fingerprint, nullable=False),
+                     column)
+
+    return {
+        'inline': {
+            'licenses': rows_table('cs_bench_inline_licenses', Column('fingerprint_components', JSON)),
+            'machine_logins': rows_table('cs_bench_inline_logins', Column('fingerprint_components', JSON)),
+        },
+        'addressed': {
+            'licenses': rows_table('cs_bench_addressed_licenses', Column('components_hash', Fingerprint)),
+            'machine_logins': rows_table('cs_bench_addressed_logins', Column('components_hash', Fingerprint)),
+            'sets': Table('cs_bench_sets', metadata,
+                          Column('components_hash', Fingerprint, primary_key=True),
+                          Column('components', JSON, nullable=False)),
+        },
+    }
+
+
+class WriteMeter:
+    """Counts write statements and the bytes of their bound parameters"""
+
+    def __init__(self, engine):
+        self.statements = 0
+        self.bytes = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(("INSERT", "UPDATE")):
+            return
+        rows = parameters if executemany else [parameters]
+        self.statements += len(rows)
+        for row in rows:
+            values = row.values() if isinstance(row, dict) else row
+            self.bytes += sum(len(v) if isinstance(v, (str, bytes)) else 8 for v in values if v is not None)
+
+    def take(self):
+        counts = {'statements': self.statements, 'param_mb': round(self.bytes / 2**20, 2)}
+        self.statements = self.bytes = 0
+        return counts
+
+
+def relation_bytes(conn, tables):
+    if conn.dialect.name == 'postgresql':
+        return sum(
+            conn.execute(text("SELECT pg_total_relation_size(:name)"), {'name': t.name}).scalar()
+            for t in tables
+        )
+    # One SQLite file per layout: the file is the layout
+    pages = conn.exec_driver_sql("PRAGMA page_count").scalar()
+    return pages * conn.exec_driver_sql("PRAGMA page_size").scalar()
+
+
+def upsert_sets(conn, table, payloads):
+    if conn.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    conn.execute(insert(table).on_conflict_do_nothing(index_elements=['components_hash']), [
+        {'components_hash': digest, 'components': components}
+        for digest, components in sorted(payloads.items())
+    ])
+
+
+def load(conn, name, tables, machines, templates):
+    from component_sets import components_digest
+
+    for start in range(0, machines, CHUNK):
+        ids = range(start, min(start + CHUNK, machines))
+        if name == 'inline':
+            rows = [{'id': i, 'machine_fingerprint': fingerprint(i),
+                     'fingerprint_components': templates[i % len(templates)]} for i in ids]
+        else:
+            payloads = {components_digest(templates[i % len(templates)]): templates[i % len(templates)] for i in ids}
+            upsert_sets(conn, tables['sets'], payloads)
+            rows = [{'id': i, 'machine_fingerprint': fingerprint(i),
+                     'components_hash': components_digest(templates[i % len(templates)])} for i in ids]
+        conn.execute(tables['licenses'].insert(), rows)
+        conn.execute(tables['machine_logins'].insert(), rows)
+
+
+def reactivate(conn, name, tables, machine, before, components):
+    """One re-activation of `machine` sending `components`"""
+    from component_sets import components_digest
+
+    licenses = tables['licenses']
+    if name == 'inline':
+        if before != components:
+            conn.execute(licenses.update().where(licenses.c.id == machine).values(fingerprint_components=components))
+    else:
+        digest = components_digest(components)
+        if components_digest(before) != digest:
+            upsert_sets(conn, tables['sets'], {digest: components})
+            conn.execute(licenses.update().where(licenses.c.id == machine).values(components_hash=digest))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--machines", type=int, default=200_000)
+    parser.add_argument("--distinct", type=float, default=0.1, help="distinct component sets per machine")
+    parser.add_argument("--reactivations", type=int, default=20000)
+    parser.add_argument("--changed", type=float, default=0.1, help="share of re-activations with drifted components")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-url", help="database to use (default: temporary SQLite)")
+    args = parser.parse_args()
+
+    from component_sets import canonical_json
+
+    rng = random.Random(args.seed)
+    templates = [fingerprint_components(rng, t) for t in range(max(int(args.machines * args.distinct), 1))]
+    plan = [rng.randrange(args.machines) for _ in range(args.reactivations)]
+    drifted = [rng.random() < args.changed for _ in plan]
+
+    tmp = tempfile.TemporaryDirectory()
+    results = {
+        'machines': args.machines,
+        'distinct_sets': len(templates),
+        'reactivations': args.reactivations,
+        # Left out of every response that does not ask for ?expand=components
+        'components_json_bytes_avg': round(sum(len(canonical_json(t)) for t in templates) / len(templates)),
+    }
+
+    for name, tables in layouts().items():
+        engine = create_engine(args.db_url or f"sqlite:///{os.path.join(tmp.name, name + '.db')}")
+        for table in tables.values():
+            table.drop(engine, checkfirst=True)
+            table.create(engine)
+        meter = WriteMeter(engine)
+
+        with engine.begin() as conn:
+            t0 = time.perf_counter()
+            load(conn, name, tables, args.machines, templates)
+            load_seconds = time.perf_counter() - t0
+        load_writes = meter.take()
+        with engine.connect() as conn:
+            loaded_bytes = relation_bytes(conn, tables.values())
+
+        # Same sequence of payloads for both layouts
+        current = {}
+        payload_rng = random.Random(args.seed + 1)
+        with engine.begin() as conn:
+            t0 = time.perf_counter()
+            for machine, changed in zip(plan, drifted):
+                before = current.get(machine, templates[machine % len(templates)])
+                components = drift(payload_rng, before) if changed else before
+                reactivate(conn, name, tables, machine, before, components)
+                current[machine] = components
+            reactivate_seconds = time.perf_counter() - t0
+        reactivate_writes = meter.take()
+        with engine.connect() as conn:
+            final_bytes = relation_bytes(conn, tables.values())
+
+        results[name] = {
+            'tables_mb_loaded': round(loaded_bytes / 2**20, 1),
+            'tables_mb_after_reactivations': round(final_bytes / 2**20, 1),
+            'load_writes': load_writes,
+            'load_seconds': round(load_seconds, 1),
+            'reactivation_writes': reactivate_writes,
+            'reactivation_seconds': round(reactivate_seconds, 2),
+        }
+
+        if args.db_url:
+            for table in tables.values():
+                table.drop(engine)
+        engine.dispose()
+
+    results['size_ratio'] = round(
+        results['addressed']['tables_mb_loaded'] / max(results['inline']['tables_mb_loaded'], 0.1), 2
+    )
+    print(json.dumps(results, indent=2))
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Deterministic data generator and app factory shared by the benchmarks.
+
+The same seed always produces the same rows, so runs are comparable.
+"""
+
+import hashlib
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CPUS = [f"Intel Core i{g}-{m}" for g in (3, 5, 7, 9) for m in (8100, 9400, 10700, 11800, 12600, 13900)]
+GPUS = [f"NVIDIA GeForce {m}" for m in ("GTX 1050", "GTX 1650", "RTX 2060", "RTX 3060", "RTX 4070")] + ["Intel UHD 630"]
+OS_NAMES = ["Windows 10", "Windows 11", "Ubuntu 22.04", "macOS 14"]
+RAM_SIZES = ["8GB", "16GB", "32GB", "64GB"]
+
+# plan_type -> (weight, duration_days)
+PLAN_MIX = {'trial': (50, 7), '1month': (35, 30), '1year': (15, 365)}
+
+EMAIL_DOMAINS = ["gmail.com", "outlook.com", "lab.edu", "hospital.org", "biotech.io"]
+BENCH_PASSWORD = "bench-password"
+
+
+def create_bench_app(db_url):
+    """Production app bound to db_url, with tables created"""
+    os.environ["DATABASE_URL"] = db_url
+    os.environ.setdefault("DATABASE_REPLICA_URLS", "")
+    os.environ.setdefault("LICENSE_MASTER_KEY", "bench-master-key")
+    from app import create_app
+    from models import db
+
+    app = create_app('production')
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def fingerprint(i, salt=""):
+    return hashlib.sha256(f"machine-{i}{salt}".encode()).hexdigest()
+
+
+def fingerprint_components(rng, i):
+    return {
+        'cpu': rng.choice(CPUS),
+        'gpu': rng.choice(GPUS),
+        'os': rng.choice(OS_NAMES),
+        'ram': rng.choice(RAM_SIZES),
+        'motherboard_serial': f"MB{i:010d}",
+        'disk_serial': f"WD-{rng.getrandbits(48):012X}",
+        'bios_uuid': f"{rng.getrandbits(64):016x}",
+        'mac_address': ":".join(f"{rng.getrandbits(8):02x}" for _ in range(6)),
+    }
+
+
+def drift(rng, components, changes=1):
+    """Copy of components with `changes` hardware parts swapped"""
+    drifted = dict(components)
+    for key in rng.sample(['disk_serial', 'gpu', 'ram', 'mac_address'], changes):
+        drifted[key] = f"replaced-{rng.getrandbits(32):08x}"
+    return drifted
+
+
+def _license_rng(seed, i):
+    # Per-row stream: row i is identical however the rows are chunked
+    return random.Random(f"license-{seed}-{i}")
+
+
+def license_rows(n, seed=42, start=0, now=None):
+    """Yield License column dicts with a realistic plan and expiry mix"""
+    from routes_subscriptions import PLANS
+    from component_sets import components_digest
+
+    now = now or datetime(2026, 1, 1)
+    plans = list(PLAN_MIX)
+    weights = [PLAN_MIX[p][0] for p in plans]
+
+    for i in range(start, start + n):
+        rng = _license_rng(seed, i)
+        components = fingerprint_components(rng, i)
+        plan_type = rng.choices(plans, weights)[0]
+        activated_at = now - timedelta(days=rng.randint(0, 400), seconds=rng.randint(0, 86399))
+        fp = fingerprint(i)
+        yield {
+            'license_id': f"LIC-{i:012X}",
+            'machine_fingerprint': fp,
+            'fingerprint_short': fp[:16],
+            'fingerprint_stability': rng.randint(60, 100),
+            'mac_address': components['mac_address'],
+            'machine_id': f"machine-{i}",
+            'machine_name': f"LAB-PC-{i}",
+            'fingerprint_components': components,
+            'components_hash': components_digest(components),
+            'plan_type': plan_type,
+            'plan_name': PLANS[plan_type]['name'],
+            'plan_price': PLANS[plan_type]['price'],
+            'activated_at': activated_at,
+            'expiry_date': activated_at + timedelta(days=PLAN_MIX[plan_type][1]),
+            'is_active': rng.random() > 0.05,
+        }
+
+
+def user_rows(n, password_hash, seed=42, now=None):
+    """Yield User column dicts; every user shares one precomputed password hash"""
+    rng = random.Random(seed)
+    now = now or datetime(2026, 1, 1)
+    for i in range(n):
+        created_at = now - timedelta(days=rng.randint(0, 700), seconds=rng.randint(0, 86399))
+        yield {
+            'id': uuid.UUID(int=rng.getrandbits(128), version=4),
+            'name': f"User {i}",
+            'email': f"user{i}@{rng.choice(EMAIL_DOMAINS)}",
+            'password_hash': password_hash,
+            'is_active': rng.random() > 0.02,
+            'is_verified': rng.random() > 0.2,
+            'created_at': created_at,
+            'updated_at': created_at,
+        }
+
+
+def machine_login_rows(user_ids, n, seed=42, now=None):
+    """
+    Yield MachineLogin column dicts for machines 0..n-1, so machine i shares
+    its fingerprint and MAC with license i from license_rows().
+    """
+    from component_sets import components_digest
+
+    rng = random.Random(seed)
+    now = now or datetime(2026, 1, 1)
+    for i in range(n):
+        components = fingerprint_components(_license_rng(seed, i), i)
+        fp = fingerprint(i)
+        logged_in_at = now - timedelta(days=rng.randint(0, 365))
+        yield {
+            'machine_id': f"machine-{i}",
+            'mac_address': components['mac_address'],
+            'user_id': user_ids[i % len(user_ids)],
+            'current_email': f"user{i % len(user_ids)}@lab.edu",
+            'machine_fingerprint': fp,
+            'fingerprint_short': fp[:16],
+            'fingerprint_stability': rng.randint(60, 100),
+            'fingerprint_components': components,
+            'components_hash': components_digest(components),
+            'machine_name': f"LAB-PC-{i}",
+            'os_name': components['os'],
+            'logged_in_at': logged_in_at,
+            'last_activity': logged_in_at + timedelta(hours=rng.randint(0, 24 * 60)),
+        }
+
+
+def machine_rows(user_ids, n, seed=42, now=None):
+    rng = random.Random(seed)
+    now = now or datetime(2026, 1, 1)
+    for i in range(n):
+        yield {
+            'user_id': user_ids[i % len(user_ids)],
+            'mac_address': f"02:00:{i >> 24 & 255:02x}:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}",
+            'machine_name': f"LAB-PC-{i}",
+            'machine_id': f"machine-{i}",
+            'os_name': rng.choice(OS_NAMES),
+            'last_seen': now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+        }
+
+
+def seed_database(db, users, licenses, chunk=20000, seed=42):
+    """Bulk-load users, machines, machine logins, licenses and the component index"""
+    from werkzeug.security import generate_password_hash
+    from models import User, Machine, MachineLogin, License, LicenseComponent
+    from fingerprint_index import component_hashes
+    from component_sets import store_component_sets
+
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    user_ids = []
+    batch = []
+    for row in user_rows(users, password_hash, seed=seed):
+        user_ids.append(row['id'])
+        batch.append(row)
+        if len(batch) >= chunk:
+            db.session.execute(User.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(User.__table__.insert(), batch)
+
+    for model, rows in (
+        (Machine, machine_rows(user_ids, licenses, seed=seed)),
+        (MachineLogin, machine_login_rows(user_ids, licenses, seed=seed)),
+    ):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk:
+                db.session.execute(model.__table__.insert(), batch)
+                batch = []
+        if batch:
+            db.session.execute(model.__table__.insert(), batch)
+
+    for start in range(0, licenses, chunk):
+        rows = list(license_rows(min(chunk, licenses - start), seed=seed, start=start))
+        for i, row in enumerate(rows, start):
+            # License i is owned by the user of machine login i
+            row['user_id'] = user_ids[i % len(user_ids)]
+        # Machine login i has the same components as license i
+        store_component_sets({row['components_hash']: row['fingerprint_components'] for row in rows})
+        db.session.execute(License.__table__.insert(), rows)
+        db.session.execute(LicenseComponent.__table__.insert(), [
+            {'component_hash': h, 'license_id': row['license_id']}
+            for row in rows
+            for h in component_hashes(row['fingerprint_components'])
+        ])
+    db.session.commit()
+    return user_ids
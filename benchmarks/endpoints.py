@@ -0,0 +1,215 @@
+"""
+Hot endpoint benchmark suite on seeded datasets.
+
+For each size (number of licenses; users = size / 5, one machine and one
+machine login per license) the database is reset and bulk-loaded with
+datagen, then every hot endpoint is called through the Flask test client
+and timed:
+
+    activate, license lookups by fingerprint / MAC / user, verify, login,
+    OTP send + verify, and each admin page and admin API listing.
+
+    python benchmarks/endpoints.py [--sizes 10000,100000,1000000] [--db postgresql://localhost/bench]
+        [--output results.json] [--baseline benchmarks/baseline.json] [--save-baseline PATH]
+
+Results are JSON. With --baseline every endpoint present in both runs is
+compared: it fails if its p95 grew by more than --threshold percent and
+by more than --min-delta-ms, or if it returned an unexpected status.
+Baselines are machine-specific; regenerate benchmarks/baseline.json on
+the machine that runs the comparison.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import BENCH_PASSWORD, create_bench_app, fingerprint, license_rows, seed_database, user_rows
+
+DEFAULT_SIZES = "10000"
+
+
+# =========================
+# Dataset
+# =========================
+def reset_and_seed(db, licenses, seed):
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    t0 = time.perf_counter()
+    seed_database(db, max(licenses // 5, 100), licenses, seed=seed)
+    return time.perf_counter() - t0
+
+
+class Dataset:
+    """Seeded rows the benchmarks pick from (same seed as the database)"""
+
+    def __init__(self, licenses, seed):
+        self.users = [u for u in user_rows(max(licenses // 5, 100), None, seed=seed) if u['is_active']]
+        self.licenses = list(license_rows(licenses, seed=seed))
+        self.rng = random.Random(seed)
+
+    def license(self):
+        return self.rng.choice(self.licenses)
+
+    def user(self):
+        return self.rng.choice(self.users)
+
+
+# =========================
+# Benchmarks
+# =========================
+def timed_calls(fn, iterations, warmup=5):
+    """Run fn(i) -> ok `iterations` times after a few untimed calls; latency stats in ms"""
+    for i in range(iterations, iterations + warmup):
+        fn(i)  # template compilation, statement cache, page cache
+
+    latencies, errors = [], 0
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        ok = fn(i)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        errors += not ok
+    latencies.sort()
+    return {
+        'count': iterations,
+        'p50_ms': round(latencies[len(latencies) // 2], 2),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        'mean_ms': round(statistics.mean(latencies), 2),
+        'errors': errors,
+    }
+
+
+def endpoint_benchmarks(app, data, size):
+    """name -> (callable(i) -> ok, iterations factor)"""
+    from models import OTP
+
+    client = app.test_client()
+    login = client.post('/api/auth/login', json={'email': data.users[0]['email'], 'password': BENCH_PASSWORD})
+    auth = {'Authorization': f"Bearer {login.get_json()['access_token']}"}
+
+    def get(url, expected=200):
+        return lambda i: client.get(url() if callable(url) else url).status_code == expected
+
+    def activate(i):
+        response = client.post('/api/subscriptions/activate', headers=auth, json={
+            'machine_fingerprint': fingerprint(size + i, salt="-bench"), 'plan_type': 'trial',
+            'machine_id': f"bench-{i}", 'mac_address': f"02:be:00:{i >> 8 & 255:02x}:{i & 255:02x}:01",
+        })
+        return response.status_code == 201
+
+    def user_license():
+        lic = data.license()
+        return f"/api/subscriptions/user/{data.user()['id']}?machine_fingerprint={lic['machine_fingerprint']}"
+
+    def user_login(i):
+        return client.post('/api/auth/login', json={
+            'email': data.user()['email'], 'password': BENCH_PASSWORD
+        }).status_code == 200
+
+    def otp_send(i):
+        return client.post('/api/otp/send-otp', json={'email': f"otp{i}@bench.test"}).status_code == 200
+
+    def otp_verify(i):
+        email = f"otp{i}@bench.test"
+        with app.app_context():
+            code = OTP.query.filter_by(email=email).one().otp_code
+        return client.post('/api/otp/verify-otp', json={'email': email, 'otp': code}).status_code == 200
+
+    pages = max(size // 5 // 10, 1)
+    return {
+        'activate_license': (activate, 1),
+        'lookup_fingerprint': (get(lambda: f"/api/subscriptions/machine/fingerprint/{data.license()['machine_fingerprint']}"), 1),
+        'lookup_mac': (get(lambda: f"/api/subscriptions/machine/{data.license()['mac_address']}"), 1),
+        'lookup_user': (get(user_license), 1),
+        'verify_license': (get(lambda: f"/api/subscriptions/verify/{data.license()['license_id']}"), 1),
+        'login': (user_login, 0.1),  # password hashing dominates
+        'otp_send': (otp_send, 1),
+        'otp_verify': (otp_verify, 1),
+        'admin_dashboard': (get('/admin/dashboard'), 0.5),
+        'admin_users_page': (get(lambda: f"/admin/users?page={data.rng.randint(1, pages)}"), 0.5),
+        'admin_systems_page': (get(lambda: f"/admin/systems?page={data.rng.randint(1, pages)}"), 0.5),
+        'admin_users_search': (get(lambda: f"/admin/users/api?search=user{data.rng.randint(1, 999)}"), 0.5),
+        'admin_machines_search': (get(lambda: f"/admin/machines/api?search=LAB-PC-{data.rng.randint(1, 999)}"), 0.5),
+    }
+
+
+def run_size(app, db, size, iterations, seed):
+    with app.app_context():
+        seed_seconds = reset_and_seed(db, size, seed)
+    data = Dataset(size, seed)
+
+    results = {}
+    for name, (fn, factor) in endpoint_benchmarks(app, data, size).items():
+        results[name] = timed_calls(fn, max(int(iterations * factor), 5))
+    return {'seed_seconds': round(seed_seconds, 1), 'endpoints': results}
+
+
+# =========================
+# Baseline comparison
+# =========================
+def compare(result, baseline, threshold, min_delta_ms):
+    failures, diff = [], {}
+    for size, run in result['sizes'].items():
+        before_run = baseline.get('sizes', {}).get(size, {}).get('endpoints', {})
+        for name, stats in run['endpoints'].items():
+            if stats['errors']:
+                failures.append(f"{size}/{name}: {stats['errors']} unexpected responses")
+            before = before_run.get(name)
+            if not before:
+                continue
+            change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            diff[f"{size}/{name}"] = {'p95_before_ms': before['p95_ms'], 'p95_ms': stats['p95_ms'], 'change_pct': round(change, 1)}
+            if change > threshold and stats['p95_ms'] - before['p95_ms'] > min_delta_ms:
+                failures.append(f"{size}/{name}: p95 {before['p95_ms']} -> {stats['p95_ms']} ms ({change:+.0f}%)")
+    return diff, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated license counts")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="database URL, reset for every size (default: temporary SQLite file)")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline")
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--threshold", type=float, default=30, help="allowed p95 growth in %%")
+    parser.add_argument("--min-delta-ms", type=float, default=2, help="ignore p95 growth smaller than this")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    app = create_bench_app(args.db or f"sqlite:///{os.path.join(tmp.name, 'endpoints.db')}")
+    from models import db
+
+    with app.app_context():
+        dialect = db.engine.dialect.name
+
+    result = {'dialect': dialect, 'seed': args.seed, 'iterations': args.iterations, 'sizes': {}}
+    for size in (int(s) for s in args.sizes.split(",")):
+        result['sizes'][str(size)] = run_size(app, db, size, args.iterations, args.seed)
+
+    failures = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            result['baseline_diff'], failures = compare(result, json.load(f), args.threshold, args.min_delta_ms)
+        result['failures'] = failures
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(result, f, indent=2)
+
+    print(json.dumps(result, indent=2))
+    tmp.cleanup()
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Fingerprint similarity index benchmark.
+
+Loads N generated licenses (with their component index) into a scratch
+SQLite database, then looks up drifted fingerprints with find_similar and
+compares against a linear scan of fingerprint_components.
+
+    python benchmarks/fingerprint_index.py --licenses 1000000 [--db /tmp/fp.db]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import create_bench_app, drift, license_rows
+
+CHUNK = 20000
+
+
+def load(db, n, seed):
+    from models import License, LicenseComponent
+    from fingerprint_index import component_hashes
+    from component_sets import store_component_sets
+
+    t0 = time.perf_counter()
+    for start in range(0, n, CHUNK):
+        rows = list(license_rows(min(CHUNK, n - start), seed=seed, start=start))
+        store_component_sets({row['components_hash']: row['fingerprint_components'] for row in rows})
+        db.session.execute(License.__table__.insert(), rows)
+        db.session.execute(LicenseComponent.__table__.insert(), [
+            {'component_hash': h, 'license_id': row['license_id']}
+            for row in rows
+            for h in component_hashes(row['fingerprint_components'])
+        ])
+        db.session.commit()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--licenses", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scan-sample", type=int, default=20000,
+                        help="licenses scanned to extrapolate the linear-scan cost")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="SQLite file (default: temporary)")
+    args = parser.parse_args()
+
+    tmp = None
+    db_path = args.db
+    if not db_path:
+        tmp = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp.name, "fingerprints.db")
+
+    app = create_bench_app(f"sqlite:///{db_path}")
+    from models import db, License, FingerprintComponentSet
+    from fingerprint_index import find_similar, component_hashes, jaccard
+
+    with app.app_context():
+        load_s = load(db, args.licenses, args.seed)
+
+        rng = random.Random(args.seed)
+        targets = rng.sample(range(args.licenses), min(args.queries, args.licenses))
+        latencies, hits = [], 0
+        for i in targets:
+            original = License.query.filter_by(license_id=f"LIC-{i:012X}").one()
+            query = drift(rng, original.fingerprint_components, changes=rng.choice([1, 2]))
+
+            t0 = time.perf_counter()
+            candidates = find_similar(query)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            hits += bool(candidates) and candidates[0][0].license_id == original.license_id
+
+        # Linear scan over a sample, extrapolated to the full table
+        query_hashes = component_hashes(query)
+        t0 = time.perf_counter()
+        rows = db.session.query(FingerprintComponentSet.components).join(
+            License, License.components_hash == FingerprintComponentSet.components_hash
+        ).limit(args.scan_sample).all()
+        max(jaccard(query_hashes, component_hashes(c)) for (c,) in rows)
+        scan_ms = (time.perf_counter() - t0) * 1000 * args.licenses / max(len(rows), 1)
+
+    latencies.sort()
+    print(json.dumps({
+        "licenses": args.licenses,
+        "load_seconds": round(load_s, 1),
+        "queries": len(latencies),
+        "top1_recall": round(hits / len(latencies), 4),
+        "lookup_ms_p50": round(statistics.median(latencies), 2),
+        "lookup_ms_p95": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "linear_scan_ms_estimate": round(scan_ms, 0),
+        "db_bytes": os.path.getsize(db_path),
+    }, indent=2))
+
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Fingerprint storage benchmark: 64-char hex String vs 32-byte binary.
+
+Loads N fingerprints into two scratch tables, one per column type, builds
+the unique index each table gets in production and reports table size,
+index size and point-lookup latency through the SQLAlchemy type (so the
+hex <-> bytes conversion is included).
+
+    python benchmarks/fingerprint_storage.py --rows 10000000 [--db-url postgresql://...]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, select, text
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import fingerprint
+
+CHUNK = 50000
+
+
+def tables():
+    from models import Fingerprint
+
+    metadata = MetaData()
+    return {
+        'hex': Table('fp_bench_hex', metadata,
+                     Column('id', Integer, primary_key=True),
+                     Column('fingerprint', String(64), nullable=False)),
+        'binary': Table('fp_bench_binary', metadata,
+                        Column('id', Integer, primary_key=True),
+                        Column('fingerprint', Fingerprint, nullable=False)),
+    }
+
+
+def sqlite_bytes(conn):
+    pages = conn.exec_driver_sql("PRAGMA page_count").scalar()
+    return pages * conn.exec_driver_sql("PRAGMA page_size").scalar()
+
+
+def load(engine, table, n):
+    """Insert n rows, then build the unique index; returns (table bytes, index bytes, index seconds)"""
+    postgres = engine.dialect.name == 'postgresql'
+    index = f"ix_{table.name}_fingerprint"
+
+    with engine.begin() as conn:
+        empty = 0 if postgres else sqlite_bytes(conn)
+        for start in range(0, n, CHUNK):
+            conn.execute(table.insert(), [
+                {'id': i, 'fingerprint': fingerprint(i)} for i in range(start, min(start + CHUNK, n))
+            ])
+
+    with engine.begin() as conn:
+        loaded = 0 if postgres else sqlite_bytes(conn)
+        t0 = time.perf_counter()
+        conn.execute(text(f"CREATE UNIQUE INDEX {index} ON {table.name} (fingerprint)"))
+        index_seconds = time.perf_counter() - t0
+        if postgres:
+            conn.execute(text(f"ANALYZE {table.name}"))
+
+    with engine.connect() as conn:
+        if postgres:
+            size = "SELECT pg_relation_size(:name)"
+            table_bytes = conn.execute(text(size), {'name': table.name}).scalar()
+            index_bytes = conn.execute(text(size), {'name': index}).scalar()
+        else:
+            # One table per file: growth is attributable to the table, then the index
+            table_bytes = loaded - empty
+            index_bytes = sqlite_bytes(conn) - loaded
+    return table_bytes, index_bytes, index_seconds
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return {
+        'p50': round(statistics.median(latencies), 1),
+        'p99': round(latencies[int(len(latencies) * 0.99) - 1], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-url", help="database to use (default: temporary SQLite)")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    results = {'rows': args.rows, 'queries': args.queries}
+    variants = tables()
+    engines = {}
+
+    for name, table in variants.items():
+        # One SQLite file per table so file growth is attributable to it
+        engine = engines[name] = create_engine(
+            args.db_url or f"sqlite:///{os.path.join(tmp.name, name + '.db')}"
+        )
+        table.drop(engine, checkfirst=True)
+        table.create(engine)
+
+        t0 = time.perf_counter()
+        table_bytes, index_bytes, index_seconds = load(engine, table, args.rows)
+        results[name] = {
+            'table_mb': round(table_bytes / 2**20, 1),
+            'index_mb': round(index_bytes / 2**20, 1),
+            'index_build_seconds': round(index_seconds, 1),
+            'load_seconds': round(time.perf_counter() - t0, 1),
+        }
+
+    # Alternate the variants on every key so machine noise hits both equally.
+    # "sqlalchemy" includes statement construction and the type conversion;
+    # "driver" is the bare DB-API round trip.
+    rng = random.Random(args.seed)
+    keys = [fingerprint(rng.randrange(args.rows)) for _ in range(args.queries)]
+    connections = {name: engine.connect() for name, engine in engines.items()}
+    latencies = {name: {'sqlalchemy': [], 'driver': []} for name in variants}
+    for key in keys:
+        for name, table in variants.items():
+            conn = connections[name]
+            t0 = time.perf_counter()
+            found = conn.execute(select(table.c.id).where(table.c.fingerprint == key)).scalar()
+            latencies[name]['sqlalchemy'].append((time.perf_counter() - t0) * 1e6)
+            assert found is not None
+
+            param = bytes.fromhex(key) if name == 'binary' else key
+            cursor = conn.connection.driver_connection.cursor()
+            sql = f"SELECT id FROM {table.name} WHERE fingerprint = " + ("?" if conn.dialect.paramstyle == 'qmark' else "%s")
+            t0 = time.perf_counter()
+            cursor.execute(sql, (param,))
+            cursor.fetchone()
+            latencies[name]['driver'].append((time.perf_counter() - t0) * 1e6)
+            cursor.close()
+
+    for name, table in variants.items():
+        for layer, values in latencies[name].items():
+            results[name][f'lookup_us_{layer}'] = percentiles(values)
+        connections[name].close()
+        if args.db_url:
+            table.drop(engines[name])
+        engines[name].dispose()
+
+    results['index_size_ratio'] = round(results['binary']['index_mb'] / max(results['hex']['index_mb'], 0.1), 2)
+    print(json.dumps(results, indent=2))
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Query-plan regression check.
+
+Seeds a realistic dataset, drives every route through the Flask test
+client, captures each SELECT/UPDATE/DELETE the route issues and runs it
+through EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (Postgres). Any full table
+scan that is not listed in EXPECTED_SCANS fails the run.
+
+    python benchmarks/query_plans.py [--db-url postgresql://...] [--users 2000 --licenses 5000]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import event, text
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import BENCH_PASSWORD, create_bench_app, fingerprint, seed_database
+
+# Endpoint -> tables it is allowed to scan (listings and whole-table counts)
+EXPECTED_SCANS = {
+    'admin.dashboard': {'users', 'machine_logins', 'licenses'},
+    'admin.users_list': {'users'},
+    'admin.get_users_api': {'users'},
+    'admin.systems_list': {'machine_logins'},
+    'admin.get_machines_api': {'machine_logins'},
+    # plan_type alone is not selective enough to index
+    'admin.bulk_licenses': {'licenses'},
+    'users.list_users': {'users'},
+    # Ranks the (small) reuse cluster table
+    'admin.fingerprint_stability_api': {'fingerprint_reuse', 'fingerprint_component_stats'},
+}
+
+SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+
+def scenarios(user_ids, email):
+    """(name, method, path, json body, needs token) for every route"""
+    fp = fingerprint(7)
+    uid = user_ids[7]
+    lic = f"LIC-{7:012X}"
+    return [
+        ('auth.login', 'POST', '/api/auth/login',
+         {'email': email, 'password': BENCH_PASSWORD, 'machine_fingerprint': fp}, False),
+        ('users.get_profile', 'GET', '/api/users/profile', None, True),
+        ('users.list_users', 'GET', '/api/users?admin_email=admin@serkayon.com', None, False),
+        ('machines.get_machines', 'GET', '/api/machines', None, True),
+        ('machines.active_counts', 'GET', '/api/machines/active?minutes=15', None, False),
+        ('subscriptions.verify_license', 'GET', f'/api/subscriptions/verify/{lic}', None, False),
+        ('subscriptions.get_user_license', 'GET', f'/api/subscriptions/user/{uid}?machine_fingerprint={fp}', None, False),
+        ('subscriptions.get_user_license', 'GET', f'/api/subscriptions/user/{uid}?mac_address=aa:bb', None, False),
+        ('subscriptions.get_user_license', 'GET', f'/api/subscriptions/user/{uid}', None, False),
+        ('subscriptions.get_license_portfolio', 'GET', '/api/subscriptions/portfolio', None, True),
+        ('subscriptions.get_license_portfolio', 'GET', '/api/subscriptions/portfolio?status=active', None, True),
+        ('subscriptions.get_machine_license_by_fingerprint', 'GET', f'/api/subscriptions/machine/fingerprint/{fp}', None, False),
+        ('subscriptions.get_machine_license', 'GET', '/api/subscriptions/machine/aa:bb', None, False),
+        ('subscriptions.match_license', 'POST', '/api/subscriptions/match',
+         {'fingerprint_components': {'cpu': 'x', 'motherboard_serial': 'MB0000000007'}}, True),
+        ('subscriptions.activate_license', 'POST', '/api/subscriptions/activate',
+         {'machine_fingerprint': fp, 'plan_type': '1year'}, True),
+        ('otp.send_otp', 'POST', '/api/otp/send-otp', {'email': 'plan@check.test'}, False),
+        ('otp.verify_otp', 'POST', '/api/otp/verify-otp', {'email': 'plan@check.test', 'otp': '000000'}, False),
+        ('admin.dashboard', 'GET', '/admin/dashboard', None, False),
+        ('admin.users_list', 'GET', '/admin/users', None, False),
+        ('admin.systems_list', 'GET', '/admin/systems', None, False),
+        ('admin.get_users_api', 'GET', '/admin/users/api?search=user1', None, False),
+        ('admin.get_machines_api', 'GET', '/admin/machines/api', None, False),
+        ('admin.user_detail_page', 'GET', f'/admin/user/{uid}', None, False),
+        ('admin.get_user_detail_api', 'GET', f'/admin/users/{uid}/api', None, False),
+        ('admin.user_sessions', 'GET', f'/admin/users/{uid}/sessions', None, False),
+        ('admin.system_detail_page', 'GET', '/admin/system/aa:bb', None, False),
+        ('admin.get_system_detail_api', 'GET', '/admin/systems/aa:bb/api', None, False),
+        ('admin.system_sessions', 'GET', '/admin/systems/aa:bb/sessions', None, False),
+        ('admin.fingerprint_stability_api', 'GET', '/admin/fingerprints/stability', None, False),
+        ('admin.bulk_licenses', 'POST', '/admin/bulk/licenses',
+         {'admin_email': 'admin@serkayon.com', 'action': 'deactivate', 'dry_run': True,
+          'filter': {'plan_type': 'trial'}}, False),
+        ('machines.heartbeat', 'POST', '/api/machines/heartbeat',
+         {'machine_ids': ['machine-1', 'machine-2'], 'fingerprints': [fingerprint(3)]}, False),
+        ('auth.logout', 'POST', '/api/auth/logout', {}, True),
+    ]
+
+
+@contextmanager
+def capture(engine):
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if not executemany and verb in ('SELECT', 'UPDATE', 'DELETE'):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+
+def full_scans(conn, dialect, statement, parameters, tables):
+    """Tables the plan reads with a full scan"""
+    if dialect == 'sqlite':
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        found = set()
+        for row in rows:
+            match = SQLITE_SCAN.match(row[-1])
+            if match and match.group(1) in tables:
+                found.add(match.group(1))
+        return found, [row[-1] for row in rows]
+
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+    found, lines = set(), []
+
+    def walk(node):
+        lines.append(f"{node['Node Type']} {node.get('Relation Name', '')}".strip())
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in tables:
+            found.add(node['Relation Name'])
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk((plan if isinstance(plan, list) else json.loads(plan))[0]['Plan'])
+    return found, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db-url", help="database to seed (default: temporary SQLite)")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--licenses", type=int, default=5000)
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_url = args.db_url or f"sqlite:///{os.path.join(tmp.name, 'plans.db')}"
+    app = create_bench_app(db_url)
+    from models import db, User
+    from heartbeat import heartbeat_buffer
+
+    with app.app_context():
+        user_ids = seed_database(db, args.users, args.licenses)
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+        dialect = db.engine.dialect.name
+        tables = set(db.metadata.tables)
+
+        email = db.session.get(User, user_ids[7]).email
+        client = app.test_client()
+        token = client.post('/api/auth/login', json={
+            'email': email, 'password': BENCH_PASSWORD
+        }).get_json().get('access_token')
+
+        failures, report = [], []
+        for name, method, path, body, auth in scenarios(user_ids, email):
+            headers = {'Authorization': f"Bearer {token}"} if auth and token else {}
+            with capture(db.engine) as statements:
+                response = client.open(path, method=method, json=body, headers=headers)
+                if name == 'machines.heartbeat':
+                    # The writes happen in the flusher, not the request
+                    heartbeat_buffer.flush(app)
+
+            with db.engine.connect() as conn:
+                for statement, parameters in statements:
+                    scanned, plan = full_scans(conn, dialect, statement, parameters, tables)
+                    unexpected = scanned - EXPECTED_SCANS.get(name, set())
+                    entry = {'route': name, 'status': response.status_code,
+                             'sql': " ".join(statement.split())[:160], 'scans': sorted(scanned)}
+                    if args.verbose:
+                        entry['plan'] = plan
+                    report.append(entry)
+                    if unexpected:
+                        failures.append({**entry, 'unexpected_scans': sorted(unexpected), 'plan': plan})
+
+    print(json.dumps({
+        'dialect': dialect,
+        'statements_checked': len(report),
+        'routes_checked': len({r['route'] for r in report}),
+        'failures': failures,
+        **({'report': report} if args.verbose else {}),
+    }, indent=2, default=str))
+    tmp.cleanup()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
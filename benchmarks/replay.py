@@ -0,0 +1,299 @@
+"""
+Replay a traffic capture against a freshly seeded app.
+
+Captures are written by request_logger when CAPTURE_SAMPLE_RATE is set:
+one line per sampled request with its route, masked query, body shape and
+timing. Each record is turned back into a concrete request using rows
+from the seeded database (same seed, same values), sent at its recorded
+offset divided by --speedup (0 = as fast as possible) from --concurrency
+threads, and timed on the client side.
+
+    python benchmarks/replay.py captures/requests.jsonl [--concurrency 8] [--speedup 10]
+        [--server http://127.0.0.1:5000] [--baseline replay.json] [--save-baseline replay.json]
+
+Prints per-endpoint p50/p95/p99 and, with --baseline, the change against a
+saved run. Exits non-zero if any endpoint's p95 regressed by more than
+--max-regression percent.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from datagen import BENCH_PASSWORD, create_bench_app, license_rows, seed_database, user_rows
+
+ARG = re.compile(r"<(?:[^:<>]+:)?([^<>]+)>")
+
+
+# =========================
+# Capture -> concrete requests
+# =========================
+class Filler:
+    """Seeded values for masked path args, query values and body leaves"""
+
+    def __init__(self, user_ids, emails, licenses, seed=42):
+        self.user_ids = [str(u) for u in user_ids]
+        self.emails = emails
+        self.licenses = licenses
+        self.rng = random.Random(seed)
+
+    def value(self, key, kind="str"):
+        if kind == "int":
+            return 1
+        if kind == "float":
+            return 1.0
+        if kind == "bool":
+            return True
+        if kind == "null":
+            return None
+
+        i = self.rng.randrange(len(self.licenses))
+        lic = self.licenses[i]
+        key = (key or "").lower()
+        if "fingerprint" in key:
+            return lic['machine_fingerprint']
+        if key == "license_id":
+            return lic['license_id']
+        if key == "mac_address":
+            return lic['mac_address']
+        if key == "machine_id":
+            return lic['machine_id']
+        if key == "user_id":
+            return self.user_ids[i % len(self.user_ids)]
+        if "email" in key:
+            return self.emails[i % len(self.emails)]
+        if "password" in key:
+            return BENCH_PASSWORD
+        if "name" in key:
+            return lic['machine_name']
+        if key == "search":
+            return "user1"
+        return "bench"
+
+    def body(self, shape, key=None):
+        if isinstance(shape, dict):
+            return {k: self.body(v, k) for k, v in shape.items()}
+        if isinstance(shape, list):
+            count, item = shape
+            return [self.body(item, key) for _ in range(count)]
+        return self.value(key, shape)
+
+    def path(self, rule):
+        return ARG.sub(lambda m: str(self.value(m.group(1))), rule)
+
+    def query(self, query):
+        return {k: v if v != "str" else self.value(k) for k, v in query.items()}
+
+
+def load_capture(path, skip=("static", "admin.live")):
+    records = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                if record.get("rule") and record.get("endpoint") not in skip:
+                    records.append(record)
+    records.sort(key=lambda r: r["at"])
+    return records
+
+
+def build_requests(records, filler):
+    """(offset seconds, record, method, url, json body, needs auth, accept) in capture order"""
+    start = records[0]["at"] if records else 0
+    built = []
+    for record in records:
+        url = filler.path(record["rule"])
+        query = filler.query(record.get("query") or {})
+        if query:
+            url += "?" + urlencode(query)
+        body = filler.body(record["body"]) if record.get("body") is not None else None
+        built.append((record["at"] - start, record, record["method"], url, body,
+                      record.get("auth"), record.get("accept")))
+    return built
+
+
+# =========================
+# Transports
+# =========================
+class TestClientTransport:
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, method, url, body, headers):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(url, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HTTPTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def send(self, method, url, body, headers):
+        data = None
+        headers = dict(headers)
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(self.base_url + url, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=120) as response:
+                payload = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            payload, status = e.read(), e.code
+        try:
+            return status, json.loads(payload)
+        except ValueError:
+            return status, None
+
+
+# =========================
+# Replay
+# =========================
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def replay(transport, requests, token, concurrency, speedup):
+    results = defaultdict(lambda: {'latencies': [], 'statuses': defaultdict(int), 'captured': []})
+    lock = threading.Lock()
+
+    def run(item):
+        _, record, method, url, body, auth, accept = item
+        headers = {}
+        if auth and token:
+            headers["Authorization"] = f"Bearer {token}"
+        if accept:
+            headers["Accept"] = accept
+        t0 = time.perf_counter()
+        status, _ = transport.send(method, url, body, headers)
+        elapsed = (time.perf_counter() - t0) * 1000
+        with lock:
+            entry = results[record["endpoint"]]
+            entry['latencies'].append(elapsed)
+            entry['statuses'][status] += 1
+            entry['captured'].append(record.get("duration_ms", 0))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for item in requests:
+            if speedup > 0:
+                delay = item[0] / speedup - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(run, item))
+        for future in futures:
+            future.result()
+    wall = time.perf_counter() - started
+
+    report = {}
+    for endpoint, entry in sorted(results.items()):
+        latencies = entry['latencies']
+        report[endpoint] = {
+            'count': len(latencies),
+            'statuses': dict(entry['statuses']),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'captured_p95_ms': round(percentile(entry['captured'], 95), 2),
+        }
+    return report, wall
+
+
+def compare(report, baseline):
+    diff = {}
+    for endpoint, entry in report.items():
+        before = baseline.get('endpoints', {}).get(endpoint)
+        if before and before['p95_ms']:
+            diff[endpoint] = {
+                'p95_before_ms': before['p95_ms'],
+                'p95_ms': entry['p95_ms'],
+                'change_pct': round((entry['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100, 1),
+            }
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a traffic capture against a seeded app")
+    parser.add_argument("capture")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--licenses", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--speedup", type=float, default=0, help="0 = no pacing")
+    parser.add_argument("--server", help="base URL of a running server (seeded with the same --seed, or pass its --db)")
+    parser.add_argument("--db", help="database URL to seed (default: temporary SQLite file)")
+    parser.add_argument("--baseline")
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--max-regression", type=float, help="fail if a p95 grows by more than this %%")
+    args = parser.parse_args()
+
+    records = load_capture(args.capture)
+    if not records:
+        sys.exit("capture is empty")
+
+    # The same seed yields the same rows, so a server seeded with it can be filled from here
+    users = [row for row in user_rows(args.users, None, seed=args.seed) if row['is_active']]
+    licenses = list(license_rows(args.licenses, seed=args.seed))
+    filler = Filler([u['id'] for u in users], [u['email'] for u in users], licenses, seed=args.seed)
+
+    # With --server, --db seeds the server's (empty) database first
+    app = None
+    if args.db or not args.server:
+        app = create_bench_app(args.db or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'replay.db')}")
+        from models import db
+        with app.app_context():
+            seed_database(db, args.users, args.licenses, seed=args.seed)
+    transport = HTTPTransport(args.server) if args.server else TestClientTransport(app)
+
+    status, login = transport.send("POST", "/api/auth/login", {'email': users[0]['email'], 'password': BENCH_PASSWORD}, {})
+    token = (login or {}).get('access_token')
+    if not token:
+        print(f"warning: bench login failed ({status}), authenticated requests go without a token", file=sys.stderr)
+
+    report, wall = replay(transport, build_requests(records, filler), token, args.concurrency, args.speedup)
+    result = {
+        'requests': len(records),
+        'wall_seconds': round(wall, 2),
+        'concurrency': args.concurrency,
+        'speedup': args.speedup,
+        'endpoints': report,
+    }
+
+    failures = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            result['baseline_diff'] = compare(report, json.load(f))
+        if args.max_regression is not None:
+            failures = [e for e, d in result['baseline_diff'].items() if d['change_pct'] > args.max_regression]
+            result['regressions'] = failures
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+
+    print(json.dumps(result, indent=2))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
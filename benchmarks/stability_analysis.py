@@ -0,0 +1,123 @@
+"""
+Fleet-wide fingerprint stability analysis benchmark.
+
+Loads N generated licenses, each with a machine login on the same
+machine_id, into a scratch SQLite database. --drifted of the logins report
+drifted components (1-2 parts swapped) and --cloned of the licenses reuse
+another license's motherboard serial. Then runs the analysis job and
+reports its wall time, peak memory and whether the clones were found.
+
+    python benchmarks/stability_analysis.py --licenses 1000000 [--chunk-size 20000] [--db /tmp/st.db]
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import create_bench_app, drift, license_rows
+
+CHUNK = 20000
+
+
+def load(db, n, drifted, cloned, seed):
+    """Licenses and their logins; returns the license_ids given a cloned serial"""
+    from models import User, License, MachineLogin
+    from component_sets import components_digest, store_component_sets
+
+    rng = random.Random(seed)
+    user_id = uuid.UUID(int=seed, version=4)
+    db.session.execute(User.__table__.insert(), [{
+        'id': user_id, 'name': 'Bench', 'email': 'bench@stability.test', 'password_hash': 'x',
+    }])
+
+    clones = set()
+    donors = [f"MB{rng.randrange(n):010d}" for _ in range(max(cloned // 5, 1))]
+    for start in range(0, n, CHUNK):
+        rows = list(license_rows(min(CHUNK, n - start), seed=seed, start=start))
+        logins, payloads = [], {}
+        for row in rows:
+            components = row.pop('fingerprint_components')
+            if rng.random() < cloned / n:
+                # Five licenses per cloned board on average
+                components = dict(components, motherboard_serial=rng.choice(donors))
+                row['components_hash'] = components_digest(components)
+                clones.add(row['license_id'])
+            payloads[row['components_hash']] = components
+
+            login_components = drift(rng, components, rng.choice([1, 2])) if rng.random() < drifted else components
+            login_hash = components_digest(login_components)
+            payloads[login_hash] = login_components
+            logins.append({
+                'machine_id': row['machine_id'], 'mac_address': row['mac_address'], 'user_id': user_id,
+                'current_email': 'bench@stability.test', 'machine_fingerprint': row['machine_fingerprint'],
+                'components_hash': login_hash,
+            })
+        store_component_sets(payloads)
+        db.session.execute(License.__table__.insert(), rows)
+        db.session.execute(MachineLogin.__table__.insert(), logins)
+        db.session.commit()
+    return clones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--licenses", type=int, default=1_000_000)
+    parser.add_argument("--drifted", type=float, default=0.2, help="share of logins with drifted components")
+    parser.add_argument("--cloned", type=int, default=500, help="licenses given a reused motherboard serial")
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="SQLite file (default: temporary)")
+    args = parser.parse_args()
+
+    tmp = None
+    db_path = args.db
+    if not db_path:
+        tmp = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp.name, "stability.db")
+
+    app = create_bench_app(f"sqlite:///{db_path}")
+    from models import db, FingerprintReuse
+    from stability_analysis import analyze
+
+    with app.app_context():
+        t0 = time.perf_counter()
+        clones = load(db, args.licenses, args.drifted, args.cloned, args.seed)
+        load_s = time.perf_counter() - t0
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        summary = analyze(chunk_size=args.chunk_size)
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        found = {
+            license_id for (license_id,) in db.session.query(FingerprintReuse.license_id).filter_by(
+                component='motherboard_serial'
+            )
+        }
+
+    print(json.dumps({
+        "licenses": args.licenses,
+        "chunk_size": args.chunk_size,
+        "load_seconds": round(load_s, 1),
+        "analysis_seconds": round(summary['elapsed_ms'] / 1000, 1),
+        "licenses_per_second": round(args.licenses / (summary['elapsed_ms'] / 1000)),
+        # ru_maxrss is KiB on Linux; growth of the process peak during the analysis
+        "peak_rss_growth_mb": round((rss_after - rss_before) / 1024, 1),
+        "component_change_rates": summary['components'],
+        "cloned_licenses": len(clones),
+        "cloned_found": len(clones & found),
+        "clustered_licenses": summary['clustered_licenses'],
+    }, indent=2))
+
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Startup benchmark: import time, first-request time and import side effects.
+
+Each sample runs in a fresh interpreter so nothing is cached between runs.
+
+    python benchmarks/startup.py [--runs 5]
+
+Exits non-zero if the median misses a target or importing the app touches
+the database or starts a thread.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Targets (milliseconds, median of runs)
+IMPORT_TARGET_MS = 600
+FIRST_REQUEST_TARGET_MS = 50
+
+PROBE = r"""
+import json, os, sys, threading, time
+sys.path.insert(0, os.environ["BENCH_ROOT"])
+
+t0 = time.perf_counter()
+import app as app_module
+t1 = time.perf_counter()
+
+result = {
+    "import_ms": (t1 - t0) * 1000,
+    "threads_after_import": threading.active_count(),
+    "db_created_at_import": os.path.exists(os.environ["BENCH_DB"]),
+    "cryptography_imported": "cryptography" in sys.modules,
+}
+
+client = app_module.app.test_client()
+t2 = time.perf_counter()
+status = client.get("/health").status_code
+t3 = time.perf_counter()
+
+result["first_request_ms"] = (t3 - t2) * 1000
+result["first_request_status"] = status
+print(json.dumps(result))
+"""
+
+def run_once(db_path):
+    env = dict(os.environ)
+    env.update({
+        "BENCH_ROOT": ROOT,
+        "BENCH_DB": db_path,
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "AUTO_CREATE_TABLES": "0",
+    })
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.runs):
+            samples.append(run_once(os.path.join(tmp, f"startup_{i}.db")))
+
+    import_ms = statistics.median(s["import_ms"] for s in samples)
+    first_ms = statistics.median(s["first_request_ms"] for s in samples)
+
+    failures = []
+    if import_ms > IMPORT_TARGET_MS:
+        failures.append(f"import {import_ms:.0f}ms > {IMPORT_TARGET_MS}ms")
+    if first_ms > FIRST_REQUEST_TARGET_MS:
+        failures.append(f"first request {first_ms:.1f}ms > {FIRST_REQUEST_TARGET_MS}ms")
+    if any(s["db_created_at_import"] for s in samples):
+        failures.append("importing app touched the database")
+    if any(s["threads_after_import"] > 1 for s in samples):
+        failures.append("importing app started a thread")
+    if any(s["cryptography_imported"] for s in samples):
+        failures.append("cryptography imported at startup")
+
+    print(json.dumps({
+        "runs": args.runs,
+        "import_ms_median": round(import_ms, 1),
+        "first_request_ms_median": round(first_ms, 2),
+        "targets": {"import_ms": IMPORT_TARGET_MS, "first_request_ms": FIRST_REQUEST_TARGET_MS},
+        "failures": failures,
+    }, indent=2))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+User deletion benchmark: ORM-loaded cascades vs ON DELETE CASCADE.
+
+Seeds N users with M machines, M machine logins and M sessions each, then
+deletes half the users the old way (load every child into the session and
+delete it row by row) and the other half with one set-based DELETE that
+lets the database cascade.
+
+    python benchmarks/user_delete.py --users 2000 --children 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import create_bench_app
+
+
+def seed(db, users, children):
+    from models import User, Machine, MachineLogin, UserSession
+
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    db.session.execute(User.__table__.insert(), [
+        {'id': uid, 'name': f"user {i}", 'email': f"user{i}@lab.test", 'password_hash': 'x'}
+        for i, uid in enumerate(user_ids)
+    ])
+    for i, uid in enumerate(user_ids):
+        names = [f"{i}-{j}" for j in range(children)]
+        db.session.execute(Machine.__table__.insert(), [
+            {'user_id': uid, 'mac_address': n, 'machine_name': n, 'machine_id': f"M{n}"} for n in names
+        ])
+        db.session.execute(MachineLogin.__table__.insert(), [
+            {'user_id': uid, 'mac_address': n, 'machine_id': f"L{n}", 'current_email': 'x'} for n in names
+        ])
+        db.session.execute(UserSession.__table__.insert(), [
+            {'user_id': uid, 'machine_id': n, 'machine_name': n, 'mac_address': n} for n in names
+        ])
+    db.session.commit()
+    return user_ids
+
+
+def counted(db, fn):
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", count)
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    event.remove(engine, "before_cursor_execute", count)
+    return {'seconds': round(elapsed, 3), 'statements': statements[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--children", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(f"sqlite:///{os.path.join(tmp, 'delete.db')}")
+        from models import db, User, Machine, MachineLogin, UserSession
+
+        with app.app_context():
+            user_ids = seed(db, args.users, args.children)
+            half = len(user_ids) // 2
+            orm_ids, bulk_ids = user_ids[:half], user_ids[half:]
+
+            def orm_loaded_delete():
+                # What lazy=True + cascade='all, delete-orphan' used to do
+                for user in User.query.filter(User.id.in_(orm_ids)).all():
+                    for child_model in (Machine, MachineLogin, UserSession):
+                        for child in child_model.query.filter_by(user_id=user.id):
+                            db.session.delete(child)
+                    db.session.flush()
+                    db.session.delete(user)
+                db.session.commit()
+
+            def cascade_delete():
+                User.query.filter(User.id.in_(bulk_ids)).delete(synchronize_session=False)
+                db.session.commit()
+
+            result = {
+                'users_per_run': half,
+                'children_per_user': args.children * 3,
+                'orm_loaded_cascade': counted(db, orm_loaded_delete),
+                'on_delete_cascade': counted(db, cascade_delete),
+                'remaining_sessions': UserSession.query.count(),
+            }
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Wire format benchmark: JSON vs MessagePack vs CBOR for client responses.
+
+Encodes representative license/auth payloads (built from generated
+licenses) with the same encoders the API uses and reports payload bytes
+(raw and gzipped) and encode/decode time per response.
+
+    python benchmarks/wire_format.py [--licenses 100] [--repeat 2000]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datagen import license_rows
+
+
+def payloads(n):
+    from models import License, User
+
+    now = datetime(2026, 1, 1)
+    licenses = []
+    for row in license_rows(n):
+        # Stored by hash in fingerprint_component_sets, not on the license
+        row.pop('fingerprint_components')
+        lic = License(**row)
+        lic.id = uuid.uuid4()
+        lic.created_at = lic.updated_at = now
+        licenses.append(lic)
+    user = User(id=uuid.uuid4(), name="Jane Doe", email="jane@lab.edu",
+                is_active=True, is_verified=True, created_at=now, updated_at=now)
+
+    lic = licenses[0]
+    return {
+        'license_lookup': {
+            'license': lic.to_dict(), 'has_active': True, 'days_remaining': 27, 'expired': False,
+            'fingerprint_short': lic.fingerprint_short, 'fingerprint_stability': lic.fingerprint_stability,
+        },
+        'verify': {
+            'valid': True, 'license_id': lic.license_id, 'plan_name': lic.plan_name,
+            'plan_type': lic.plan_type, 'activated_at': lic.activated_at, 'expiry_date': lic.expiry_date,
+            'is_active': True, 'days_remaining': 27, 'expired': False,
+        },
+        'login': {
+            'message': 'Login successful', 'user': user.to_dict(), 'access_token': 'x' * 180,
+            'refresh_token': 'y' * 43, 'token_type': 'Bearer', 'expires_in': 900,
+        },
+        f'{n}_licenses': {'licenses': [l.to_dict() for l in licenses]},
+    }
+
+
+def codecs(app):
+    import cbor2
+    import msgpack
+    from wire_format import MSGPACK, CBOR, ENCODERS, UUID_EXT
+
+    def ext_hook(code, data):
+        return uuid.UUID(bytes=data) if code == UUID_EXT else msgpack.ExtType(code, data)
+
+    return {
+        'json': (lambda p: app.json.dumps(p, separators=(",", ":")).encode(), json.loads),
+        'msgpack': (ENCODERS[MSGPACK], lambda b: msgpack.unpackb(b, timestamp=3, ext_hook=ext_hook)),
+        'cbor': (ENCODERS[CBOR], cbor2.loads),
+    }
+
+
+def timed(fn, arg, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--licenses", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    from flask import Flask
+    from wire_format import WireJSONProvider
+
+    app = Flask(__name__)
+    app.json = WireJSONProvider(app)
+
+    results = {}
+    for name, payload in payloads(args.licenses).items():
+        repeat = max(args.repeat // (args.licenses if name.endswith('_licenses') else 1), 20)
+        results[name] = {}
+        for codec, (encode, decode) in codecs(app).items():
+            body = encode(payload)
+            results[name][codec] = {
+                'bytes': len(body),
+                'gzip_bytes': len(gzip.compress(body)),
+                'encode_us': round(timed(encode, payload, repeat), 1),
+                'decode_us': round(timed(decode, body, repeat), 1),
+            }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
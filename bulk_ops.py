@@ -0,0 +1,227 @@
+"""
+Set-based bulk UPDATE/DELETE for the admin bulk endpoints.
+
+A selection is a list of IDs or a filter dict. It runs either as one
+statement or in keyset-paginated chunks of primary keys, each committed
+on its own, so very large selections never hold one long transaction.
+
+License updates are logged to the event log and announced to long-polling
+clients in the same chunk transaction, as the import does. They do not
+touch the rollups: those count activations and upgrades, not changes of
+state or expiry.
+"""
+
+import time
+import uuid
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from models import db, User, Machine, MachineLogin, License
+from event_log import make_event, write_events
+from license_notifier import licenses_changed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_CHUNK_SIZE = 50000
+MAX_IDS = 100000
+LICENSE_EVENTS = {'deactivate': 'deactivation', 'activate': 'reactivation', 'extend': 'extension'}
+
+
+class BulkSelectionError(ValueError):
+    """Invalid or empty selection (reported as 400)"""
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise BulkSelectionError(f"{name} must be an ISO date")
+
+
+def _uuids(ids):
+    if len(ids) > MAX_IDS:
+        raise BulkSelectionError(f"At most {MAX_IDS} ids per call")
+    try:
+        return [uuid.UUID(str(i)) for i in ids]
+    except ValueError:
+        raise BulkSelectionError("ids must be UUIDs")
+
+
+def _domain_like(domain):
+    return f"%@{domain.strip().lstrip('@').lower()}"
+
+
+# =========================
+# Selections
+# =========================
+def license_criteria(ids=None, filters=None):
+    filters = filters or {}
+    criteria = []
+    if ids:
+        if len(ids) > MAX_IDS:
+            raise BulkSelectionError(f"At most {MAX_IDS} ids per call")
+        criteria.append(License.license_id.in_(ids))
+    if filters.get('plan_type'):
+        criteria.append(License.plan_type == filters['plan_type'])
+    if filters.get('is_active') is not None:
+        criteria.append(License.is_active.is_(bool(filters['is_active'])))
+    if filters.get('expires_after'):
+        criteria.append(License.expiry_date >= _parse_date(filters['expires_after'], 'expires_after'))
+    if filters.get('expires_before'):
+        criteria.append(License.expiry_date < _parse_date(filters['expires_before'], 'expires_before'))
+    if filters.get('email_domain'):
+        criteria.append(License.machine_fingerprint.in_(
+            select(MachineLogin.machine_fingerprint).where(
+                func.lower(MachineLogin.current_email).like(_domain_like(filters['email_domain']))
+            )
+        ))
+    return criteria
+
+
+def user_criteria(ids=None, filters=None):
+    filters = filters or {}
+    criteria = []
+    if ids:
+        criteria.append(User.id.in_(_uuids(ids)))
+    if filters.get('email_domain'):
+        criteria.append(func.lower(User.email).like(_domain_like(filters['email_domain'])))
+    if filters.get('created_before'):
+        criteria.append(User.created_at < _parse_date(filters['created_before'], 'created_before'))
+    if filters.get('is_verified') is not None:
+        criteria.append(User.is_verified.is_(bool(filters['is_verified'])))
+    if filters.get('last_activity_before'):
+        # No machine login active since the cutoff
+        cutoff = _parse_date(filters['last_activity_before'], 'last_activity_before')
+        criteria.append(~User.id.in_(
+            select(MachineLogin.user_id).where(MachineLogin.last_activity >= cutoff)
+        ))
+    return criteria
+
+
+def machine_criteria(ids=None, filters=None):
+    filters = filters or {}
+    criteria = []
+    if ids:
+        criteria.append(Machine.id.in_(_uuids(ids)))
+    if filters.get('last_activity_before'):
+        criteria.append(Machine.last_seen < _parse_date(filters['last_activity_before'], 'last_activity_before'))
+    if filters.get('is_active') is not None:
+        criteria.append(Machine.is_active.is_(bool(filters['is_active'])))
+    if filters.get('email_domain'):
+        criteria.append(Machine.user_id.in_(
+            select(User.id).where(func.lower(User.email).like(_domain_like(filters['email_domain'])))
+        ))
+    return criteria
+
+
+def license_values(action, params):
+    if action == 'deactivate':
+        return {License.is_active: False, License.updated_at: datetime.utcnow()}
+    if action == 'activate':
+        return {License.is_active: True, License.updated_at: datetime.utcnow()}
+    if action == 'extend':
+        days = params.get('days')
+        if not isinstance(days, int) or days == 0:
+            raise BulkSelectionError("days must be a non-zero integer")
+        return {License.expiry_date: _add_days(License.expiry_date, days), License.updated_at: datetime.utcnow()}
+    raise BulkSelectionError("action must be deactivate, activate or extend")
+
+
+def chunk_size_option(value):
+    """Validated chunk_size request value (0 runs one set-based statement)"""
+    if value is None:
+        return DEFAULT_CHUNK_SIZE
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= MAX_CHUNK_SIZE:
+        raise BulkSelectionError(f"chunk_size must be 0 (one statement) or an integer from 1 to {MAX_CHUNK_SIZE}")
+    return value
+
+
+def license_history(action, params):
+    """before_chunk hook for license updates: event rows and long-poll wake-ups"""
+    event_type = LICENSE_EVENTS[action]
+    details = {'source': 'bulk'}
+    if action == 'extend':
+        details['days'] = params['days']
+
+    def before_chunk(criteria):
+        now = datetime.utcnow()
+        rows = db.session.query(
+            License.license_id, License.user_id, License.machine_fingerprint, License.machine_id, License.plan_type
+        ).filter(*criteria).all()
+        write_events([
+            make_event(event_type, occurred_at=now, license_id=row.license_id, user_id=row.user_id,
+                       machine_fingerprint=row.machine_fingerprint, machine_id=row.machine_id,
+                       plan_type=row.plan_type, details=details)
+            for row in rows
+        ])
+        licenses_changed([row.machine_fingerprint for row in rows])
+    return before_chunk
+
+
+def _add_days(column, days):
+    if db.engine.dialect.name == 'sqlite':
+        return func.datetime(column, f"{days:+d} days")
+    return column + timedelta(days=days)
+
+
+# =========================
+# Execution
+# =========================
+def run_bulk(model, criteria, values=None, delete=False, dry_run=False,
+             chunk_size=DEFAULT_CHUNK_SIZE, before_chunk=None):
+    """
+    Apply `values` (or delete) to every row of `model` matching `criteria`,
+    in one statement when chunk_size is 0, else in chunks of chunk_size rows.
+
+    Deletes rely on ON DELETE CASCADE for child rows. `before_chunk(criteria)`
+    runs in each chunk's transaction just before its statement, with criteria
+    selecting that chunk's rows.
+    """
+    if not criteria:
+        raise BulkSelectionError("Provide ids or at least one filter")
+
+    started = time.perf_counter()
+    pk = model.__mapper__.primary_key[0]
+    matched = db.session.query(func.count(pk)).filter(*criteria).scalar()
+
+    summary = {'matched': matched, 'affected': 0, 'chunks': 0, 'dry_run': dry_run}
+    if dry_run or not matched:
+        summary['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return summary
+
+    if not chunk_size:
+        if before_chunk:
+            before_chunk(criteria)
+        summary['affected'] = _apply(model, criteria, values, delete)
+        summary['chunks'] = 1
+        db.session.commit()
+    else:
+        last = None
+        while True:
+            query = db.session.query(pk).filter(*criteria)
+            if last is not None:
+                query = query.filter(pk > last)
+            ids = [row[0] for row in query.order_by(pk).limit(chunk_size)]
+            if not ids:
+                break
+
+            if before_chunk:
+                before_chunk([pk.in_(ids)])
+            summary['affected'] += _apply(model, [pk.in_(ids)], values, delete)
+            summary['chunks'] += 1
+            db.session.commit()
+            last = ids[-1]
+
+    summary['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return summary
+
+
+def _apply(model, criteria, values, delete):
+    query = db.session.query(model).filter(*criteria)
+    if delete:
+        return query.delete(synchronize_session=False)
+    return query.update(values, synchronize_session=False)
+
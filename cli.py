@@ -0,0 +1,139 @@
+import click
+from models import db
+
+def register_commands(app):
+    """Explicit maintenance commands (`flask --app app <command>`)"""
+    
+    # =========================
+    # Schema
+    # =========================
+    @app.cli.command('init-db')
+    def init_db():
+        """Create all tables. Run once per deploy instead of at import."""
+        from migrations import stamp_all
+        db.create_all()
+        stamp_all()
+        click.echo("Database tables created")
+    
+    @app.cli.command('db-upgrade')
+    def db_upgrade():
+        """Apply pending migrations to an existing database."""
+        from migrations import upgrade
+        applied = upgrade()
+        click.echo(f"Applied {len(applied)} migration(s): {', '.join(applied) or 'none pending'}")
+    
+    # =========================
+    # Fingerprint index
+    # =========================
+    @app.cli.command('index-fingerprints')
+    @click.option('--chunk-size', default=5000, show_default=True)
+    def index_fingerprints(chunk_size):
+        """Rebuild the fingerprint component index from all licenses."""
+        from fingerprint_index import rebuild_index
+        count = rebuild_index(chunk_size=chunk_size)
+        click.echo(f"Indexed {count} licenses")
+    
+    # =========================
+    # Dashboard rollups
+    # =========================
+    @app.cli.command('rebuild-rollups')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), help="First day (default: all history)")
+    @click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), help="Last day (default: today)")
+    def rebuild_rollups_command(since, until):
+        """Backfill the daily license rollups from licenses, for days that have none."""
+        from rollups import rebuild_rollups
+        count = rebuild_rollups(since=since.date() if since else None, until=until.date() if until else None)
+        click.echo(f"Backfilled {count} daily rollup rows")
+    
+    # =========================
+    # License import
+    # =========================
+    @app.cli.command('import-licenses')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+                  help="Default: from the file extension")
+    @click.option('--chunk-size', default=5000, show_default=True)
+    @click.option('--resume', is_flag=True, help="Continue after the last committed chunk")
+    @click.option('--rejects', type=click.Path(dir_okay=False), help="Write rejected rows (row,error) to this CSV")
+    def import_licenses(path, fmt, chunk_size, resume, rejects):
+        """Import licenses from a CSV or NDJSON file in committed chunks."""
+        import csv
+        import json
+        import os
+        from license_import import LicenseImport, read_rows, text_stream
+        
+        fmt = fmt or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        progress_path = path + '.progress'
+        start_row = 0
+        if resume and os.path.exists(progress_path):
+            with open(progress_path) as f:
+                start_row = json.load(f)['last_row']
+            click.echo(f"Resuming after row {start_row}")
+        
+        def save_progress(last_row, summary):
+            with open(progress_path, 'w') as f:
+                json.dump({'last_row': last_row}, f)
+            click.echo(f"row {last_row}: {summary['imported']} imported, {summary['rejected']} rejected")
+        
+        reject_file = open(rejects, 'a' if resume else 'w', newline='') if rejects else None
+        on_reject = None
+        if reject_file:
+            writer = csv.writer(reject_file)
+            on_reject = lambda row, error: writer.writerow([row, error])
+        
+        try:
+            importer = LicenseImport(chunk_size=chunk_size, start_row=start_row,
+                                     on_reject=on_reject, on_chunk=save_progress)
+            with open(path, 'rb') as f:
+                summary = importer.run(read_rows(text_stream(f), fmt))
+        finally:
+            if reject_file:
+                reject_file.close()
+        
+        if os.path.exists(progress_path):
+            os.remove(progress_path)
+        click.echo(f"Imported {summary['imported']} licenses, rejected {summary['rejected']} "
+                   f"in {summary['elapsed_ms'] / 1000:.1f}s")
+    
+    # =========================
+    # Fingerprint stability analysis
+    # =========================
+    @app.cli.command('analyze-stability')
+    @click.option('--chunk-size', default=20000, show_default=True)
+    @click.option('--min-cluster', default=2, show_default=True,
+                  help="Licenses sharing an identifying component that count as reuse")
+    def analyze_stability(chunk_size, min_cluster):
+        """Score fingerprint stability fleet-wide and find reused hardware identities."""
+        from stability_analysis import analyze
+        summary = analyze(chunk_size=chunk_size, min_cluster_size=min_cluster)
+        for component, rate in sorted(summary['components'].items(), key=lambda item: -item[1]):
+            click.echo(f"{component:24} {rate:7.2%} changed")
+        click.echo(f"Scored {summary['scored']} of {summary['licenses']} licenses; "
+                   f"{summary['clusters']} reuse clusters covering {summary['clustered_licenses']} licenses "
+                   f"in {summary['elapsed_ms'] / 1000:.1f}s")
+    
+    # =========================
+    # Scheduled jobs
+    # =========================
+    @app.cli.command('run-job')
+    @click.argument('name')
+    def run_job(name):
+        """Run one scheduled job now, in this process (ignores the leader lock)."""
+        from scheduler import scheduler
+        if name not in scheduler.jobs:
+            raise click.ClickException(f"Unknown job {name}; known: {', '.join(sorted(scheduler.jobs))}")
+        result = scheduler.run_now(name)
+        click.echo(f"{name}: {result if result is not None else 'done'}")
+    
+    # =========================
+    # Profiling
+    # =========================
+    @app.cli.command('profile-token')
+    @click.option('--minutes', default=15, show_default=True)
+    def profile_token(minutes):
+        """Print an X-Profile-Token value that profiles requests until it expires."""
+        from profiler import profile_token as make_token
+        secret = app.config.get('PROFILE_SECRET')
+        if not secret:
+            raise click.ClickException("PROFILE_SECRET is not set")
+        click.echo(make_token(secret, minutes * 60))
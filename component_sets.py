@@ -0,0 +1,74 @@
+"""
+Content-addressed storage for fingerprint_components.
+
+A components payload is stored once in ``fingerprint_component_sets`` under
+the SHA-256 of its canonical JSON; licenses and machine logins keep only
+that 32-byte ``components_hash``. Identical hardware (a lab of the same
+machines, a license and the login on the same machine) shares one row, an
+unchanged payload on re-activation costs no write at all, and responses
+carry the hash unless ``?expand=components`` asks for the payload.
+
+Rows are immutable and never deleted, so writers only ever insert a
+missing hash (INSERT .. ON CONFLICT DO NOTHING) and concurrent writers of
+the same payload cannot conflict.
+"""
+
+import hashlib
+import json
+
+from flask import request
+
+from models import db, FingerprintComponentSet
+
+
+def canonical_json(components):
+    return json.dumps(components, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def components_digest(components):
+    """Content hash (hex) of a payload; None for no components"""
+    if components in (None, '', [], {}):
+        return None
+    return hashlib.sha256(canonical_json(components).encode()).hexdigest()
+
+
+def store_component_sets(payloads):
+    """Insert the missing sets for {digest: components} (caller commits)"""
+    if not payloads:
+        return
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(FingerprintComponentSet.__table__).on_conflict_do_nothing(
+        index_elements=['components_hash']
+    )
+    db.session.execute(stmt, [
+        {'components_hash': digest, 'components': components}
+        for digest, components in sorted(payloads.items())
+    ])
+
+
+def store_components(components):
+    """Store one payload if new; returns its digest (caller commits)"""
+    digest = components_digest(components)
+    if digest:
+        store_component_sets({digest: components})
+    return digest
+
+
+def load_components(digests):
+    """{digest: components} for the given digests, in one query"""
+    digests = {d for d in digests if d}
+    if not digests:
+        return {}
+    rows = db.session.query(
+        FingerprintComponentSet.components_hash, FingerprintComponentSet.components
+    ).filter(FingerprintComponentSet.components_hash.in_(digests))
+    return dict(rows)
+
+
+def components_requested():
+    """True when the current request asked for ?expand=components"""
+    return 'components' in request.args.get('expand', '').split(',')
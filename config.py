@@ -13,12 +13,103 @@ class Config:
         f"sqlite:///{os.path.join(basedir, 'data.db')}"
     )
 
+    # Read replicas (optional, comma-separated URLs)
+    DATABASE_REPLICA_URLS = [
+        url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",")
+        if url.strip()
+    ]
+    # Seconds to wait for a replica connection (Postgres replicas) before failing over
+    REPLICA_CONNECT_TIMEOUT = int(os.environ.get("REPLICA_CONNECT_TIMEOUT", 3))
+    SQLALCHEMY_BINDS = {
+        f"replica_{i}": (
+            {'url': url, 'connect_args': {'connect_timeout': REPLICA_CONNECT_TIMEOUT}}
+            if url.startswith("postgres") else url
+        )
+        for i, url in enumerate(DATABASE_REPLICA_URLS)
+    }
+    READ_AFTER_WRITE_SECONDS = int(os.environ.get("READ_AFTER_WRITE_SECONDS", 5))
+    REPLICA_HEALTH_INTERVAL = int(os.environ.get("REPLICA_HEALTH_INTERVAL", 10))
+
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Run db.create_all() in create_app (off by default; use `flask init-db`)
+    AUTO_CREATE_TABLES = os.environ.get("AUTO_CREATE_TABLES", "0") == "1"
     JSON_SORT_KEYS = False
 
+    # Minimum Jaccard similarity for /api/subscriptions/match
+    FINGERPRINT_MATCH_THRESHOLD = float(os.environ.get("FINGERPRINT_MATCH_THRESHOLD", 0.6))
+
+    # Heartbeats are coalesced in memory and written once per window
+    HEARTBEAT_FLUSH_SECONDS = int(os.environ.get("HEARTBEAT_FLUSH_SECONDS", 30))
+    HEARTBEAT_MAX_BATCH = int(os.environ.get("HEARTBEAT_MAX_BATCH", 5000))
+
+    # License/login history: writer interval, batch that triggers an early write,
+    # and most committed events held in memory per worker (oldest dropped beyond)
+    EVENT_LOG_FLUSH_SECONDS = float(os.environ.get("EVENT_LOG_FLUSH_SECONDS", 2))
+    EVENT_LOG_BATCH = int(os.environ.get("EVENT_LOG_BATCH", 1000))
+    EVENT_LOG_MAX_BUFFER = int(os.environ.get("EVENT_LOG_MAX_BUFFER", 20000))
+
+    # Idempotency-Key: stored response lifetime and duplicate wait time
+    IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 86400))
+    IDEMPOTENCY_WAIT_SECONDS = int(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", 10))
+
+    # Live admin feed: poll interval of the per-worker producer, full recount
+    # interval, and how long one SSE connection stays open before reconnecting
+    LIVE_FEED_POLL_SECONDS = float(os.environ.get("LIVE_FEED_POLL_SECONDS", 2))
+    LIVE_FEED_RESYNC_SECONDS = int(os.environ.get("LIVE_FEED_RESYNC_SECONDS", 300))
+    LIVE_FEED_STREAM_SECONDS = int(os.environ.get("LIVE_FEED_STREAM_SECONDS", 300))
+
+    # License long-poll: longest wait per request and most concurrent waiters per worker
+    # (gunicorn.conf.py lowers the cap to the spare threads of a threaded worker)
+    LICENSE_POLL_MAX_SECONDS = int(os.environ.get("LICENSE_POLL_MAX_SECONDS", 60))
+    LICENSE_POLL_MAX_WAITERS = int(os.environ.get("LICENSE_POLL_MAX_WAITERS", 1000))
+
+    # Periodic jobs (jobs.py) run on one elected worker; the others retry the
+    # election this often. SQLite deployments elect by flock on SCHEDULER_LOCK_FILE
+    # (default: next to the database file)
+    SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "1") == "1"
+    SCHEDULER_ELECTION_SECONDS = int(os.environ.get("SCHEDULER_ELECTION_SECONDS", 15))
+    SCHEDULER_LOCK_FILE = os.environ.get("SCHEDULER_LOCK_FILE")
+
+    # Expired OTPs are kept this long before the purge job deletes them
+    OTP_RETENTION_HOURS = int(os.environ.get("OTP_RETENTION_HOURS", 24))
+
+    # Statement budget per blueprint in ms ("subscriptions=200,admin=5000"); a query
+    # over budget is cancelled and the request answered with 503. 0 = no limit
+    STATEMENT_TIMEOUTS_MS = {
+        name.strip(): int(ms)
+        for name, ms in (
+            item.split("=") for item in os.environ.get(
+                "STATEMENT_TIMEOUTS_MS",
+                "subscriptions=200,auth=1000,otp=1000,users=1000,machines=1000,admin=5000"
+            ).split(",") if item.strip()
+        )
+    }
+    STATEMENT_TIMEOUT_DEFAULT_MS = int(os.environ.get("STATEMENT_TIMEOUT_DEFAULT_MS", 0))
+
+    # Traffic capture for benchmarks/replay.py: sampled, sanitized request shapes (0 = off)
+    CAPTURE_SAMPLE_RATE = float(os.environ.get("CAPTURE_SAMPLE_RATE", 0.0))
+    CAPTURE_FILE = os.environ.get("CAPTURE_FILE", os.path.join(basedir, "captures", "requests.jsonl"))
+
+    # Per-request profiling (off unless PROFILE_SECRET or PROFILE_SAMPLE_RATE is set)
+    PROFILE_SECRET = os.environ.get("PROFILE_SECRET")
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.0))
+    PROFILE_MODE = os.environ.get("PROFILE_MODE", "sampling")  # or "cprofile"
+    PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 1))
+    PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(basedir, "profiles"))
+    PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 200))
+
     # App security
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key")
 
+    # Access tokens (HMAC-signed, stateless) and refresh tokens (user_sessions)
+    TOKEN_SECRET = os.environ.get("TOKEN_SECRET")
+    ACCESS_TOKEN_SECONDS = int(os.environ.get("ACCESS_TOKEN_SECONDS", 900))
+    REFRESH_TOKEN_DAYS = int(os.environ.get("REFRESH_TOKEN_DAYS", 30))
+    TOKEN_REVOCATION_REFRESH_SECONDS = int(os.environ.get("TOKEN_REVOCATION_REFRESH_SECONDS", 30))
+    # Accept the old user_id parameter from clients that do not send a token yet
+    ALLOW_LEGACY_USER_ID = os.environ.get("ALLOW_LEGACY_USER_ID", "1") == "1"
+
     # CORS
     CORS_ORIGINS = os.environ.get(
         "CORS_ORIGINS",
@@ -37,6 +128,7 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     DEBUG = True
     TESTING = True
+    SCHEDULER_ENABLED = False
 
 config = {
     'development': DevelopmentConfig,
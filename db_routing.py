@@ -0,0 +1,217 @@
+"""
+Read-replica routing for the SQLAlchemy session.
+
+Replicas are configured as extra SQLALCHEMY_BINDS named ``replica_<n>``.
+Views decorated with ``@read_replica`` read from a healthy replica; every
+flush, every request that has already written, and every client inside its
+read-after-write window goes to the primary.
+
+Health checks never run on a request thread: a request sees the last known
+status and a stale entry is re-probed in the background. A replica that
+drops a connection mid-request is marked down and the read-only view is
+run once more on the primary.
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+logger = logging.getLogger(__name__)
+
+REPLICA_PREFIX = "replica_"
+STICKY_COOKIE = "db_primary_until"
+
+
+# =========================
+# Replica health
+# =========================
+class ReplicaMonitor:
+    """Tracks replica health and hands out replicas round-robin"""
+
+    def __init__(self):
+        self.check_interval = 10  # seconds
+        self._lock = threading.Lock()
+        self._status = {}  # bind key -> (healthy, checked_at)
+        self._probing = set()
+        self._counter = itertools.count()
+
+    def mark_down(self, key):
+        with self._lock:
+            self._status[key] = (False, time.monotonic())
+        logger.warning(f"Replica {key} marked unhealthy, falling back to primary")
+
+    def is_healthy(self, key, engine):
+        """Last known health; a stale (or never checked) replica is re-probed in the background"""
+        healthy, checked_at = self._status.get(key, (True, None))
+
+        if checked_at is None or time.monotonic() - checked_at >= self.check_interval:
+            self._probe_in_background(key, engine)
+        return healthy
+
+    def _probe_in_background(self, key, engine):
+        with self._lock:
+            if key in self._probing:
+                return
+            self._probing.add(key)
+        threading.Thread(
+            target=self._probe, args=(key, engine), name=f"replica-probe-{key}", daemon=True
+        ).start()
+
+    def _probe(self, key, engine):
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            healthy = True
+        except Exception as e:
+            logger.error(f"Replica {key} health check failed: {e}")
+            healthy = False
+
+        with self._lock:
+            self._status[key] = (healthy, time.monotonic())
+            self._probing.discard(key)
+
+    def _after_fork(self):
+        # Probe threads do not survive fork; their keys must not stay claimed
+        self._lock = threading.Lock()
+        self._probing = set()
+
+    def pick(self, engines):
+        keys = sorted(k for k in engines if k and k.startswith(REPLICA_PREFIX))
+        if not keys:
+            return None
+
+        start = next(self._counter)
+        for i in range(len(keys)):
+            key = keys[(start + i) % len(keys)]
+            if self.is_healthy(key, engines[key]):
+                return engines[key]
+        return None
+
+    def status(self):
+        return {
+            key: {'healthy': healthy, 'checked_ago': round(time.monotonic() - checked_at, 1)}
+            for key, (healthy, checked_at) in self._status.items()
+        }
+
+# Singleton instance
+replica_monitor = ReplicaMonitor()
+os.register_at_fork(after_in_child=replica_monitor._after_fork)
+
+
+# =========================
+# Routing session
+# =========================
+def _replica_allowed():
+    if not has_request_context():
+        return False
+    return (
+        g.get('db_read_only', False)
+        and not g.get('db_sticky', False)
+        and not g.get('db_wrote', False)
+    )
+
+
+class RoutingSession(Session):
+    """Sends reads from ``@read_replica`` views to a replica, everything else to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+        if bind is not None or self._flushing or not _replica_allowed():
+            return engine
+
+        engines = self._db.engines
+        if engine is not engines.get(None):
+            return engine
+
+        return replica_monitor.pick(engines) or engine
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _record_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+def read_replica(view):
+    """Mark a view as read-only so its queries may be served by a replica"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        try:
+            response = view(*args, **kwargs)
+        except Exception:
+            if not g.get('db_replica_failed'):
+                raise
+            response = None
+
+        if g.pop('db_replica_failed', False):
+            # The replica dropped mid-view; the view only reads, so run it once more on the primary
+            logger.warning(f"Retrying {request.endpoint} on the primary after a replica failure")
+            current_app.extensions['sqlalchemy'].session.rollback()
+            g.db_read_only = False
+            response = view(*args, **kwargs)
+        return response
+
+    return wrapper
+
+
+# =========================
+# App wiring
+# =========================
+def setup_db_routing(app, db):
+    """Read-your-writes stickiness, replica error fallback and health interval"""
+
+    sticky_seconds = app.config.get("READ_AFTER_WRITE_SECONDS", 5)
+    replica_monitor.check_interval = app.config.get("REPLICA_HEALTH_INTERVAL", 10)
+
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if key and key.startswith(REPLICA_PREFIX):
+                _watch_replica(key, engine)
+
+    @app.before_request
+    def load_sticky_window():
+        until = request.cookies.get(STICKY_COOKIE, type=float)
+        g.db_sticky = bool(until and until > time.time())
+
+    @app.after_request
+    def set_sticky_window(response):
+        if g.get('db_wrote') and sticky_seconds:
+            response.set_cookie(
+                STICKY_COOKIE,
+                str(time.time() + sticky_seconds),
+                max_age=sticky_seconds,
+                httponly=True,
+            )
+        return response
+
+
+def _watch_replica(key, engine):
+    @event.listens_for(engine, "handle_error")
+    def on_error(context):
+        if context.is_disconnect or context.connection is None:
+            replica_monitor.mark_down(key)
+            if has_request_context() and g.get('db_read_only'):
+                g.db_replica_failed = True
+
+
+def pool_stats(db):
+    """Connection pool counters for every configured engine"""
+    stats = {}
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        entry = {'pool': type(pool).__name__, 'status': pool.status()}
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            if hasattr(pool, name):
+                entry[name] = getattr(pool, name)()
+        stats[key or 'primary'] = entry
+    return stats
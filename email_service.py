@@ -1,10 +1,7 @@
-import smtplib
 import secrets
 import string
 import logging
 import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +32,11 @@ class EmailService:
             logger.error("Email service not configured")
             return False, "Email service not configured"
         
+        # Imported lazily to keep app startup cheap
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        
         try:
             message = MIMEMultipart("alternative")
             message["Subject"] = "Email Verification - OTP Code"
@@ -1,4 +1,5 @@
 # email_worker.py
+import os
 import threading
 import queue
 import logging
@@ -8,6 +9,9 @@ logger = logging.getLogger(__name__)
 
 email_queue = queue.Queue()
 
+_worker_lock = threading.Lock()
+_worker_pid = None
+
 def email_worker():
     while True:
         email, otp = email_queue.get()
@@ -19,4 +23,18 @@ def email_worker():
         finally:
             email_queue.task_done()
 
-threading.Thread(target=email_worker, daemon=True).start()
+def start_email_worker():
+    """Start the worker thread once per process (safe to call after fork)"""
+    global email_queue, _worker_pid
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        if _worker_pid is not None:
+            # Forked from a parent that had a worker: its thread did not survive
+            email_queue = queue.Queue()
+        _worker_pid = os.getpid()
+        threading.Thread(target=email_worker, daemon=True).start()
+
+def enqueue_otp_email(email, otp):
+    start_email_worker()
+    email_queue.put((email, otp))
@@ -4,9 +4,6 @@ Uses AES-256 encryption with Fernet (symmetric encryption)
 Same key derivation as desktop backend to ensure compatibility
 """
 
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
 import json
 import os
@@ -25,6 +22,10 @@ class LicenseEncryption:
         if not password:
             raise Exception("LICENSE_MASTER_KEY not set in environment")
         
+        # Imported lazily: cryptography is slow to import and only activation needs it
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+        
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
@@ -38,6 +39,7 @@ class LicenseEncryption:
     def encrypt_license_data(cls, license_data: dict) -> str:
         try:
             json_data = json.dumps(license_data)
+            from cryptography.fernet import Fernet
             key = cls._derive_key(cls.MASTER_PASSWORD, cls.SALT)
             cipher = Fernet(key)
             encrypted_data = cipher.encrypt(json_data.encode())
@@ -48,6 +50,7 @@ class LicenseEncryption:
     @classmethod
     def decrypt_license_data(cls, encrypted_data: str) -> dict:
         try:
+            from cryptography.fernet import Fernet
             key = cls._derive_key(cls.MASTER_PASSWORD, cls.SALT)
             cipher = Fernet(key)
             decrypted_data = cipher.decrypt(encrypted_data.encode())
@@ -0,0 +1,179 @@
+"""
+Append-only license and login history (``license_events``).
+
+Views call ``record_event(...)`` inside their transaction. The event is
+kept on the session and handed to the per-process buffer only when the
+transaction commits, so rolled-back work leaves no history. A writer
+thread bulk-inserts the buffer every EVENT_LOG_FLUSH_SECONDS (sooner once
+EVENT_LOG_BATCH events are waiting) and once more at exit; requests never
+wait on the insert. The buffer holds at most EVENT_LOG_MAX_BUFFER events:
+if the database falls behind, the oldest are dropped and counted instead
+of growing memory.
+"""
+
+import atexit
+import os
+import threading
+import uuid
+import logging
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import event
+
+from db_routing import RoutingSession
+from models import db, LicenseEvent
+from pagination import newest_first
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ('activation', 'upgrade', 'deactivation', 'reactivation', 'extension', 'login', 'logout')
+COLUMNS = [c.name for c in LicenseEvent.__table__.columns]
+INSERT_CHUNK = 1000
+
+
+def _uuid(value):
+    if value is None or isinstance(value, uuid.UUID):
+        return value
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def make_event(event_type, **fields):
+    """Row dict for license_events (every column present, for executemany)"""
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Unknown event type {event_type}")
+    row = dict.fromkeys(COLUMNS)
+    row.update(fields)
+    row['id'] = uuid.uuid4()
+    row['event_type'] = event_type
+    row['occurred_at'] = row['occurred_at'] or datetime.utcnow()
+    row['user_id'] = _uuid(row['user_id'])
+    return row
+
+
+def write_events(rows):
+    """Insert event rows in the current transaction (caller commits)"""
+    for i in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(LicenseEvent.__table__.insert(), rows[i:i + INSERT_CHUNK])
+
+
+class EventLog:
+    """Committed events waiting to be written"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = deque()
+        self._wake = threading.Event()
+        self._writer_pid = None
+        self.max_buffer = 20000
+        self.batch_size = 1000
+        self.dropped = 0
+
+    def add(self, rows):
+        with self._lock:
+            self._buffer.extend(rows)
+            overflow = len(self._buffer) - self.max_buffer
+            for _ in range(max(overflow, 0)):
+                self._buffer.popleft()
+            if overflow > 0:
+                self.dropped += overflow
+            full = len(self._buffer) >= self.batch_size
+        if overflow > 0:
+            logger.warning(f"Event log buffer full, dropped {overflow} oldest events")
+        if full:
+            self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def _drain(self):
+        with self._lock:
+            rows = list(self._buffer)
+            self._buffer.clear()
+        return rows
+
+    def _requeue(self, rows):
+        with self._lock:
+            self._buffer.extendleft(reversed(rows))
+            overflow = len(self._buffer) - self.max_buffer
+            for _ in range(max(overflow, 0)):
+                self._buffer.popleft()
+            if overflow > 0:
+                self.dropped += overflow
+
+    def flush(self, app):
+        """Write everything buffered; returns events written"""
+        rows = self._drain()
+        if not rows:
+            return 0
+
+        with app.app_context():
+            try:
+                write_events(rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Event log flush failed: {e}")
+                # Keep them for the next round
+                self._requeue(rows)
+                return 0
+            finally:
+                db.session.remove()
+
+        return len(rows)
+
+    def start_writer(self, app):
+        """Start the writer thread once per process (safe to call after fork)"""
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+
+        self.max_buffer = app.config.get("EVENT_LOG_MAX_BUFFER", 20000)
+        self.batch_size = app.config.get("EVENT_LOG_BATCH", 1000)
+        interval = app.config.get("EVENT_LOG_FLUSH_SECONDS", 2)
+
+        def run():
+            while True:
+                self._wake.wait(interval)
+                self._wake.clear()
+                self.flush(app)
+
+        threading.Thread(target=run, name="event-log-writer", daemon=True).start()
+        atexit.register(self.flush, app)
+
+# Singleton instance
+event_log = EventLog()
+
+
+# =========================
+# Transaction hooks
+# =========================
+def record_event(event_type, **fields):
+    """Log an event; it is buffered only if the current transaction commits"""
+    db.session.info.setdefault('license_events', []).append(make_event(event_type, **fields))
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _buffer_committed_events(session):
+    rows = session.info.pop('license_events', None)
+    if rows:
+        event_log.add(rows)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_events(session):
+    session.info.pop('license_events', None)
+
+
+# =========================
+# Reads
+# =========================
+def timeline(before=None, limit=50, **filters):
+    """Newest-first events for one license_id, user_id or machine_fingerprint after cursor `before`"""
+    query = newest_first(LicenseEvent.query.filter_by(**filters), LicenseEvent.occurred_at, LicenseEvent.id, before)
+    return query.limit(limit).all()
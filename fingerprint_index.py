@@ -0,0 +1,128 @@
+"""
+Drift-tolerant license matching over fingerprint_components.
+
+Every component of a license is hashed (name + value) into
+``license_components``, an inverted index keyed by component hash. A lookup
+reads one bounded posting list per component, counts shared components per
+license and scores the best candidates by exact Jaccard similarity. Cost is
+O(components x MAX_POSTINGS) regardless of how many licenses exist.
+"""
+
+import hashlib
+import json
+import logging
+from collections import Counter
+
+from models import db, License, LicenseComponent, FingerprintComponentSet
+from component_sets import load_components
+
+logger = logging.getLogger(__name__)
+
+# Components shared by more licenses than this (OS name, vendor...) carry no signal
+MAX_POSTINGS = 1000
+# Candidates scored exactly after the posting-list vote
+CANDIDATES = 5
+
+
+def component_hashes(components):
+    """Stable 64-bit hashes for a fingerprint_components payload (dict or list)"""
+    if isinstance(components, dict):
+        items = (
+            f"{name}={json.dumps(value, sort_keys=True)}"
+            for name, value in components.items()
+            if value not in (None, '', [], {})
+        )
+    elif isinstance(components, list):
+        items = (json.dumps(value, sort_keys=True) for value in components if value)
+    else:
+        return set()
+
+    return {hashlib.sha256(item.encode()).hexdigest()[:16] for item in items}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# =========================
+# Incremental maintenance
+# =========================
+def index_license(license_id, components):
+    """Replace the indexed components of one license (caller commits)"""
+    LicenseComponent.query.filter_by(license_id=license_id).delete(synchronize_session=False)
+
+    hashes = component_hashes(components)
+    if hashes:
+        db.session.execute(
+            LicenseComponent.__table__.insert(),
+            [{'component_hash': h, 'license_id': license_id} for h in hashes]
+        )
+
+
+def rebuild_index(chunk_size=5000):
+    """Backfill the index from every license's component set"""
+    db.session.execute(LicenseComponent.__table__.delete())
+    db.session.commit()
+
+    indexed = 0
+    last_id = ''
+    while True:
+        rows = db.session.query(License.license_id, FingerprintComponentSet.components).outerjoin(
+            FingerprintComponentSet, FingerprintComponentSet.components_hash == License.components_hash
+        ).filter(
+            License.license_id > last_id
+        ).order_by(License.license_id).limit(chunk_size).all()
+        if not rows:
+            break
+
+        entries = [
+            {'component_hash': h, 'license_id': license_id}
+            for license_id, components in rows
+            for h in component_hashes(components)
+        ]
+        if entries:
+            db.session.execute(LicenseComponent.__table__.insert(), entries)
+        db.session.commit()
+
+        indexed += len(rows)
+        last_id = rows[-1][0]
+
+    return indexed
+
+
+# =========================
+# Lookup
+# =========================
+def find_similar(components, exclude_fingerprint=None, limit=CANDIDATES):
+    """
+    Return [(license, similarity)] for the closest licenses, best first.
+    """
+    query_hashes = component_hashes(components)
+    if not query_hashes:
+        return []
+
+    votes = Counter()
+    for h in query_hashes:
+        postings = db.session.query(LicenseComponent.license_id).filter_by(
+            component_hash=h
+        ).limit(MAX_POSTINGS + 1).all()
+        if len(postings) > MAX_POSTINGS:
+            continue
+        votes.update(license_id for (license_id,) in postings)
+
+    if not votes:
+        return []
+
+    candidate_ids = [license_id for license_id, _ in votes.most_common(limit * 2)]
+    candidates = License.query.filter(License.license_id.in_(candidate_ids)).all()
+    payloads = load_components(lic.components_hash for lic in candidates)
+
+    scored = [
+        (lic, jaccard(query_hashes, component_hashes(payloads.get(lic.components_hash))))
+        for lic in candidates
+        if lic.machine_fingerprint != exclude_fingerprint
+    ]
+    scored.sort(key=lambda pair: pair[1], reverse=True)
+    return scored[:limit]
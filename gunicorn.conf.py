@@ -0,0 +1,56 @@
+# gunicorn.conf.py
+# Load the app once in the master and fork it into workers. Importing the
+# app does no I/O and starts no threads, so forking it is safe; each worker
+# starts its own background threads in post_fork.
+
+import os
+
+preload_app = True
+
+# Threaded workers: an open /admin/live stream holds a thread, not a process.
+# With many desktop clients long-polling license changes use "gevent", where
+# each idle request is a greenlet instead of a thread.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 2000))
+
+# Threaded workers: request threads kept free of license long-polls
+_poll_reserved_threads = int(os.environ.get("LICENSE_POLL_RESERVED_THREADS", 4))
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        _make_psycopg2_cooperative()
+    
+    from app import app, init_worker
+    _cap_poll_waiters(app)
+    init_worker(app)
+
+def _cap_poll_waiters(app):
+    """Each long-poll waiter holds a request thread unless the worker is gevent"""
+    if worker_class == "gevent":
+        return
+    available = threads - _poll_reserved_threads if worker_class == "gthread" else 0
+    app.config['LICENSE_POLL_MAX_WAITERS'] = max(min(app.config['LICENSE_POLL_MAX_WAITERS'], available), 0)
+
+def _make_psycopg2_cooperative():
+    """Yield to other greenlets while psycopg2 waits on the server"""
+    try:
+        import psycopg2
+        from psycopg2 import extensions
+    except ImportError:
+        return
+    from gevent.socket import wait_read, wait_write
+    
+    def wait(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                return
+            if state == extensions.POLL_READ:
+                wait_read(conn.fileno(), timeout=timeout)
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno(), timeout=timeout)
+            else:
+                raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+    
+    extensions.set_wait_callback(wait)
@@ -0,0 +1,110 @@
+"""
+Coalescing heartbeat buffer.
+
+Heartbeats are only recorded in memory. A per-process flusher thread writes
+them every HEARTBEAT_FLUSH_SECONDS as one bulk UPDATE per table, so a
+machine costs at most one write per window no matter how often it reports.
+"""
+
+import atexit
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+
+from models import db, Machine, MachineLogin, UserSession
+
+logger = logging.getLogger(__name__)
+
+UPDATE_CHUNK = 500
+
+
+class HeartbeatBuffer:
+    """Machine IDs and fingerprints seen since the last flush"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._machine_ids = set()
+        self._fingerprints = set()
+        self._flusher_pid = None
+
+    def record(self, machine_ids=(), fingerprints=()):
+        with self._lock:
+            self._machine_ids.update(machine_ids)
+            self._fingerprints.update(fingerprints)
+
+    def pending(self):
+        with self._lock:
+            return len(self._machine_ids) + len(self._fingerprints)
+
+    def _drain(self):
+        with self._lock:
+            machine_ids, self._machine_ids = self._machine_ids, set()
+            fingerprints, self._fingerprints = self._fingerprints, set()
+        return machine_ids, fingerprints
+
+    def flush(self, app):
+        """Write everything buffered; returns rows updated"""
+        machine_ids, fingerprints = self._drain()
+        if not machine_ids and not fingerprints:
+            return 0
+
+        now = datetime.utcnow()
+        updated = 0
+        with app.app_context():
+            try:
+                for chunk in _chunks(machine_ids):
+                    updated += Machine.query.filter(Machine.machine_id.in_(chunk)).update(
+                        {Machine.last_seen: now}, synchronize_session=False
+                    )
+                    updated += MachineLogin.query.filter(MachineLogin.machine_id.in_(chunk)).update(
+                        {MachineLogin.last_activity: now}, synchronize_session=False
+                    )
+                    updated += UserSession.query.filter(
+                        UserSession.machine_id.in_(chunk),
+                        UserSession.is_active.is_(True)
+                    ).update({UserSession.last_activity: now}, synchronize_session=False)
+
+                for chunk in _chunks(fingerprints):
+                    updated += MachineLogin.query.filter(MachineLogin.machine_fingerprint.in_(chunk)).update(
+                        {MachineLogin.last_activity: now}, synchronize_session=False
+                    )
+
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Heartbeat flush failed: {e}")
+                # Keep them for the next window
+                self.record(machine_ids, fingerprints)
+                return 0
+            finally:
+                db.session.remove()
+
+        return updated
+
+    def start_flusher(self, app):
+        """Start the flush thread once per process (safe to call after fork)"""
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+
+        interval = app.config.get("HEARTBEAT_FLUSH_SECONDS", 30)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.flush(app)
+
+        threading.Thread(target=run, name="heartbeat-flusher", daemon=True).start()
+        atexit.register(self.flush, app)
+
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), UPDATE_CHUNK):
+        yield values[i:i + UPDATE_CHUNK]
+
+# Singleton instance
+heartbeat_buffer = HeartbeatBuffer()
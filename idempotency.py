@@ -0,0 +1,235 @@
+"""
+Idempotency-Key support for state-changing POSTs.
+
+The first request with a key claims it by inserting a pending row in
+``idempotency_keys``; its response is stored there and in a bounded
+in-process cache. Retries with the same key replay the stored response
+without running the view. Duplicates that arrive while the first request
+is still running wait for it (in-process via an Event, across workers by
+polling the row) instead of racing it.
+
+Keys are scoped to the caller (the token's user, when there is one), so
+two users sending the same key never see each other's responses; a key
+reused with a different body is answered with 422. Only successful
+responses are kept: a 4xx or 5xx changed nothing, so the key is released
+and the client may retry, corrected, under the same key.
+"""
+
+import hashlib
+import threading
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, g, jsonify, make_response, request
+from sqlalchemy.exc import IntegrityError
+
+from models import db, IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.1  # seconds
+
+
+class ResponseCache:
+    """Bounded LRU of completed responses with per-entry expiry"""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, request_hash, status, body, content_type)
+        self._in_flight = {}  # key -> threading.Event
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1:]
+
+    def put(self, key, ttl, request_hash, status, body, content_type):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, request_hash, status, body, content_type)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def begin(self, key):
+        """Returns (event, owner): owner is False if another thread holds the key"""
+        with self._lock:
+            event = self._in_flight.get(key)
+            if event is not None:
+                return event, False
+            event = self._in_flight[key] = threading.Event()
+            return event, True
+
+    def end(self, key):
+        with self._lock:
+            event = self._in_flight.pop(key, None)
+        if event:
+            event.set()
+
+# Singleton instance
+response_cache = ResponseCache()
+
+
+def _replay(request_hash, stored):
+    stored_hash, status, body, content_type = stored
+    if stored_hash != request_hash:
+        return jsonify({
+            'error': 'Idempotency-Key was already used with a different request',
+            'code': 'IDEMPOTENCY_KEY_REUSED'
+        }), 422
+
+    response = make_response(body, status)
+    response.headers['Content-Type'] = content_type or 'application/json'
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _load(key):
+    db.session.expire_all()
+    record = db.session.get(IdempotencyKey, key)
+    if record is not None and record.expires_at < datetime.utcnow():
+        db.session.delete(record)
+        db.session.commit()
+        return None
+    return record
+
+
+def _claim(key, request_hash, pending_seconds):
+    """Insert the pending row; returns the existing record if someone else holds the key"""
+    for _ in range(2):
+        try:
+            db.session.add(IdempotencyKey(
+                key=key,
+                request_hash=request_hash,
+                expires_at=datetime.utcnow() + timedelta(seconds=pending_seconds)
+            ))
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+            record = _load(key)
+            if record is not None:
+                return record
+    raise RuntimeError(f"Could not claim idempotency key {key}")
+
+
+def _wait_for(key, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        record = _load(key)
+        if record is None or record.is_complete:
+            return record
+        time.sleep(POLL_INTERVAL)
+    return _load(key)
+
+
+def idempotent(view):
+    """Replay stored responses for requests that repeat an Idempotency-Key"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        client_key = request.headers.get(HEADER)
+        if not client_key:
+            return view(*args, **kwargs)
+
+        if len(client_key) > MAX_KEY_LENGTH:
+            return jsonify({'error': 'Idempotency-Key too long'}), 400
+
+        config = current_app.config
+        ttl = config.get('IDEMPOTENCY_TTL_SECONDS', 86400)
+        wait_seconds = config.get('IDEMPOTENCY_WAIT_SECONDS', 10)
+
+        # Apply inside token_auth so the caller is known
+        caller = g.user_id if g.get('authenticated') else 'anonymous'
+        scoped = hashlib.sha256(f"{caller}:{client_key}".encode()).hexdigest()
+        key = f"{request.endpoint}:{scoped}"
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+
+        stored = response_cache.get(key)
+        if stored:
+            return _replay(request_hash, stored)
+
+        # Same-process duplicate: wait for the in-flight request to finish
+        event, owner = response_cache.begin(key)
+        deadline = time.monotonic() + wait_seconds
+        while not owner:
+            if not event.wait(max(deadline - time.monotonic(), 0)):
+                return jsonify({'error': 'Request with this Idempotency-Key is still in progress'}), 409
+            stored = response_cache.get(key)
+            if stored:
+                return _replay(request_hash, stored)
+            # It failed and released the key: take over
+            event, owner = response_cache.begin(key)
+
+        try:
+            pending_seconds = wait_seconds * 6
+            record = _claim(key, request_hash, pending_seconds)
+            if record is not None and not record.is_complete:
+                # Another worker is running it
+                record = _wait_for(key, wait_seconds)
+                if record is None:
+                    # It failed and released the key: take over
+                    record = _claim(key, request_hash, pending_seconds)
+                if record is not None and not record.is_complete:
+                    return jsonify({'error': 'Request with this Idempotency-Key is still in progress'}), 409
+
+            if record is not None:
+                stored = (record.request_hash, record.status_code, record.response_body, record.content_type)
+                response_cache.put(key, ttl, *stored)
+                return _replay(request_hash, stored)
+
+            response = make_response(view(*args, **kwargs))
+            _store(key, ttl, request_hash, response)
+            return response
+        finally:
+            response_cache.end(key)
+
+    return wrapper
+
+
+def _store(key, ttl, request_hash, response):
+    try:
+        record = db.session.get(IdempotencyKey, key)
+
+        # Failed requests are not stored so the client can retry them
+        if response.status_code >= 400:
+            if record is not None:
+                db.session.delete(record)
+                db.session.commit()
+            return
+
+        if record is None:
+            record = IdempotencyKey(key=key, request_hash=request_hash)
+            db.session.add(record)
+
+        body = response.get_data(as_text=True)
+        record.status_code = response.status_code
+        record.response_body = body
+        record.content_type = response.content_type
+        record.expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        db.session.commit()
+
+        response_cache.put(key, ttl, request_hash, response.status_code, body, response.content_type)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Idempotency store failed for {key}: {e}")
+
+
+def purge_expired():
+    """Delete expired keys; returns rows removed"""
+    removed = IdempotencyKey.query.filter(
+        IdempotencyKey.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
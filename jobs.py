@@ -0,0 +1,63 @@
+"""
+Periodic maintenance jobs, run by the single-leader scheduler (scheduler.py).
+
+Importing this module only registers the jobs. Each job is short, commits
+its own work and is safe to run twice: a job whose leader dies mid-run is
+simply run again by the next leader.
+
+Buffer flushes (heartbeats, the event log) are not here: those buffers live
+in each worker's memory, so every worker keeps flushing its own.
+Rollups are not reconciled here either: rebuilding them from licenses is
+lossy (see rollups.py), so they are only ever backfilled by hand.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, License, OTP
+from idempotency import purge_expired
+from license_notifier import licenses_changed
+from scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+EXPIRY_SWEEP_SECONDS = 60
+# Overlap between sweeps: a missed or slow run is covered by the next one
+EXPIRY_WINDOW = timedelta(minutes=5)
+
+
+@scheduler.job('purge-expired-otps', every=3600, timeout=60)
+def purge_expired_otps():
+    """Delete OTPs expired for longer than OTP_RETENTION_HOURS"""
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config.get('OTP_RETENTION_HOURS', 24))
+    removed = OTP.query.filter(OTP.expires_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    if removed:
+        logger.info(f"Purged {removed} expired OTPs")
+    return removed
+
+
+@scheduler.job('purge-idempotency-keys', every=600, timeout=120)
+def purge_idempotency_keys():
+    """Drop stored responses past their Idempotency-Key TTL"""
+    removed = purge_expired()
+    if removed:
+        logger.info(f"Purged {removed} expired idempotency keys")
+    return removed
+
+
+@scheduler.job('announce-expiries', every=EXPIRY_SWEEP_SECONDS, timeout=30)
+def announce_expiries():
+    """Wake long-poll waiters of licenses that expired within the last EXPIRY_WINDOW"""
+    now = datetime.utcnow()
+    fingerprints = [fp for (fp,) in db.session.query(License.machine_fingerprint).filter(
+        License.is_active.is_(True),
+        License.expiry_date > now - EXPIRY_WINDOW,
+        License.expiry_date <= now
+    )]
+    # Repeats are harmless: a woken waiter answers only if the license version changed
+    licenses_changed(fingerprints)
+    db.session.commit()
+    return len(fingerprints)
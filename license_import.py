@@ -0,0 +1,353 @@
+"""
+Bulk license import (CSV or NDJSON) for customer migrations.
+
+Rows are streamed from the file and processed in chunks. Each chunk is
+validated, de-duplicated within itself and against the database with a
+single lookup, written in one transaction (``COPY`` on Postgres, one
+executemany INSERT elsewhere) together with its component sets, component
+index, daily rollups and activation events, and committed. A rejected row
+never stops the import; it is reported with its row number and reason.
+
+Because every chunk commits on its own, an interrupted import is resumed
+by passing the last committed row number as ``start_row``; rows that were
+already imported are rejected as duplicates anyway, so re-running a whole
+file is safe too.
+
+Columns (CSV header or NDJSON keys): machine_fingerprint and plan_type are
+required; license_id, user_id (the owner, an existing user's UUID),
+activated_at, expiry_date (ISO dates; ones with an offset are converted to
+UTC, ones without are taken as UTC), is_active, mac_address, machine_id,
+machine_name, fingerprint_stability and fingerprint_components (JSON) are
+optional.
+"""
+
+import csv
+import io
+import json
+import time
+import uuid
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import or_, select
+
+from models import db, User, License, LicenseComponent, normalize_fingerprint
+from fingerprint_index import component_hashes
+from component_sets import components_digest, store_component_sets
+from license_notifier import licenses_changed
+from rollups import record_licenses
+from event_log import make_event, write_events
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_REJECTS = 1000
+FORMATS = ('csv', 'ndjson')
+
+COLUMNS = [
+    'id', 'license_id', 'user_id', 'machine_fingerprint', 'fingerprint_short', 'fingerprint_stability',
+    'mac_address', 'machine_id', 'machine_name', 'components_hash',
+    'plan_type', 'plan_name', 'plan_price', 'activated_at', 'expiry_date', 'is_active',
+    'fingerprint_mismatch_count', 'created_at', 'updated_at',
+]
+HEX_COLUMNS = {'machine_fingerprint', 'components_hash'}  # bytea in COPY
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n'}
+
+
+class RowError(ValueError):
+    """Row rejected by validation (the message is reported)"""
+
+
+# =========================
+# Reading
+# =========================
+def read_rows(stream, fmt):
+    """Yield (row number, dict) from a text stream; unparseable rows yield a RowError"""
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            yield number, row
+    elif fmt == 'ndjson':
+        number = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield number, RowError("invalid JSON")
+                continue
+            yield number, row if isinstance(row, dict) else RowError("not a JSON object")
+    else:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+
+
+def text_stream(binary):
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+# =========================
+# Validation
+# =========================
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _date(value, name):
+    """Naive UTC datetime, as stored everywhere else"""
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(value.strip())
+        except (AttributeError, ValueError):
+            raise RowError(f"{name} must be an ISO date")
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError("is_active must be true or false")
+
+
+def _components(value):
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise RowError("fingerprint_components must be JSON")
+    if not isinstance(value, (dict, list)):
+        raise RowError("fingerprint_components must be an object or list")
+    return value
+
+
+def license_values(row, now):
+    """Column values for one import row; raises RowError"""
+    from routes_subscriptions import PLANS
+
+    fingerprint = normalize_fingerprint(row.get('machine_fingerprint'))
+    if not fingerprint:
+        raise RowError("invalid machine_fingerprint")
+
+    plan_type = (row.get('plan_type') or '').strip()
+    if plan_type not in PLANS:
+        raise RowError(f"plan_type must be one of {', '.join(PLANS)}")
+    plan = PLANS[plan_type]
+
+    license_id = row.get('license_id')
+    if _blank(license_id):
+        license_id = f"LIC-{uuid.uuid4().hex[:12].upper()}"
+    elif len(str(license_id)) > 255:
+        raise RowError("license_id is too long")
+
+    activated_at = now if _blank(row.get('activated_at')) else _date(row['activated_at'], 'activated_at')
+    if _blank(row.get('expiry_date')):
+        expiry_date = activated_at + timedelta(days=plan['duration_days'])
+    else:
+        expiry_date = _date(row['expiry_date'], 'expiry_date')
+        if expiry_date < activated_at:
+            raise RowError("expiry_date is before activated_at")
+
+    try:
+        stability = 0 if _blank(row.get('fingerprint_stability')) else int(row['fingerprint_stability'])
+    except (TypeError, ValueError):
+        raise RowError("fingerprint_stability must be an integer")
+
+    user_id = None
+    if not _blank(row.get('user_id')):
+        try:
+            user_id = uuid.UUID(str(row['user_id']).strip())
+        except ValueError:
+            raise RowError("user_id must be a UUID")
+
+    components = None if _blank(row.get('fingerprint_components')) else _components(row['fingerprint_components'])
+    return {
+        'id': uuid.uuid4(),
+        'license_id': str(license_id).strip(),
+        'user_id': user_id,
+        'machine_fingerprint': fingerprint,
+        'fingerprint_short': fingerprint[:16],
+        'fingerprint_stability': stability,
+        'mac_address': None if _blank(row.get('mac_address')) else str(row['mac_address']).strip(),
+        'machine_id': None if _blank(row.get('machine_id')) else str(row['machine_id']).strip(),
+        'machine_name': None if _blank(row.get('machine_name')) else str(row['machine_name']).strip(),
+        'fingerprint_components': components,
+        'components_hash': components_digest(components),
+        'plan_type': plan_type,
+        'plan_name': plan['name'],
+        'plan_price': plan['price'],
+        'activated_at': activated_at,
+        'expiry_date': expiry_date,
+        'is_active': True if _blank(row.get('is_active')) else _bool(row['is_active']),
+        'fingerprint_mismatch_count': 0,
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+# =========================
+# Writing
+# =========================
+def _copy_value(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def _copy(table, columns, rows):
+    """COPY rows (lists of values) into table through the session's connection"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(_copy_value(value) for value in row)
+    buffer.seek(0)
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def write_chunk(rows):
+    """Insert validated license rows, their component sets and index (caller commits)"""
+    store_component_sets({
+        row['components_hash']: row['fingerprint_components'] for row in rows if row['components_hash']
+    })
+    index_rows = [
+        (h, row['license_id'])
+        for row in rows
+        for h in component_hashes(row['fingerprint_components'])
+    ]
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        _copy(License.__tablename__, COLUMNS, (
+            [f"\\x{row[c]}" if c in HEX_COLUMNS and row[c] else row[c] for c in COLUMNS] for row in rows
+        ))
+        if index_rows:
+            _copy(LicenseComponent.__tablename__, ['component_hash', 'license_id'], index_rows)
+    else:
+        # SQLite: one executemany per table inside the chunk's transaction
+        db.session.execute(License.__table__.insert(), rows)
+        if index_rows:
+            # ~8 rows per license; plain tuples skip SQLAlchemy's per-row parameter processing
+            db.session.connection().exec_driver_sql(
+                f"INSERT INTO {LicenseComponent.__tablename__} (component_hash, license_id) VALUES (?, ?)",
+                index_rows
+            )
+
+
+# =========================
+# Import
+# =========================
+class LicenseImport:
+    """One import run; `last_row` is the last row number committed (or skipped)"""
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, start_row=0, on_reject=None, on_chunk=None):
+        self.chunk_size = chunk_size
+        self.last_row = start_row
+        self.on_reject = on_reject
+        self.on_chunk = on_chunk
+        self.summary = {'imported': 0, 'rejected': 0, 'chunks': 0, 'start_row': start_row, 'rejects': []}
+
+    def run(self, rows):
+        started = time.perf_counter()
+        chunk = []
+        for number, row in rows:
+            if number <= self.summary['start_row']:
+                continue
+            chunk.append((number, row))
+            if len(chunk) >= self.chunk_size:
+                self._process(chunk)
+                chunk = []
+        if chunk:
+            self._process(chunk)
+
+        self.summary['last_row'] = self.last_row
+        self.summary['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return self.summary
+
+    def _reject(self, number, error):
+        self.summary['rejected'] += 1
+        if len(self.summary['rejects']) < MAX_REPORTED_REJECTS:
+            self.summary['rejects'].append({'row': number, 'error': error})
+        if self.on_reject:
+            self.on_reject(number, error)
+
+    def _process(self, chunk):
+        now = datetime.utcnow()
+        valid = {}  # fingerprint -> (row number, values)
+        license_ids = set()
+        for number, row in chunk:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                values = license_values(row, now)
+            except RowError as e:
+                self._reject(number, str(e))
+                continue
+            if values['machine_fingerprint'] in valid:
+                self._reject(number, "duplicate machine_fingerprint in file")
+            elif values['license_id'] in license_ids:
+                self._reject(number, "duplicate license_id in file")
+            else:
+                valid[values['machine_fingerprint']] = (number, values)
+                license_ids.add(values['license_id'])
+
+        if valid:
+            # One lookup per chunk for both unique keys
+            existing = db.session.execute(
+                select(License.machine_fingerprint, License.license_id).where(or_(
+                    License.machine_fingerprint.in_(list(valid)),
+                    License.license_id.in_(list(license_ids)),
+                ))
+            ).all()
+            taken_fingerprints = {row.machine_fingerprint for row in existing}
+            taken_ids = {row.license_id for row in existing}
+            owners = {values['user_id'] for _, values in valid.values() if values['user_id']}
+            known_owners = set(db.session.scalars(select(User.id).where(User.id.in_(owners)))) if owners else set()
+
+            rows = []
+            for fingerprint, (number, values) in valid.items():
+                if fingerprint in taken_fingerprints:
+                    self._reject(number, "machine_fingerprint already has a license")
+                elif values['license_id'] in taken_ids:
+                    self._reject(number, "license_id already exists")
+                elif values['user_id'] and values['user_id'] not in known_owners:
+                    self._reject(number, "user_id does not exist")
+                else:
+                    rows.append(values)
+
+            if rows:
+                try:
+                    write_chunk(rows)
+                    record_licenses(rows)
+                    write_events([
+                        make_event('activation', occurred_at=row['activated_at'], license_id=row['license_id'],
+                                   user_id=row['user_id'], machine_fingerprint=row['machine_fingerprint'], machine_id=row['machine_id'],
+                                   plan_type=row['plan_type'], details={'source': 'import'})
+                        for row in rows
+                    ])
+                    licenses_changed([row['machine_fingerprint'] for row in rows])
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+                self.summary['imported'] += len(rows)
+
+        self.summary['chunks'] += 1
+        self.last_row = chunk[-1][0]
+        if self.on_chunk:
+            self.on_chunk(self.last_row, self.summary)
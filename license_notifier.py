@@ -0,0 +1,155 @@
+"""
+License change notifications for long-polling desktop clients.
+
+Code that changes a License calls ``license_changed(fingerprint)`` before
+committing. When the transaction commits, waiters in this process are woken;
+on Postgres the same commit also delivers a NOTIFY that a listener thread
+in every other worker turns into a local wake-up. Waiting holds no database
+connection, and under the gevent worker (GUNICORN_WORKER_CLASS=gevent) a
+waiter is a greenlet rather than an OS thread.
+"""
+
+import hashlib
+import os
+import select
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+from sqlalchemy import event, text
+
+from db_routing import RoutingSession
+from models import db
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "license_changes"
+
+
+def license_version(lic):
+    """Opaque version of the client-visible license state ('none' if there is no license)"""
+    if lic is None:
+        return "none"
+    # status() so that passing expiry_date is a change (announced by jobs.announce_expiries)
+    state = f"{lic.license_id}|{lic.plan_type}|{lic.status()}|{lic.activated_at}|{lic.expiry_date}"
+    return hashlib.sha256(state.encode()).hexdigest()[:16]
+
+
+class LicenseNotifier:
+    """Per-process fingerprint -> waiting requests"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}  # fingerprint -> set of threading.Event
+        self._listener_pid = None
+
+    def waiting(self):
+        with self._lock:
+            return sum(len(events) for events in self._waiters.values())
+
+    @contextmanager
+    def subscribe(self, fingerprint):
+        """
+        Event set whenever the fingerprint's license changes while subscribed.
+        Subscribe before reading the license, so a change committed between
+        the read and the wait is not missed.
+        """
+        waiter = threading.Event()
+        with self._lock:
+            self._waiters.setdefault(fingerprint, set()).add(waiter)
+        try:
+            yield waiter
+        finally:
+            with self._lock:
+                events = self._waiters.get(fingerprint)
+                if events is not None:
+                    events.discard(waiter)
+                    if not events:
+                        del self._waiters[fingerprint]
+
+    def notify(self, fingerprints):
+        with self._lock:
+            events = [e for fp in fingerprints for e in self._waiters.get(fp, ())]
+        for waiter in events:
+            waiter.set()
+
+    # =========================
+    # Postgres LISTEN
+    # =========================
+    def start_listener(self, app):
+        """Listen for other workers' changes (Postgres only; once per process)"""
+        with app.app_context():
+            if db.engine.dialect.name != 'postgresql':
+                return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+
+        threading.Thread(target=self._listen, args=(app,), name="license-listener", daemon=True).start()
+
+    def _listen(self, app):
+        while True:
+            conn = None
+            try:
+                with app.app_context():
+                    conn = db.engine.raw_connection()
+                dbapi = conn.driver_connection
+                dbapi.autocommit = True
+                with dbapi.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+
+                while True:
+                    if select.select([dbapi], [], [], 30) == ([], [], []):
+                        continue
+                    dbapi.poll()
+                    fingerprints = {n.payload for n in dbapi.notifies}
+                    dbapi.notifies.clear()
+                    self.notify(fingerprints)
+            except Exception as e:
+                logger.error(f"License listener failed, reconnecting: {e}")
+                if conn is not None:
+                    try:
+                        conn.invalidate()
+                    except Exception:
+                        pass
+                time.sleep(5)
+
+# Singleton instance
+license_notifier = LicenseNotifier()
+
+
+# =========================
+# Transaction hooks
+# =========================
+def license_changed(fingerprint):
+    """Announce a license change; delivered only if the current transaction commits"""
+    if fingerprint:
+        licenses_changed([fingerprint])
+
+
+def licenses_changed(fingerprints):
+    """Batch form of license_changed (one statement for the whole batch)"""
+    fingerprints = [fp for fp in fingerprints if fp]
+    if not fingerprints:
+        return
+    db.session.info.setdefault('license_changes', set()).update(fingerprints)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # NOTIFY is transactional: sent on commit, dropped on rollback
+        db.session.execute(
+            text("SELECT pg_notify(:channel, fp) FROM unnest(CAST(:fps AS text[])) AS fp"),
+            {'channel': CHANNEL, 'fps': fingerprints}
+        )
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _wake_local_waiters(session):
+    fingerprints = session.info.pop('license_changes', None)
+    if fingerprints:
+        license_notifier.notify(fingerprints)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_changes(session):
+    session.info.pop('license_changes', None)
@@ -0,0 +1,213 @@
+"""
+Live admin feed (Server-Sent Events).
+
+One producer thread per worker polls for rows created since its last tick
+(new users, systems, logins and license activations, all range scans on
+indexed timestamps) and fans them out to every connected dashboard, so
+the database work depends on the rate of changes, not on how many admins
+are watching. Full counts are taken once when the first viewer connects
+and every LIVE_FEED_RESYNC_SECONDS after that to correct for deletes and
+deactivations, which the incremental queries do not see. With no viewers
+the producer is idle.
+"""
+
+import os
+import queue
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+
+from models import db, User, MachineLogin, License, UserSession
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+MAX_ROWS_PER_TICK = 200
+
+
+def format_event(app, event_type, data):
+    """SSE frame; data goes through the app's JSON provider, like every response"""
+    return f"event: {event_type}\ndata: {app.json.dumps(data)}\n\n"
+
+
+class LiveFeed:
+    """Per-process producer shared by all SSE subscribers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._wake = threading.Event()
+        self._producer_pid = None
+        self._counts = None
+        self._resynced_at = 0.0
+        self._since = None
+        self._floor = None  # rows before the last resync are already counted
+        self._seen = {}  # (table, id) -> timestamp, for the overlap window
+        self._truncated = False
+
+    # =========================
+    # Subscribers
+    # =========================
+    def subscribe(self, app):
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(q)
+        self.start(app)
+        self._wake.set()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def counts(self):
+        with self._lock:
+            return dict(self._counts) if self._counts else None
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event_type, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait((event_type, data))
+            except queue.Full:
+                # Too slow to keep up: drop it, EventSource reconnects and resyncs
+                self.unsubscribe(q)
+                _drain(q)
+                q.put_nowait((None, None))
+
+    # =========================
+    # Producer
+    # =========================
+    def start(self, app):
+        """Start the producer thread once per process (safe to call after fork)"""
+        with self._lock:
+            if self._producer_pid == os.getpid():
+                return
+            self._producer_pid = os.getpid()
+
+        threading.Thread(target=self._run, args=(app,), name="live-feed", daemon=True).start()
+
+    def _run(self, app):
+        interval = app.config.get('LIVE_FEED_POLL_SECONDS', 2)
+        while True:
+            if not self.subscriber_count():
+                # Nobody watching: forget state so the next viewer gets fresh counts
+                with self._lock:
+                    self._counts = None
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            with app.app_context():
+                try:
+                    self.tick(app)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Live feed tick failed: {e}")
+                finally:
+                    db.session.remove()
+            time.sleep(interval)
+
+    def tick(self, app):
+        now = datetime.utcnow()
+        config = app.config
+        if self._counts is None or time.monotonic() - self._resynced_at > config.get('LIVE_FEED_RESYNC_SECONDS', 300):
+            self._resync(now)
+            return
+
+        # Re-read a short window so rows committed late are not missed
+        overlap = timedelta(seconds=config.get('LIVE_FEED_OVERLAP_SECONDS', 10))
+        since = max(self._since - overlap, self._floor)
+        self._since = now
+
+        delta = {'total_users': 0, 'total_machines': 0, 'total_licenses': 0}
+
+        for user in self._new(User.created_at, since, User.id, User.name, User.email):
+            delta['total_users'] += 1
+            self.publish('user', {'id': str(user.id), 'name': user.name, 'email': user.email, 'at': user.at})
+
+        for login in self._new(MachineLogin.logged_in_at, since,
+                               MachineLogin.id, MachineLogin.machine_id, MachineLogin.current_email):
+            delta['total_machines'] += 1
+            self.publish('system', {
+                'id': str(login.id), 'machine_id': login.machine_id,
+                'email': login.current_email, 'at': login.at
+            })
+
+        for session in self._new(UserSession.logged_in_at, since,
+                                 UserSession.id, UserSession.machine_name, User.email,
+                                 join=(User, UserSession.user_id == User.id)):
+            self.publish('login', {
+                'id': str(session.id), 'email': session.email,
+                'machine_name': session.machine_name, 'at': session.at
+            })
+
+        for lic in self._new(License.activated_at, since,
+                             License.id, License.license_id, License.plan_type,
+                             License.is_active, License.created_at):
+            # Renewals of an existing license do not change the active count
+            if lic.is_active and lic.created_at and lic.created_at >= since:
+                delta['total_licenses'] += 1
+            self.publish('activation', {
+                'license_id': lic.license_id, 'plan_type': lic.plan_type, 'at': lic.at
+            })
+
+        self._prune_seen(since)
+        if self._truncated:
+            # More changes than one tick publishes: recount instead of trusting the deltas
+            self._truncated = False
+            self._resynced_at = 0.0
+        if any(delta.values()):
+            with self._lock:
+                for key, value in delta.items():
+                    self._counts[key] += value
+            self.publish('delta', delta)
+
+    def _new(self, column, since, *columns, join=None):
+        """Rows with `column` (returned as .at) after since that were not published yet"""
+        query = db.session.query(column.label('at'), *columns)
+        if join is not None:
+            query = query.join(*join)
+        rows = query.filter(column > since).order_by(column).limit(MAX_ROWS_PER_TICK).all()
+        self._truncated |= len(rows) == MAX_ROWS_PER_TICK
+
+        fresh = []
+        for row in rows:
+            key = (column.table.name, row.id)
+            if key not in self._seen:
+                self._seen[key] = row.at
+                fresh.append(row)
+        return fresh
+
+    def _prune_seen(self, since):
+        self._seen = {key: at for key, at in self._seen.items() if at and at > since}
+
+    def _resync(self, now):
+        counts = {
+            'total_users': User.query.count(),
+            'total_machines': MachineLogin.query.count(),
+            'total_licenses': License.query.filter_by(is_active=True).count(),
+        }
+        with self._lock:
+            self._counts = counts
+        self._resynced_at = time.monotonic()
+        self._since = self._floor = now
+        self._seen = {}
+        self.publish('counts', counts)
+
+
+def _drain(q):
+    while True:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            return
+
+# Singleton instance
+live_feed = LiveFeed()
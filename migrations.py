@@ -0,0 +1,389 @@
+"""
+Ordered, idempotent schema migrations for existing databases.
+
+`flask init-db` creates a fresh schema from the models and stamps every
+migration as applied; `flask db-upgrade` applies the pending ones to an
+existing database. Each migration must be safe on SQLite and Postgres.
+"""
+
+import json
+import logging
+import re
+from datetime import datetime
+
+from sqlalchemy import LargeBinary, inspect, text
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+
+def migration(migration_id):
+    """Register a migration function under a sortable id"""
+    def decorator(fn):
+        MIGRATIONS.append((migration_id, fn))
+        return fn
+    return decorator
+
+
+# =========================
+# Helpers
+# =========================
+def _dialect():
+    return db.engine.dialect.name
+
+
+def _has_column(table, column):
+    return column in {c['name'] for c in inspect(db.engine).get_columns(table)}
+
+
+def _create_index(name, table, columns, where=None):
+    sql = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+    if where:
+        sql += f" WHERE {where}"
+    db.session.execute(text(sql))
+
+
+# =========================
+# Migrations
+# =========================
+@migration('0001_activity_indexes')
+def activity_indexes():
+    """Range-count machines by last activity (heartbeat active counts)"""
+    _create_index('ix_machines_last_seen', 'machines', 'last_seen')
+    _create_index('ix_machine_logins_last_activity', 'machine_logins', 'last_activity')
+    _create_index('ix_user_sessions_last_activity', 'user_sessions', 'last_activity')
+
+
+@migration('0002_user_fk_on_delete_cascade')
+def user_fk_on_delete_cascade():
+    """ON DELETE CASCADE for every foreign key to users.id"""
+    for table in ('machines', 'machine_logins', 'user_sessions'):
+        fk = _user_fk(table)
+        if fk is None or (fk.get('options') or {}).get('ondelete', '').upper() == 'CASCADE':
+            continue
+        
+        if _dialect() == 'sqlite':
+            _rebuild_sqlite_table(table)
+        else:
+            name = fk['name']
+            db.session.execute(text(
+                f"ALTER TABLE {table} DROP CONSTRAINT {name}, "
+                f"ADD CONSTRAINT {name} FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE"
+            ))
+
+
+def _user_fk(table):
+    for fk in inspect(db.session.connection()).get_foreign_keys(table):
+        if fk['referred_table'] == 'users' and fk['constrained_columns'] == ['user_id']:
+            return fk
+    return None
+
+
+USER_FK_SQL = re.compile(
+    r'(FOREIGN KEY\s*\(\s*"?user_id"?\s*\)\s*REFERENCES\s+"?users"?\s*\(\s*"?id"?\s*\))'
+    r'(\s+ON DELETE\s+(?:CASCADE|RESTRICT|SET NULL|SET DEFAULT|NO ACTION))?',
+    re.IGNORECASE
+)
+
+
+def _rebuild_sqlite_table(table):
+    """
+    SQLite cannot alter constraints: recreate the table from its own DDL with
+    the user FK rewritten and copy every column. The current models are not
+    used, so columns later migrations still expect are kept.
+    """
+    ddl = db.session.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': table}
+    ).scalar()
+    new_ddl, count = USER_FK_SQL.subn(r'\1 ON DELETE CASCADE', ddl)
+    if count != 1:
+        raise RuntimeError(f"Cannot find the users foreign key in the schema of {table}")
+    index_ddl = [sql for (sql,) in db.session.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :name AND sql IS NOT NULL"
+    ), {'name': table})]
+    columns = ", ".join(f'"{c["name"]}"' for c in inspect(db.session.connection()).get_columns(table))
+    
+    old = f"{table}__old"
+    db.session.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+    for sql in index_ddl:
+        name = re.match(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:IF NOT EXISTS\s+)?"?(\w+)"?', sql, re.IGNORECASE).group(1)
+        db.session.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    db.session.execute(text(new_ddl))
+    for sql in index_ddl:
+        db.session.execute(text(sql))
+    
+    # Orphans were never enforced on SQLite; they cannot satisfy the new FK
+    result = db.session.execute(text(
+        f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {old} "
+        f"WHERE user_id IN (SELECT id FROM users)"
+    ))
+    total = db.session.execute(text(f"SELECT COUNT(*) FROM {old}")).scalar()
+    if total != result.rowcount:
+        logger.warning(f"Dropped {total - result.rowcount} orphaned rows from {table}")
+    
+    db.session.execute(text(f"DROP TABLE {old}"))
+
+
+@migration('0003_hot_path_indexes')
+def hot_path_indexes():
+    """Indexes for filters the query-plan check found doing full scans"""
+    # Logout and the admin listings filter machine logins by user
+    _create_index('ix_machine_logins_user_id', 'machine_logins', 'user_id')
+    # Deprecated MAC lookups filter on (mac_address, is_active)
+    _create_index('ix_licenses_mac_address_is_active', 'licenses', 'mac_address, is_active')
+    # Heartbeat flushes update sessions by machine_id
+    _create_index('ix_user_sessions_machine_id', 'user_sessions', 'machine_id')
+    # Token revocation filter refresh
+    _create_index('ix_user_sessions_logged_out_at', 'user_sessions', 'logged_out_at')
+    _create_index('ix_users_updated_at', 'users', 'updated_at')
+
+
+
+@migration('0004_binary_fingerprints')
+def binary_fingerprints():
+    """Store machine_fingerprint as 32 raw bytes instead of 64 hex characters"""
+    for table, nullable in (('licenses', False), ('machine_logins', True)):
+        _check_hex_fingerprints(table, nullable)
+        
+        if _dialect() == 'sqlite':
+            # Column affinity does not touch BLOBs, so values are converted in
+            # place; indexes are maintained by the UPDATE
+            conn = db.session.connection().connection.driver_connection
+            conn.create_function('fingerprint_unhex', 1, lambda value: bytes.fromhex(value))
+            db.session.execute(text(
+                f"UPDATE {table} SET machine_fingerprint = fingerprint_unhex(machine_fingerprint) "
+                f"WHERE typeof(machine_fingerprint) = 'text'"
+            ))
+        elif not isinstance(_column_type(table, 'machine_fingerprint'), LargeBinary):
+            # Rewrites the table and rebuilds its fingerprint indexes
+            db.session.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN machine_fingerprint TYPE BYTEA "
+                f"USING decode(machine_fingerprint, 'hex')"
+            ))
+
+
+def _column_type(table, column):
+    for c in inspect(db.session.connection()).get_columns(table):
+        if c['name'] == column:
+            return c['type']
+    return None
+
+
+def _check_hex_fingerprints(table, nullable):
+    """Null out (or refuse to convert) fingerprints that are not 64 hex characters"""
+    if _dialect() == 'sqlite':
+        invalid = (
+            "typeof(machine_fingerprint) = 'text' AND (length(machine_fingerprint) != 64 "
+            "OR machine_fingerprint GLOB '*[^0-9a-fA-F]*')"
+        )
+    elif isinstance(_column_type(table, 'machine_fingerprint'), LargeBinary):
+        return
+    else:
+        invalid = "machine_fingerprint !~ '^[0-9a-fA-F]{64}$'"
+    
+    count = db.session.execute(text(f"SELECT COUNT(*) FROM {table} WHERE {invalid}")).scalar()
+    if not count:
+        return
+    if not nullable:
+        raise RuntimeError(f"{count} rows in {table} have a malformed machine_fingerprint; fix them and rerun")
+    db.session.execute(text(f"UPDATE {table} SET machine_fingerprint = NULL WHERE {invalid}"))
+    logger.warning(f"Cleared {count} malformed fingerprints in {table}")
+
+
+@migration('0005_live_feed_indexes')
+def live_feed_indexes():
+    """Range scans for the live admin feed (rows created since the last tick)"""
+    _create_index('ix_users_created_at', 'users', 'created_at')
+    _create_index('ix_machine_logins_logged_in_at', 'machine_logins', 'logged_in_at')
+    _create_index('ix_user_sessions_logged_in_at', 'user_sessions', 'logged_in_at')
+    _create_index('ix_licenses_activated_at', 'licenses', 'activated_at')
+
+
+@migration('0006_license_daily_stats')
+def license_daily_stats():
+    """Daily activation/revenue rollups, backfilled from licenses"""
+    from models import LicenseDailyStat
+    from rollups import rebuild_rollups
+    
+    LicenseDailyStat.__table__.create(db.session.connection(), checkfirst=True)
+    rebuild_rollups()
+
+
+@migration('0007_license_events')
+def license_events():
+    """Append-only license/login history (starts empty; no earlier history exists)"""
+    from models import LicenseEvent
+    
+    LicenseEvent.__table__.create(db.session.connection(), checkfirst=True)
+
+
+@migration('0008_fingerprint_component_sets')
+def fingerprint_component_sets():
+    """Move fingerprint_components into content-addressed fingerprint_component_sets"""
+    from models import FingerprintComponentSet
+    
+    FingerprintComponentSet.__table__.create(db.session.connection(), checkfirst=True)
+    binary = 'BYTEA' if _dialect() == 'postgresql' else 'BLOB'
+    for table in ('licenses', 'machine_logins'):
+        has_components = _column_type(table, 'fingerprint_components') is not None
+        if _column_type(table, 'components_hash') is None:
+            if not has_components:
+                # Neither the old nor the new column: the source data is gone
+                raise RuntimeError(f"{table} has no fingerprint_components to move; refusing to continue")
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN components_hash {binary}"))
+        if not has_components:
+            # Already moved by an earlier run
+            continue
+        _move_components(table)
+        db.session.execute(text(f"ALTER TABLE {table} DROP COLUMN fingerprint_components"))
+
+
+def _move_components(table, chunk_size=5000):
+    """Store each row's components once and point the row at their hash"""
+    from component_sets import components_digest, store_component_sets
+    
+    moved = 0
+    last_id = None
+    while True:
+        after = "AND id > :last_id " if last_id is not None else ""
+        rows = db.session.execute(text(
+            f"SELECT id, fingerprint_components FROM {table} "
+            f"WHERE fingerprint_components IS NOT NULL {after}ORDER BY id LIMIT :n"
+        ), {'last_id': last_id, 'n': chunk_size}).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        
+        payloads, updates = {}, []
+        for row_id, components in rows:
+            # JSON columns come back as text on SQLite
+            if isinstance(components, str):
+                components = json.loads(components)
+            digest = components_digest(components)
+            if digest:
+                payloads[digest] = components
+                updates.append({'id': row_id, 'digest': bytes.fromhex(digest)})
+        
+        store_component_sets(payloads)
+        if updates:
+            db.session.execute(text(f"UPDATE {table} SET components_hash = :digest WHERE id = :id"), updates)
+        moved += len(updates)
+    
+    logger.info(f"Moved fingerprint components of {moved} {table} rows")
+
+
+@migration('0009_license_owner')
+def license_owner():
+    """licenses.user_id ownership link, backfilled from machine logins"""
+    if _column_type('licenses', 'user_id') is None:
+        uuid_type = 'UUID' if _dialect() == 'postgresql' else 'CHAR(32)'
+        db.session.execute(text(
+            f"ALTER TABLE licenses ADD COLUMN user_id {uuid_type} "
+            f"REFERENCES users (id) ON DELETE SET NULL"
+        ))
+    _create_index('ix_licenses_user_id_activated_at', 'licenses', 'user_id, activated_at')
+    
+    # The most recently active login on a license's fingerprint owns it
+    result = db.session.execute(text(
+        "UPDATE licenses SET user_id = ("
+        "SELECT ml.user_id FROM machine_logins ml "
+        "WHERE ml.machine_fingerprint = licenses.machine_fingerprint "
+        "ORDER BY ml.last_activity DESC LIMIT 1) "
+        "WHERE user_id IS NULL AND EXISTS ("
+        "SELECT 1 FROM machine_logins ml WHERE ml.machine_fingerprint = licenses.machine_fingerprint)"
+    ))
+    logger.info(f"Backfilled the owner of {result.rowcount} licenses")
+
+
+@migration('0010_fingerprint_stability')
+def fingerprint_stability():
+    """Server-side stability scores and the analysis result tables (filled by `flask analyze-stability`)"""
+    from models import FingerprintComponentStat, FingerprintReuse
+    
+    if _column_type('licenses', 'stability_score') is None:
+        db.session.execute(text("ALTER TABLE licenses ADD COLUMN stability_score INTEGER"))
+    FingerprintComponentStat.__table__.create(db.session.connection(), checkfirst=True)
+    FingerprintReuse.__table__.create(db.session.connection(), checkfirst=True)
+
+
+@migration('0011_scheduled_jobs')
+def scheduled_jobs():
+    """Job scheduler state, and the index the expired-OTP purge reads"""
+    from models import ScheduledJob
+    
+    ScheduledJob.__table__.create(db.session.connection(), checkfirst=True)
+    _create_index('ix_otps_expires_at', 'otps', 'expires_at')
+
+
+@migration('0012_idempotency_keys')
+def idempotency_keys():
+    """Stored responses for Idempotency-Key requests (starts empty)"""
+    from models import IdempotencyKey
+    
+    IdempotencyKey.__table__.create(db.session.connection(), checkfirst=True)
+
+
+@migration('0013_license_components')
+def license_components():
+    """Component index for /match, backfilled from every license's component set"""
+    from models import LicenseComponent
+    from fingerprint_index import rebuild_index
+    
+    LicenseComponent.__table__.create(db.session.connection(), checkfirst=True)
+    indexed = rebuild_index()
+    logger.info(f"Indexed the components of {indexed} licenses")
+
+
+# =========================
+# Runner
+# =========================
+def _ensure_table():
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "id VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)"
+    ))
+    db.session.commit()
+
+
+def _applied():
+    _ensure_table()
+    return {row[0] for row in db.session.execute(text("SELECT id FROM schema_migrations"))}
+
+
+def _stamp(migration_id):
+    db.session.execute(
+        text("INSERT INTO schema_migrations (id, applied_at) VALUES (:id, :at)"),
+        {'id': migration_id, 'at': datetime.utcnow()}
+    )
+
+
+def upgrade():
+    """Apply pending migrations in order; returns the ids applied"""
+    applied = _applied()
+    done = []
+    for migration_id, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if migration_id in applied:
+            continue
+        try:
+            fn()
+            _stamp(migration_id)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Migration {migration_id} failed: {e}")
+            raise
+        logger.info(f"Applied migration {migration_id}")
+        done.append(migration_id)
+    return done
+
+
+def stamp_all():
+    """Mark every migration as applied (fresh schema from create_all)"""
+    applied = _applied()
+    for migration_id, _ in MIGRATIONS:
+        if migration_id not in applied:
+            _stamp(migration_id)
+    db.session.commit()
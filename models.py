@@ -1,10 +1,59 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import TypeDecorator, LargeBinary
 from sqlalchemy.dialects.postgresql import UUID
+from db_routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+@event.listens_for(Engine, "connect")
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores ON DELETE CASCADE unless enabled per connection
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+# =========================
+# Machine fingerprint type
+# =========================
+FINGERPRINT_BYTES = 32
+
+def normalize_fingerprint(value):
+    """Lowercase 64-char hex fingerprint, or None if `value` is not one"""
+    if not isinstance(value, str) or len(value) != FINGERPRINT_BYTES * 2:
+        return None
+    try:
+        bytes.fromhex(value)
+    except ValueError:
+        return None
+    return value.lower()
+
+class Fingerprint(TypeDecorator):
+    """SHA-256 machine fingerprint: hex at the API, 32 raw bytes (BYTEA/BLOB) in the database"""
+    impl = LargeBinary(FINGERPRINT_BYTES)
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes):
+            return value
+        raw = bytes.fromhex(value)
+        if len(raw) != FINGERPRINT_BYTES:
+            raise ValueError(f"Fingerprint must be {FINGERPRINT_BYTES} bytes")
+        return raw
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # Row not converted by migration 0004 yet
+            return value.lower()
+        return bytes(value).hex()
 
 # =========================
 # User
@@ -20,11 +69,12 @@ class User(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     is_verified = db.Column(db.Boolean, default=False)
     
-    created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
-    machines = db.relationship('Machine', backref='user', lazy=True, cascade='all, delete-orphan')
-    machine_logins = db.relationship('MachineLogin', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Children are removed by ON DELETE CASCADE, not loaded and deleted one by one
+    machines = db.relationship('Machine', backref='user', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    machine_logins = db.relationship('MachineLogin', backref='user', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -34,13 +84,13 @@ class User(db.Model):
     
     def to_dict(self):
         return {
-            'id': str(self.id),
+            'id': self.id,
             'name': self.name,
             'email': self.email,
             'is_active': self.is_active,
             'is_verified': self.is_verified,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
         }
 
 # =========================
@@ -50,7 +100,7 @@ class Machine(db.Model):
     __tablename__ = 'machines'
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     
     mac_address = db.Column(db.String(255), nullable=False)
     machine_name = db.Column(db.String(255), nullable=False)
@@ -60,13 +110,13 @@ class Machine(db.Model):
     processor = db.Column(db.String(255), nullable=True)
     
     is_active = db.Column(db.Boolean, default=True)
-    last_seen = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, index=True)
     registered_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
     
     def to_dict(self):
         return {
-            'id': str(self.id),
-            'user_id': str(self.user_id),
+            'id': self.id,
+            'user_id': self.user_id,
             'mac_address': self.mac_address,
             'machine_name': self.machine_name,
             'machine_id': self.machine_id,
@@ -74,10 +124,22 @@ class Machine(db.Model):
             'os_version': self.os_version,
             'processor': self.processor,
             'is_active': self.is_active,
-            'last_seen': self.last_seen.isoformat() if self.last_seen else None,
-            'registered_at': self.registered_at.isoformat() if self.registered_at else None,
+            'last_seen': self.last_seen,
+            'registered_at': self.registered_at,
         }
 
+# =========================
+# Fingerprint Component Set (content-addressed)
+# =========================
+class FingerprintComponentSet(db.Model):
+    __tablename__ = 'fingerprint_component_sets'
+    
+    # SHA-256 of the canonical JSON (see component_sets.components_digest);
+    # rows are immutable and shared by every license/login with the same hardware
+    components_hash = db.Column(Fingerprint, primary_key=True)
+    components = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
+
 # =========================
 # Machine Login
 # =========================
@@ -88,65 +150,90 @@ class MachineLogin(db.Model):
     machine_id = db.Column(db.String(255), unique=True, nullable=False, index=True)
     mac_address = db.Column(db.String(255), nullable=False, index=True)
     
-    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     current_email = db.Column(db.String(255), nullable=False)
     
-    machine_fingerprint = db.Column(db.String(64), nullable=True, index=True)
+    machine_fingerprint = db.Column(Fingerprint, nullable=True, index=True)
     fingerprint_short = db.Column(db.String(16), nullable=True)
     fingerprint_stability = db.Column(db.Integer, default=0)
-    fingerprint_components = db.Column(db.JSON, nullable=True)
+    components_hash = db.Column(Fingerprint, nullable=True)
+    component_set = db.relationship(
+        FingerprintComponentSet, viewonly=True,
+        primaryjoin='foreign(MachineLogin.components_hash) == FingerprintComponentSet.components_hash'
+    )
     
     machine_name = db.Column(db.String(255), nullable=True)
     os_name = db.Column(db.String(255), nullable=True)
     os_version = db.Column(db.String(255), nullable=True)
     processor = db.Column(db.String(255), nullable=True)
     
-    logged_in_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
-    last_activity = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
+    logged_in_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, index=True)
+    last_activity = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, index=True)
     
-    def to_dict(self):
-        return {
-            'id': str(self.id),
+    @property
+    def fingerprint_components(self):
+        return self.component_set.components if self.component_set else None
+    
+    def to_dict(self, include_components=False):
+        data = {
+            'id': self.id,
             'machine_id': self.machine_id,
             'mac_address': self.mac_address,
             'machine_fingerprint': self.machine_fingerprint,
             'fingerprint_short': self.fingerprint_short,
             'fingerprint_stability': self.fingerprint_stability,
-            'user_id': str(self.user_id),
+            'user_id': self.user_id,
             'current_email': self.current_email,
             'machine_name': self.machine_name,
             'os_name': self.os_name,
             'os_version': self.os_version,
             'processor': self.processor,
-            'logged_in_at': self.logged_in_at.isoformat() if self.logged_in_at else None,
-            'last_activity': self.last_activity.isoformat() if self.last_activity else None,
-            'fingerprint_components': self.fingerprint_components,
+            'logged_in_at': self.logged_in_at,
+            'last_activity': self.last_activity,
+            'components_hash': self.components_hash,
         }
+        if include_components:
+            data['fingerprint_components'] = self.fingerprint_components
+        return data
 
 # =========================
 # License
 # =========================
 class License(db.Model):
     __tablename__ = 'licenses'
+    __table_args__ = (
+        db.Index('ix_licenses_mac_address_is_active', 'mac_address', 'is_active'),
+        # Per-user portfolio, newest activation first
+        db.Index('ix_licenses_user_id_activated_at', 'user_id', 'activated_at'),
+    )
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     license_id = db.Column(db.String(255), unique=True, nullable=False, index=True)
+    # Purchasing user; kept (as NULL) when the user is deleted
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
     
-    machine_fingerprint = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    machine_fingerprint = db.Column(Fingerprint, unique=True, nullable=False, index=True)
     fingerprint_short = db.Column(db.String(16), nullable=True)
     fingerprint_stability = db.Column(db.Integer, default=0)
     
+    # Measured by stability_analysis.py (0-100); fingerprint_stability is client-reported
+    stability_score = db.Column(db.Integer, nullable=True)
+    
     mac_address = db.Column(db.String(255), nullable=True, index=True)
     machine_id = db.Column(db.String(255), nullable=True)
     machine_name = db.Column(db.String(255), nullable=True)
     
-    fingerprint_components = db.Column(db.JSON, nullable=True)
+    components_hash = db.Column(Fingerprint, nullable=True)
+    component_set = db.relationship(
+        FingerprintComponentSet, viewonly=True,
+        primaryjoin='foreign(License.components_hash) == FingerprintComponentSet.components_hash'
+    )
     
     plan_type = db.Column(db.String(50), nullable=False)
     plan_name = db.Column(db.String(255), nullable=False)
     plan_price = db.Column(db.String(50), nullable=True)
     
-    activated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
+    activated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, index=True)
     expiry_date = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
     
     is_active = db.Column(db.Boolean, default=True)
@@ -158,10 +245,21 @@ class License(db.Model):
     updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
     upgraded_at = db.Column(db.DateTime(timezone=True), nullable=True)
     
-    def to_dict(self):
-        return {
-            'id': str(self.id),
+    @property
+    def fingerprint_components(self):
+        return self.component_set.components if self.component_set else None
+    
+    def status(self, now=None):
+        """'active', 'expired' (past expiry_date) or 'inactive' (deactivated)"""
+        if not self.is_active:
+            return 'inactive'
+        return 'active' if self.expiry_date > (now or datetime.utcnow()) else 'expired'
+    
+    def to_dict(self, include_components=False):
+        data = {
+            'id': self.id,
             'license_id': self.license_id,
+            'user_id': self.user_id,
             'machine_fingerprint': self.machine_fingerprint,
             'fingerprint_short': self.fingerprint_short,
             'fingerprint_stability': self.fingerprint_stability,
@@ -171,13 +269,155 @@ class License(db.Model):
             'plan_type': self.plan_type,
             'plan_name': self.plan_name,
             'plan_price': self.plan_price,
-            'activated_at': self.activated_at.isoformat() if self.activated_at else None,
-            'expiry_date': self.expiry_date.isoformat() if self.expiry_date else None,
+            'activated_at': self.activated_at,
+            'expiry_date': self.expiry_date,
             'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'upgraded_at': self.upgraded_at.isoformat() if self.upgraded_at else None,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'upgraded_at': self.upgraded_at,
             'fingerprint_stability_score': self.fingerprint_stability,
+            'stability_score': self.stability_score,
+            'components_hash': self.components_hash,
+        }
+        if include_components:
+            data['fingerprint_components'] = self.fingerprint_components
+        return data
+
+# =========================
+# License Component (inverted index over fingerprint_components)
+# =========================
+class LicenseComponent(db.Model):
+    __tablename__ = 'license_components'
+    
+    component_hash = db.Column(db.String(16), primary_key=True)
+    license_id = db.Column(
+        db.String(255),
+        db.ForeignKey('licenses.license_id', ondelete='CASCADE'),
+        primary_key=True,
+        index=True
+    )
+
+# =========================
+# Fingerprint stability analysis results (see stability_analysis.py)
+# =========================
+class FingerprintComponentStat(db.Model):
+    __tablename__ = 'fingerprint_component_stats'
+    
+    component = db.Column(db.String(100), primary_key=True)
+    # License/login pairs that both report the component, and how many differ
+    observed = db.Column(db.Integer, nullable=False, default=0)
+    changed = db.Column(db.Integer, nullable=False, default=0)
+    change_rate = db.Column(db.Float, nullable=False, default=0.0)
+    computed_at = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'component': self.component,
+            'observed': self.observed,
+            'changed': self.changed,
+            'change_rate': self.change_rate,
+            'computed_at': self.computed_at,
+        }
+
+class FingerprintReuse(db.Model):
+    __tablename__ = 'fingerprint_reuse'
+    
+    # One row per license in a cluster of licenses sharing an identifying value
+    component = db.Column(db.String(100), primary_key=True)
+    value_hash = db.Column(db.String(16), primary_key=True)
+    license_id = db.Column(db.String(255), primary_key=True, index=True)
+    cluster_size = db.Column(db.Integer, nullable=False)
+    detected_at = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+
+# =========================
+# Scheduled Job (schedule and run metrics, see scheduler.py)
+# =========================
+class ScheduledJob(db.Model):
+    __tablename__ = 'scheduled_jobs'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    schedule = db.Column(db.String(100), nullable=True)
+    
+    last_started_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    last_finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    last_status = db.Column(db.String(20), nullable=True)  # running, ok, failed, timeout
+    last_duration_ms = db.Column(db.Float, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    next_run_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    
+    runs = db.Column(db.Integer, nullable=False, default=0)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    timeouts = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'schedule': self.schedule,
+            'last_started_at': self.last_started_at,
+            'last_finished_at': self.last_finished_at,
+            'last_status': self.last_status,
+            'last_duration_ms': self.last_duration_ms,
+            'last_error': self.last_error,
+            'next_run_at': self.next_run_at,
+            'runs': self.runs,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+        }
+
+# =========================
+# License Daily Stats (rollups for the admin dashboard, see rollups.py)
+# =========================
+class LicenseDailyStat(db.Model):
+    __tablename__ = 'license_daily_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    plan_type = db.Column(db.String(50), primary_key=True)
+    
+    activations = db.Column(db.Integer, nullable=False, default=0)
+    upgrades = db.Column(db.Integer, nullable=False, default=0)
+    trial_conversions = db.Column(db.Integer, nullable=False, default=0)
+    # Parsed plan prices in minor units (paise)
+    revenue_minor = db.Column(db.BigInteger, nullable=False, default=0)
+
+# =========================
+# License Event (append-only history, see event_log.py)
+# =========================
+class LicenseEvent(db.Model):
+    __tablename__ = 'license_events'
+    # Timelines read newest first per license, user or machine
+    __table_args__ = (
+        db.Index('ix_license_events_license_id_occurred_at', 'license_id', 'occurred_at'),
+        db.Index('ix_license_events_user_id_occurred_at', 'user_id', 'occurred_at'),
+        db.Index('ix_license_events_fingerprint_occurred_at', 'machine_fingerprint', 'occurred_at'),
+    )
+    
+    # No foreign keys: history outlives deleted users and licenses
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    event_type = db.Column(db.String(20), nullable=False)
+    occurred_at = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+    
+    license_id = db.Column(db.String(255), nullable=True)
+    user_id = db.Column(UUID(as_uuid=True), nullable=True)
+    machine_fingerprint = db.Column(Fingerprint, nullable=True)
+    machine_id = db.Column(db.String(255), nullable=True)
+    
+    plan_type = db.Column(db.String(50), nullable=True)
+    previous_plan_type = db.Column(db.String(50), nullable=True)
+    # Event-specific extras (previous user of a machine, import source...)
+    details = db.Column(db.JSON, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_type': self.event_type,
+            'occurred_at': self.occurred_at,
+            'license_id': self.license_id,
+            'user_id': self.user_id,
+            'machine_fingerprint': self.machine_fingerprint,
+            'machine_id': self.machine_id,
+            'plan_type': self.plan_type,
+            'previous_plan_type': self.previous_plan_type,
+            'details': self.details,
         }
 
 # =========================
@@ -187,9 +427,9 @@ class UserSession(db.Model):
     __tablename__ = 'user_sessions'
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     
-    machine_id = db.Column(db.String(255), nullable=False)
+    machine_id = db.Column(db.String(255), nullable=False, index=True)
     machine_name = db.Column(db.String(255), nullable=False)
     mac_address = db.Column(db.String(255), nullable=False)
     os_name = db.Column(db.String(255), nullable=True)
@@ -198,22 +438,22 @@ class UserSession(db.Model):
     login_token = db.Column(db.String(512), nullable=True, index=True)
     is_active = db.Column(db.Boolean, default=True)
     
-    logged_in_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
-    logged_out_at = db.Column(db.DateTime(timezone=True), nullable=True)
-    last_activity = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
+    logged_in_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, index=True)
+    logged_out_at = db.Column(db.DateTime(timezone=True), nullable=True, index=True)
+    last_activity = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, index=True)
     
     def to_dict(self):
         return {
-            'id': str(self.id),
-            'user_id': str(self.user_id),
+            'id': self.id,
+            'user_id': self.user_id,
             'machine_id': self.machine_id,
             'machine_name': self.machine_name,
             'mac_address': self.mac_address,
             'os_name': self.os_name,
             'os_version': self.os_version,
-            'logged_in_at': self.logged_in_at.isoformat() if self.logged_in_at else None,
-            'logged_out_at': self.logged_out_at.isoformat() if self.logged_out_at else None,
-            'last_activity': self.last_activity.isoformat() if self.last_activity else None,
+            'logged_in_at': self.logged_in_at,
+            'logged_out_at': self.logged_out_at,
+            'last_activity': self.last_activity,
             'is_active': self.is_active
         }
 
@@ -231,16 +471,36 @@ class OTP(db.Model):
     failed_attempts = db.Column(db.Integer, default=0)
     
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
-    expires_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
     
     def is_expired(self):
         return datetime.utcnow() > self.expires_at
     
     def to_dict(self):
         return {
-            'id': str(self.id),
+            'id': self.id,
             'email': self.email,
             'is_verified': self.is_verified,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'created_at': self.created_at,
+            'expires_at': self.expires_at,
         }
+
+# =========================
+# Idempotency Key (stored responses for retried POSTs)
+# =========================
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    
+    key = db.Column(db.String(320), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    
+    status_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    content_type = db.Column(db.String(100), nullable=True)
+    
+    created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+    
+    @property
+    def is_complete(self):
+        return self.status_code is not None
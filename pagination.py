@@ -0,0 +1,49 @@
+"""
+Keyset cursors for newest-first listings.
+
+A cursor is ``<timestamp>,<id>`` of the last row of the previous page.
+Timestamps alone are not unique (an import stamps a whole chunk with one
+time, events recorded in one request share one), so rows are ordered by
+(timestamp, id) and the id breaks ties. A bare timestamp, as returned
+before cursors carried the id, is still accepted and pages by time alone.
+"""
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def parse_cursor(value):
+    """(timestamp, id or None) from a ?before= value, None if empty; raises ValueError"""
+    if not value:
+        return None
+    timestamp, _, row_id = value.partition(',')
+    return datetime.fromisoformat(timestamp), uuid.UUID(row_id) if row_id else None
+
+
+def make_cursor(timestamp, row_id):
+    return f"{timestamp.isoformat()},{row_id}"
+
+
+def newest_first(query, time_column, id_column, cursor=None):
+    """Order `query` by (time, id) descending, starting after `cursor`"""
+    if cursor is not None:
+        timestamp, row_id = cursor
+        if row_id is None:
+            query = query.filter(time_column < timestamp)
+        else:
+            # The <= bound keeps this a range read on the time index
+            query = query.filter(time_column <= timestamp, or_(
+                time_column < timestamp,
+                and_(time_column == timestamp, id_column < row_id)
+            ))
+    return query.order_by(time_column.desc(), id_column.desc())
+
+
+def next_cursor(rows, limit, time_attr):
+    """Cursor for the page after `rows`, None when this was the last page"""
+    if len(rows) < limit:
+        return None
+    last = rows[-1]
+    return make_cursor(getattr(last, time_attr), last.id)
@@ -0,0 +1,201 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries a valid ``X-Profile-Token`` header
+(see ``flask profile-token``) or is picked by PROFILE_SAMPLE_RATE. The
+default profiler samples the request thread's stack every
+PROFILE_INTERVAL_MS and writes collapsed stacks (flamegraph.pl / speedscope
+input); PROFILE_MODE=cprofile writes a pstats dump instead. Files are named
+after the endpoint, duration and query count and the directory keeps only
+the newest PROFILE_MAX_FILES. With neither a secret nor a sample rate
+configured no hooks are installed at all.
+"""
+
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import logging
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+HEADER = "X-Profile-Token"
+
+_state = threading.local()
+
+
+# =========================
+# Signed trigger header
+# =========================
+def _signature(secret, expires):
+    return hmac.new(secret.encode(), str(expires).encode(), hashlib.sha256).hexdigest()
+
+
+def profile_token(secret, seconds=900):
+    """Header value that enables profiling until it expires"""
+    expires = int(time.time()) + seconds
+    return f"{expires}.{_signature(secret, expires)}"
+
+
+def _valid_token(secret, token):
+    try:
+        expires, signature = token.split('.')
+        expires = int(expires)
+    except ValueError:
+        return False
+    return expires >= time.time() and hmac.compare_digest(signature, _signature(secret, expires))
+
+
+# =========================
+# Profilers
+# =========================
+class StackSampler:
+    """Samples one thread's Python stack from a background thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path + ".collapsed", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path + ".collapsed"
+
+
+class CProfiler:
+    """Deterministic fallback: pstats dump (snakeviz, pstats)"""
+
+    def __init__(self):
+        import cProfile
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def write(self, path):
+        self._profile.dump_stats(path + ".prof")
+        return path + ".prof"
+
+
+def _new_profiler(config):
+    # The sampler needs sys._current_frames (CPython)
+    if config.get('PROFILE_MODE') == 'cprofile' or not hasattr(sys, '_current_frames'):
+        return CProfiler()
+    return StackSampler(threading.get_ident(), config.get('PROFILE_INTERVAL_MS', 1) / 1000)
+
+
+# =========================
+# Output directory
+# =========================
+def _output_path(directory, endpoint, duration_ms, queries):
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", endpoint or "unknown")
+    return os.path.join(directory, f"{stamp}_{name}_{duration_ms}ms_{queries}q")
+
+
+def _rotate(directory, keep):
+    entries = sorted(os.scandir(directory), key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in entries[keep:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+# =========================
+# Flask hooks
+# =========================
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_state, 'queries', None) is not None:
+        _state.queries += 1
+
+
+def setup_profiling(app):
+    """Install the profiling hooks if a trigger is configured"""
+    config = app.config
+    secret = config.get('PROFILE_SECRET')
+    sample_rate = config.get('PROFILE_SAMPLE_RATE', 0.0)
+    if not secret and sample_rate <= 0:
+        return
+
+    directory = config.get('PROFILE_DIR')
+    keep = config.get('PROFILE_MAX_FILES', 200)
+    os.makedirs(directory, exist_ok=True)
+
+    if not event.contains(Engine, "before_cursor_execute", _count_query):
+        event.listen(Engine, "before_cursor_execute", _count_query)
+
+    @app.before_request
+    def start_profile():
+        token = request.headers.get(HEADER)
+        if token:
+            if not (secret and _valid_token(secret, token)):
+                return
+        elif random.random() >= sample_rate:
+            return
+
+        profiler = _new_profiler(config)
+        g.profiler = profiler
+        g.profile_started = time.perf_counter()
+        _state.queries = 0
+        profiler.start()
+
+    @app.after_request
+    def finish_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+
+        profiler.stop()
+        duration_ms = round((time.perf_counter() - g.profile_started) * 1000)
+        queries, _state.queries = _state.queries, None
+        try:
+            path = profiler.write(_output_path(directory, request.endpoint, duration_ms, queries))
+            _rotate(directory, keep)
+            response.headers['X-Profile-File'] = os.path.basename(path)
+        except OSError as e:
+            logger.error(f"Could not write profile: {e}")
+        return response
+
+    @app.teardown_request
+    def abandon_profile(exc):
+        # after_request is skipped when the request fails outright
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
+            _state.queries = None
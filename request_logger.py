@@ -1,6 +1,10 @@
 import logging
 from flask import request, g
 from datetime import datetime
+import json
+import os
+import random
+import threading
 import time
 
 logger = logging.getLogger("api_logger")
@@ -16,12 +20,69 @@ logger.addHandler(handler)
 SENSITIVE_HEADERS = {"authorization", "cookie"}
 SENSITIVE_PATHS = {"/api/auth/login", "/api/auth/register", "/api/otp/send-otp", "/api/otp/verify-otp"}
 
+# Streams and static files are not part of the replayable load
+CAPTURE_SKIP_ENDPOINTS = {"static", "admin.live"}
+_capture_lock = threading.Lock()
+
+# =========================
+# Traffic capture (see benchmarks/replay.py)
+# =========================
+def body_shape(value):
+    """JSON value with every leaf replaced by its type name; lists keep their length"""
+    if isinstance(value, dict):
+        return {k: body_shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [len(value), body_shape(value[0]) if value else None]
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if value is None:
+        return "null"
+    return "str"
+
+
+def query_shape(args):
+    """Query string with numbers kept (page sizes, timeouts) and everything else masked"""
+    return {k: v if v.isdigit() else "str" for k, v in args.items()}
+
+
+def capture_record(response, duration):
+    rule = request.url_rule
+    return {
+        "at": round(g.start_time, 3),
+        "method": request.method,
+        "endpoint": request.endpoint,
+        "rule": rule.rule if rule else None,
+        "query": query_shape(request.args),
+        "body": body_shape(request.get_json(silent=True)) if request.is_json else None,
+        "auth": "Authorization" in request.headers,
+        "accept": request.headers.get("Accept"),
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 2),
+    }
+
+
+def _write_capture(path, record):
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with _capture_lock:
+        with open(path, "a") as f:
+            f.write(line)
+
 def setup_request_logging(app):
     """Safe request/response logging for production"""
     
+    capture_rate = app.config.get("CAPTURE_SAMPLE_RATE", 0.0)
+    capture_file = app.config.get("CAPTURE_FILE")
+    if capture_rate > 0:
+        os.makedirs(os.path.dirname(capture_file), exist_ok=True)
+    
     @app.before_request
     def log_request():
         g.start_time = time.time()
+        g.capture = capture_rate > 0 and random.random() < capture_rate
         
         method = request.method
         path = request.path
@@ -50,4 +111,10 @@ def setup_request_logging(app):
             f"OUT {method} {path} status={status_code} duration={duration:.3f}s"
         )
         
+        if g.get("capture") and request.endpoint not in CAPTURE_SKIP_ENDPOINTS:
+            try:
+                _write_capture(capture_file, capture_record(response, duration))
+            except OSError as e:
+                logger.error(f"Could not write capture: {e}")
+        
         return response
@@ -0,0 +1,200 @@
+"""
+Daily license rollups for the admin dashboard.
+
+``license_daily_stats`` holds one row per (UTC day, plan_type) with
+activation, upgrade and trial-conversion counts and revenue in minor
+units parsed from ``plan_price`` ('₹399' -> 39900). Activations, upgrades
+and imports add to it in the same transaction as the license write, with
+an INSERT .. ON CONFLICT DO UPDATE, so the dashboard reads a few hundred
+rows for any date range instead of aggregating ``licenses``.
+
+History from before the table existed comes from ``rebuild_rollups``.
+``licenses`` only keeps the latest state of each license, so for an
+upgraded license the original activation is counted on its created_at
+day under plan 'unknown' without revenue, and its last upgrade (not
+earlier ones, and not as a trial conversion) on upgraded_at. Because a
+rebuild is lossy it only fills days that have no rollup rows yet; days
+kept up to date incrementally are never overwritten.
+"""
+
+import re
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import func
+
+from models import db, License, LicenseDailyStat
+
+logger = logging.getLogger(__name__)
+
+CURRENCY = '₹'
+UNKNOWN_PLAN = 'unknown'
+COUNTERS = ('activations', 'upgrades', 'trial_conversions', 'revenue_minor')
+MAX_RANGE_DAYS = 3660
+GROUPS = ('day', 'month', 'total')
+
+
+def parse_price(text):
+    """'₹3,999' -> 399900 (minor units); unparseable or empty -> 0"""
+    digits = re.sub(r"[^0-9.]", "", text or "")
+    try:
+        return int(Decimal(digits) * 100) if digits else 0
+    except InvalidOperation:
+        return 0
+
+
+def _day(value):
+    # func.date() gives a date on Postgres and a string on SQLite
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+# =========================
+# Incremental maintenance
+# =========================
+def _upsert(deltas):
+    """Add {(day, plan_type): {counter: n}} to the rollups (caller commits)"""
+    if not deltas:
+        return
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    table = LicenseDailyStat.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.day, table.c.plan_type],
+        set_={name: table.c[name] + stmt.excluded[name] for name in COUNTERS}
+    )
+    # Sorted so concurrent writers lock rows in the same order
+    rows = [
+        {'day': day, 'plan_type': plan_type, **{name: counts.get(name, 0) for name in COUNTERS}}
+        for (day, plan_type), counts in sorted(deltas.items())
+    ]
+    db.session.execute(stmt, rows)
+
+
+def record_activation(plan_type, plan_price, at, previous_plan=None):
+    """Count a new license, or an upgrade/renewal from previous_plan, on at's day"""
+    counts = {'revenue_minor': parse_price(plan_price)}
+    if previous_plan is None:
+        counts['activations'] = 1
+    else:
+        counts['upgrades'] = 1
+        counts['trial_conversions'] = int(previous_plan == 'trial' and plan_type != 'trial')
+    _upsert({(_day(at), plan_type): counts})
+
+
+def record_licenses(rows):
+    """Count new license rows (column dicts, e.g. an import chunk)"""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        counts = deltas[(_day(row['activated_at']), row['plan_type'])]
+        counts['activations'] += 1
+        counts['revenue_minor'] += parse_price(row['plan_price'])
+    _upsert(deltas)
+
+
+# =========================
+# Backfill
+# =========================
+def rebuild_rollups(since=None, until=None):
+    """Backfill [since, until] (dates, default: everything) from licenses; days with rollups are kept"""
+    def in_range(column):
+        criteria = []
+        if since:
+            criteria.append(column >= datetime.combine(since, datetime.min.time()))
+        if until:
+            criteria.append(column < datetime.combine(until + timedelta(days=1), datetime.min.time()))
+        return criteria
+
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    # Never upgraded: activated_at is the activation
+    day = func.date(License.activated_at)
+    for d, plan_type, price, count in db.session.query(
+        day, License.plan_type, License.plan_price, func.count()
+    ).filter(License.upgraded_at.is_(None), *in_range(License.activated_at)).group_by(
+        day, License.plan_type, License.plan_price
+    ):
+        counts = deltas[(_day(d), plan_type)]
+        counts['activations'] += count
+        counts['revenue_minor'] += parse_price(price) * count
+
+    # Upgraded: the original plan and price are gone
+    day = func.date(License.created_at)
+    for d, count in db.session.query(day, func.count()).filter(
+        License.upgraded_at.isnot(None), *in_range(License.created_at)
+    ).group_by(day):
+        deltas[(_day(d), UNKNOWN_PLAN)]['activations'] += count
+
+    day = func.date(License.upgraded_at)
+    for d, plan_type, price, count in db.session.query(
+        day, License.plan_type, License.plan_price, func.count()
+    ).filter(License.upgraded_at.isnot(None), *in_range(License.upgraded_at)).group_by(
+        day, License.plan_type, License.plan_price
+    ):
+        counts = deltas[(_day(d), plan_type)]
+        counts['upgrades'] += count
+        counts['revenue_minor'] += parse_price(price) * count
+
+    query = db.session.query(LicenseDailyStat.day).distinct()
+    if since:
+        query = query.filter(LicenseDailyStat.day >= since)
+    if until:
+        query = query.filter(LicenseDailyStat.day <= until)
+    maintained = {_day(d) for (d,) in query}
+    deltas = {key: counts for key, counts in deltas.items() if key[0] not in maintained}
+    _upsert(deltas)
+    db.session.commit()
+    return len(deltas)
+
+
+# =========================
+# Reads
+# =========================
+def license_stats(start, end, plan_type=None, group='day'):
+    """Rollup series for [start, end] grouped by day, month or in total"""
+    query = db.session.query(LicenseDailyStat).filter(
+        LicenseDailyStat.day >= start, LicenseDailyStat.day <= end
+    )
+    if plan_type:
+        query = query.filter(LicenseDailyStat.plan_type == plan_type)
+
+    buckets = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    totals = dict.fromkeys(COUNTERS, 0)
+    for row in query.order_by(LicenseDailyStat.day, LicenseDailyStat.plan_type):
+        if group == 'day':
+            period = row.day.isoformat()
+        elif group == 'month':
+            period = row.day.strftime('%Y-%m')
+        else:
+            period = 'total'
+        bucket = buckets[(period, row.plan_type)]
+        for name in COUNTERS:
+            value = getattr(row, name)
+            bucket[name] += value
+            totals[name] += value
+
+    def public(counts):
+        counts = dict(counts)
+        counts['revenue'] = counts.pop('revenue_minor') / 100
+        return counts
+
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'group': group,
+        'currency': CURRENCY,
+        'series': [
+            {'period': period, 'plan_type': plan, **public(counts)}
+            for (period, plan), counts in buckets.items()
+        ],
+        'totals': public(totals),
+    }
@@ -1,6 +1,26 @@
-from flask import Blueprint, render_template, request, jsonify
-from models import db, User, Machine, License, MachineLogin
-from datetime import datetime
+from flask import Blueprint, render_template, request, jsonify, current_app, Response
+from models import (
+    db, User, Machine, License, MachineLogin, UserSession,
+    FingerprintComponentStat, FingerprintReuse,
+)
+from db_routing import read_replica
+from bulk_ops import (
+    BulkSelectionError, run_bulk, chunk_size_option, license_history,
+    license_criteria, license_values, user_criteria, machine_criteria,
+)
+from live_feed import live_feed, format_event
+from rollups import license_stats, GROUPS, MAX_RANGE_DAYS
+from event_log import timeline
+from pagination import parse_cursor, next_cursor
+from auth_tokens import revoke_user_sessions
+from component_sets import components_requested
+from admin_details import user_detail, system_detail, active_license, session_history
+from license_import import LicenseImport, read_rows, text_stream, FORMATS, DEFAULT_CHUNK_SIZE as IMPORT_CHUNK_SIZE
+from sqlalchemy import tuple_
+from sqlalchemy.orm import selectinload
+from datetime import datetime, date, timedelta
+import queue
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,6 +30,7 @@ bp = Blueprint('admin', __name__, url_prefix='/admin')
 # Dashboard
 # =========================
 @bp.route('/dashboard', methods=['GET'])
+@read_replica
 def dashboard():
     try:
         total_users = User.query.count()
@@ -27,10 +48,159 @@ def dashboard():
         logger.error(f"Admin dashboard error: {e}")
         return render_template('error.html', message="Server error"), 500
 
+# =========================
+# Live feed (Server-Sent Events)
+# =========================
+@bp.route('/live', methods=['GET'])
+def live():
+    app = current_app._get_current_object()
+    stream_seconds = app.config.get('LIVE_FEED_STREAM_SECONDS', 300)
+    subscriber = live_feed.subscribe(app)
+    
+    def stream():
+        try:
+            # Reconnect delay for EventSource after the stream ends
+            yield "retry: 2000\n\n"
+            counts = live_feed.counts()
+            if counts:
+                yield format_event(app, 'counts', counts)
+            
+            deadline = time.monotonic() + stream_seconds
+            while time.monotonic() < deadline:
+                try:
+                    event_type, data = subscriber.get(timeout=min(15, max(deadline - time.monotonic(), 0.1)))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event_type is None:
+                    break
+                yield format_event(app, event_type, data)
+        finally:
+            live_feed.unsubscribe(subscriber)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+# =========================
+# License stats (daily rollups)
+# =========================
+@bp.route('/stats/licenses', methods=['GET'])
+@read_replica
+def license_stats_api():
+    """Activations, upgrades, trial conversions and revenue per plan for ?from=&to= (ISO dates)"""
+    try:
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.utcnow().date()
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO dates'}), 400
+    
+    group = request.args.get('group', 'day')
+    if group not in GROUPS:
+        return jsonify({'error': f"group must be one of {', '.join(GROUPS)}"}), 400
+    if start > end or (end - start).days > MAX_RANGE_DAYS:
+        return jsonify({'error': f"from must be before to and at most {MAX_RANGE_DAYS} days apart"}), 400
+    
+    try:
+        return jsonify(license_stats(start, end, request.args.get('plan_type'), group)), 200
+    
+    except Exception as e:
+        logger.error(f"License stats error: {e}")
+        return jsonify({'error': 'Server error'}), 500
+
+# =========================
+# Fingerprint stability (results of `flask analyze-stability`)
+# =========================
+MAX_REUSE_CLUSTERS = 200
+
+@bp.route('/fingerprints/stability', methods=['GET'])
+@read_replica
+def fingerprint_stability_api():
+    """Per-component change rates and the largest reuse clusters (?limit=, ?component=)"""
+    try:
+        limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_REUSE_CLUSTERS)
+        component = request.args.get('component')
+        
+        clusters = db.session.query(
+            FingerprintReuse.component, FingerprintReuse.value_hash, FingerprintReuse.cluster_size
+        ).distinct()
+        if component:
+            clusters = clusters.filter(FingerprintReuse.component == component)
+        clusters = clusters.order_by(FingerprintReuse.cluster_size.desc()).limit(limit).all()
+        
+        # Members of the listed clusters in one query
+        members = {}
+        if clusters:
+            rows = db.session.query(
+                FingerprintReuse.component, FingerprintReuse.value_hash, FingerprintReuse.license_id
+            ).filter(tuple_(FingerprintReuse.component, FingerprintReuse.value_hash).in_(
+                [(c.component, c.value_hash) for c in clusters]
+            ))
+            for name, value_hash, license_id in rows:
+                members.setdefault((name, value_hash), []).append(license_id)
+        
+        return jsonify({
+            'components': [
+                stat.to_dict()
+                for stat in FingerprintComponentStat.query.order_by(FingerprintComponentStat.change_rate.desc())
+            ],
+            'clusters': [{
+                'component': c.component,
+                'value_hash': c.value_hash,
+                'size': c.cluster_size,
+                'license_ids': members.get((c.component, c.value_hash), []),
+            } for c in clusters],
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Fingerprint stability error: {e}")
+        return jsonify({'error': 'Server error'}), 500
+
+# =========================
+# Event timelines
+# =========================
+MAX_TIMELINE_LIMIT = 500
+
+def _page_args():
+    """(cursor, limit) from ?before=&limit=; raises ValueError on bad input"""
+    before = parse_cursor(request.args.get('before'))
+    limit = min(max(int(request.args.get('limit', 50)), 1), MAX_TIMELINE_LIMIT)
+    return before, limit
+
+def _timeline_response(**filters):
+    """Newest-first events; page with ?before=<next_before of the previous page>&limit="""
+    try:
+        before, limit = _page_args()
+    except ValueError:
+        return jsonify({'error': 'before must be a cursor from next_before and limit an integer'}), 400
+    
+    try:
+        events = timeline(before=before, limit=limit, **filters)
+        return jsonify({
+            'events': [e.to_dict() for e in events],
+            'next_before': next_cursor(events, limit, 'occurred_at')
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Event timeline error: {e}")
+        return jsonify({'error': 'Server error'}), 500
+
+@bp.route('/licenses/<license_id>/events', methods=['GET'])
+@read_replica
+def license_events(license_id):
+    return _timeline_response(license_id=license_id)
+
+@bp.route('/users/<uuid:user_id>/events', methods=['GET'])
+@read_replica
+def user_events(user_id):
+    return _timeline_response(user_id=user_id)
+
 # =========================
 # Users list page
 # =========================
 @bp.route('/users', methods=['GET'])
+@read_replica
 def users_list():
     try:
         page = request.args.get('page', 1, type=int)
@@ -71,6 +241,7 @@ def users_list():
 # Systems list page
 # =========================
 @bp.route('/systems', methods=['GET'])
+@read_replica
 def systems_list():
     try:
         page = request.args.get('page', 1, type=int)
@@ -107,10 +278,141 @@ def systems_list():
         logger.error(f"Admin systems error: {e}")
         return render_template('error.html', message="Server error"), 500
 
+# =========================
+# User and system detail pages
+# =========================
+@bp.route('/user/<uuid:user_id>', methods=['GET'])
+@read_replica
+def user_detail_page(user_id):
+    try:
+        detail = user_detail(user_id)
+        if not detail:
+            return render_template('error.html', message="User not found"), 404
+        
+        logins = detail['logins']
+        return render_template(
+            'admin_user_detail_new.html',
+            user=detail['user'],
+            machine_login=logins[0][0] if logins else None,
+            license=active_license(logins),
+            logins=logins,
+            machines=detail['machines'],
+        )
+    
+    except Exception as e:
+        logger.error(f"Admin user detail error: {e}")
+        return render_template('error.html', message="Server error"), 500
+
+@bp.route('/system/<mac_address>', methods=['GET'])
+@read_replica
+def system_detail_page(mac_address):
+    try:
+        detail = system_detail(mac_address)
+        if not detail:
+            return render_template('error.html', message="System not found"), 404
+        
+        machine_login, license = detail['logins'][0]
+        return render_template(
+            'admin_system_detail.html',
+            machine_login=machine_login,
+            current_user=detail['users'].get(machine_login.user_id),
+            license=license or active_license(detail['logins']),
+            logins=detail['logins'],
+            users=detail['users'],
+            machines=detail['machines'],
+        )
+    
+    except Exception as e:
+        logger.error(f"Admin system detail error: {e}")
+        return render_template('error.html', message="Server error"), 500
+
+def _logins_data(logins, include_components):
+    return [{
+        'machine_login': login.to_dict(include_components),
+        'license': license.to_dict(include_components) if license else None
+    } for login, license in logins]
+
+def _machines_data(machines):
+    return [{
+        'machine': machine.to_dict(),
+        'active_sessions': [s.to_dict() for s in sessions]
+    } for machine, sessions in machines]
+
+@bp.route('/users/<uuid:user_id>/api', methods=['GET'])
+@read_replica
+def get_user_detail_api(user_id):
+    try:
+        include_components = components_requested()
+        detail = user_detail(user_id, include_components)
+        if not detail:
+            return jsonify({'error': 'User not found'}), 404
+        
+        return jsonify({
+            'user': detail['user'].to_dict(),
+            'machine_logins': _logins_data(detail['logins'], include_components),
+            'machines': _machines_data(detail['machines']),
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Admin user detail api error: {e}")
+        return jsonify({'error': 'Server error'}), 500
+
+@bp.route('/systems/<mac_address>/api', methods=['GET'])
+@read_replica
+def get_system_detail_api(mac_address):
+    try:
+        include_components = components_requested()
+        detail = system_detail(mac_address, include_components)
+        if not detail:
+            return jsonify({'error': 'System not found'}), 404
+        
+        return jsonify({
+            'mac_address': mac_address,
+            'machine_logins': _logins_data(detail['logins'], include_components),
+            'users': [user.to_dict() for user in detail['users'].values()],
+            'machines': _machines_data(detail['machines']),
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Admin system detail api error: {e}")
+        return jsonify({'error': 'Server error'}), 500
+
+def _sessions_response(criterion):
+    """Newest-first sessions; page with ?before=<next_before of the previous page>&limit="""
+    try:
+        before, limit = _page_args()
+    except ValueError:
+        return jsonify({'error': 'before must be a cursor from next_before and limit an integer'}), 400
+    
+    try:
+        sessions = session_history(criterion, before=before, limit=limit)
+        return jsonify({
+            'sessions': [s.to_dict() for s in sessions],
+            'next_before': next_cursor(sessions, limit, 'logged_in_at')
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Session history error: {e}")
+        return jsonify({'error': 'Server error'}), 500
+
+@bp.route('/users/<uuid:user_id>/sessions', methods=['GET'])
+@read_replica
+def user_sessions(user_id):
+    return _sessions_response(UserSession.user_id == user_id)
+
+@bp.route('/systems/<mac_address>/sessions', methods=['GET'])
+@read_replica
+def system_sessions(mac_address):
+    machine_ids = db.session.query(MachineLogin.machine_id).filter(
+        MachineLogin.mac_address == mac_address
+    ).scalar_subquery()
+    return _sessions_response(UserSession.machine_id.in_(machine_ids))
+
 # =========================
 # Admin APIs
 # =========================
 @bp.route('/users/api', methods=['GET'])
+@read_replica
 def get_users_api():
     try:
         page = request.args.get('page', 1, type=int)
@@ -126,6 +428,7 @@ def get_users_api():
         
         users_paginated = query.paginate(page=page, per_page=per_page)
         
+        include_components = components_requested()
         users_data = []
         for user in users_paginated.items:
             machine_login = MachineLogin.query.filter_by(user_id=user.id).first()
@@ -138,8 +441,8 @@ def get_users_api():
             
             users_data.append({
                 'user': user.to_dict(),
-                'machine_login': machine_login.to_dict() if machine_login else None,
-                'license': license.to_dict() if license else None
+                'machine_login': machine_login.to_dict(include_components) if machine_login else None,
+                'license': license.to_dict(include_components) if license else None
             })
         
         return jsonify({
@@ -154,13 +457,17 @@ def get_users_api():
         return jsonify({'error': 'Server error'}), 500
 
 @bp.route('/machines/api', methods=['GET'])
+@read_replica
 def get_machines_api():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         search = request.args.get('search', '', type=str)
         
+        include_components = components_requested()
         query = MachineLogin.query
+        if include_components:
+            query = query.options(selectinload(MachineLogin.component_set))
         if search:
             query = query.filter(
                 (MachineLogin.machine_name.ilike(f'%{search}%')) |
@@ -180,8 +487,8 @@ def get_machines_api():
                 ).first()
             
             machines_data.append({
-                'machine_login': login.to_dict(),
-                'license': license.to_dict() if license else None
+                'machine_login': login.to_dict(include_components),
+                'license': license.to_dict(include_components) if license else None
             })
         
         return jsonify({
@@ -194,3 +501,150 @@ def get_machines_api():
     except Exception as e:
         logger.error(f"Admin machines api error: {e}")
         return jsonify({'error': 'Server error'}), 500
+
+# =========================
+# Bulk operations
+# =========================
+def _bulk_request():
+    data = request.get_json() or {}
+    if data.get('admin_email') != "admin@serkayon.com":
+        return None, (jsonify({'error': 'Admin access required'}), 403)
+    
+    ids = data.get('ids') or []
+    filters = data.get('filter') or {}
+    if not isinstance(ids, list) or not isinstance(filters, dict):
+        return None, (jsonify({'error': 'ids must be a list and filter an object'}), 400)
+    
+    return data, None
+
+def _bulk_options(data):
+    return {
+        'dry_run': bool(data.get('dry_run', False)),
+        'chunk_size': chunk_size_option(data.get('chunk_size')),
+    }
+
+@bp.route('/bulk/licenses', methods=['POST'])
+def bulk_licenses():
+    data, error = _bulk_request()
+    if error:
+        return error
+    
+    try:
+        action = data.get('action')
+        summary = run_bulk(
+            License,
+            license_criteria(data.get('ids'), data.get('filter')),
+            values=license_values(action, data),
+            before_chunk=license_history(action, data),
+            **_bulk_options(data)
+        )
+        return jsonify({'action': data.get('action'), **summary}), 200
+    
+    except BulkSelectionError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Bulk licenses error: {e}")
+        return jsonify({'error': 'Bulk operation failed'}), 500
+
+@bp.route('/bulk/users', methods=['POST'])
+def bulk_users():
+    data, error = _bulk_request()
+    if error:
+        return error
+    
+    try:
+        action = data.get('action')
+        criteria = user_criteria(data.get('ids'), data.get('filter'))
+        
+        if action == 'delete':
+            # Revoke first: once the rows are gone no worker's filter can find them
+            summary = run_bulk(User, criteria, delete=True, before_chunk=revoke_user_sessions,
+                               **_bulk_options(data))
+        elif action in ('deactivate', 'activate'):
+            summary = run_bulk(User, criteria, values={
+                User.is_active: action == 'activate',
+                User.updated_at: datetime.utcnow()
+            },
+                # Deactivated users keep no sessions (and so no refresh tokens)
+                before_chunk=revoke_user_sessions if action == 'deactivate' else None,
+                **_bulk_options(data))
+        else:
+            return jsonify({'error': 'action must be deactivate, activate or delete'}), 400
+        
+        return jsonify({'action': action, **summary}), 200
+    
+    except BulkSelectionError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Bulk users error: {e}")
+        return jsonify({'error': 'Bulk operation failed'}), 500
+
+@bp.route('/bulk/machines', methods=['POST'])
+def bulk_machines():
+    data, error = _bulk_request()
+    if error:
+        return error
+    
+    try:
+        action = data.get('action')
+        criteria = machine_criteria(data.get('ids'), data.get('filter'))
+        
+        if action == 'delete':
+            summary = run_bulk(Machine, criteria, delete=True, **_bulk_options(data))
+        elif action in ('deactivate', 'activate'):
+            summary = run_bulk(Machine, criteria, values={
+                Machine.is_active: action == 'activate'
+            }, **_bulk_options(data))
+        else:
+            return jsonify({'error': 'action must be deactivate, activate or delete'}), 400
+        
+        return jsonify({'action': action, **summary}), 200
+    
+    except BulkSelectionError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Bulk machines error: {e}")
+        return jsonify({'error': 'Bulk operation failed'}), 500
+
+# =========================
+# License import
+# =========================
+def _import_format(upload):
+    fmt = request.values.get('format')
+    if not fmt:
+        name = (upload.filename if upload else '') or ''
+        mimetype = upload.mimetype if upload else request.mimetype
+        fmt = 'ndjson' if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in mimetype else 'csv'
+    return fmt
+
+@bp.route('/import/licenses', methods=['POST'])
+def import_licenses():
+    """Stream a CSV/NDJSON upload (multipart `file` or raw body) into licenses"""
+    if request.values.get('admin_email') != "admin@serkayon.com":
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    upload = request.files.get('file')
+    fmt = _import_format(upload)
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(FORMATS)}"}), 400
+    
+    importer = LicenseImport(
+        chunk_size=request.values.get('chunk_size', IMPORT_CHUNK_SIZE, type=int),
+        start_row=request.values.get('start_row', 0, type=int)
+    )
+    try:
+        stream = text_stream(upload.stream if upload else request.stream)
+        summary = importer.run(read_rows(stream, fmt))
+        return jsonify(summary), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"License import error: {e}")
+        # Chunks up to last_row are committed; resume with start_row=last_row
+        return jsonify({'error': 'Import failed', 'last_row': importer.last_row}), 500
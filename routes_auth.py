@@ -1,8 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from datetime import datetime, timedelta
-from models import db, User, MachineLogin, OTP
+from models import db, User, MachineLogin, OTP, normalize_fingerprint
 import logging
 from email_service import email_service
+from idempotency import idempotent
+from event_log import record_event
+from auth_tokens import (
+    token_auth, request_user_id, create_session, rotate_refresh_token,
+    revoke_session, issue_access_token,
+)
 
 logger = logging.getLogger(__name__)
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
@@ -11,6 +17,7 @@ bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 # Register
 # =========================
 @bp.route('/register', methods=['POST'])
+@idempotent
 def register():
     try:
         data = request.get_json()
@@ -63,7 +70,8 @@ def login():
         if not user.is_active:
             return jsonify({'error': 'Account is inactive'}), 403
         
-        machine_fingerprint = data.get('machine_fingerprint')
+        # Malformed fingerprints are ignored; the MAC address is used instead
+        machine_fingerprint = normalize_fingerprint(data.get('machine_fingerprint'))
         mac_address = data.get('mac_address', '')
         
         existing_login = None
@@ -74,6 +82,13 @@ def login():
         if not existing_login:
             existing_login = MachineLogin.query.filter_by(mac_address=mac_address).first()
         
+        # Machine handed over from another account
+        details = None
+        if existing_login and existing_login.user_id != user.id:
+            details = {'previous_user_id': str(existing_login.user_id)}
+        record_event('login', user_id=user.id, machine_fingerprint=machine_fingerprint,
+                     machine_id=data.get('machine_id'), details=details)
+        
         if existing_login:
             existing_login.user_id = user.id
             existing_login.current_email = user.email
@@ -88,11 +103,18 @@ def login():
             )
             db.session.add(machine_login)
         
+        session, refresh_token = create_session(user, data)
         db.session.commit()
         
+        access_token, expires_in = issue_access_token(user.id, session.id)
+        
         return jsonify({
             'message': 'Login successful',
-            'user': user.to_dict()
+            'user': user.to_dict(),
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'token_type': 'Bearer',
+            'expires_in': expires_in
         }), 200
     
     except Exception as e:
@@ -100,19 +122,55 @@ def login():
         logger.error(e)
         return jsonify({'error': 'Login failed'}), 500
 
+# =========================
+# Refresh access token
+# =========================
+@bp.route('/refresh', methods=['POST'])
+def refresh():
+    try:
+        data = request.get_json()
+        refresh_token = data.get('refresh_token')
+        
+        if not refresh_token:
+            return jsonify({'error': 'refresh_token required'}), 400
+        
+        session, new_refresh_token = rotate_refresh_token(refresh_token)
+        if not session:
+            return jsonify({'error': 'Invalid or expired refresh token'}), 401
+        
+        db.session.commit()
+        access_token, expires_in = issue_access_token(session.user_id, session.id)
+        
+        return jsonify({
+            'access_token': access_token,
+            'refresh_token': new_refresh_token,
+            'token_type': 'Bearer',
+            'expires_in': expires_in
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(e)
+        return jsonify({'error': 'Refresh failed'}), 500
+
 # =========================
 # Logout
 # =========================
 @bp.route('/logout', methods=['POST'])
+@token_auth
 def logout():
     try:
-        data = request.get_json()
-        user_id = data.get('user_id')
+        data = request.get_json() or {}
+        user_id = request_user_id(data.get('user_id'))
         
         if not user_id:
             return jsonify({'error': 'user_id required'}), 400
         
-        MachineLogin.query.filter_by(user_id=user_id).delete()
+        if g.authenticated:
+            revoke_session(g.session_id)
+        
+        machines = MachineLogin.query.filter_by(user_id=user_id).delete()
+        record_event('logout', user_id=user_id, details={'machines': machines})
         db.session.commit()
         
         return jsonify({'message': 'Logout successful'}), 200
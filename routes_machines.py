@@ -1,6 +1,10 @@
-from flask import Blueprint, request, jsonify
-from models import db, User, Machine
-from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app, g
+from models import db, User, Machine, MachineLogin, UserSession, normalize_fingerprint
+from datetime import datetime, timedelta
+from heartbeat import heartbeat_buffer
+from db_routing import read_replica
+from idempotency import idempotent
+from auth_tokens import token_auth, request_user_id
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,9 +14,10 @@ bp = Blueprint('machines', __name__, url_prefix='/api/machines')
 # Get all machines for user
 # =========================
 @bp.route('', methods=['GET'])
+@token_auth
 def get_machines():
     try:
-        user_id = request.args.get('user_id')
+        user_id = request_user_id(request.args.get('user_id'))
         if not user_id:
             return jsonify({'error': 'user_id required'}), 400
         
@@ -30,10 +35,12 @@ def get_machines():
 # Register new machine
 # =========================
 @bp.route('', methods=['POST'])
+@token_auth
+@idempotent
 def register_machine():
     try:
         data = request.get_json()
-        user_id = data.get('user_id')
+        user_id = request_user_id(data.get('user_id'))
         
         if not user_id:
             return jsonify({'error': 'user_id required'}), 400
@@ -42,8 +49,8 @@ def register_machine():
         if not all(field in data for field in required_fields):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        user = User.query.get(user_id)
-        if not user:
+        # A valid token already proves the user exists
+        if not g.authenticated and not User.query.get(user_id):
             return jsonify({'error': 'User not found'}), 404
         
         # Check if machine already exists
@@ -73,13 +80,71 @@ def register_machine():
         logger.error(f"Register machine error: {e}")
         return jsonify({'error': 'Machine registration failed'}), 500
 
+# =========================
+# Batched heartbeats
+# =========================
+@bp.route('/heartbeat', methods=['POST'])
+def heartbeat():
+    try:
+        data = request.get_json()
+        machine_ids = data.get('machine_ids', [])
+        fingerprints = data.get('fingerprints', [])
+        
+        if not isinstance(machine_ids, list) or not isinstance(fingerprints, list):
+            return jsonify({'error': 'machine_ids and fingerprints must be lists'}), 400
+        
+        if not machine_ids and not fingerprints:
+            return jsonify({'error': 'machine_ids or fingerprints required'}), 400
+        
+        if len(machine_ids) + len(fingerprints) > current_app.config.get('HEARTBEAT_MAX_BATCH', 5000):
+            return jsonify({'error': 'Too many heartbeats in one batch'}), 413
+        
+        heartbeat_buffer.start_flusher(current_app._get_current_object())
+        heartbeat_buffer.record(
+            (str(m) for m in machine_ids if m),
+            (f for f in map(normalize_fingerprint, fingerprints) if f)
+        )
+        
+        return jsonify({'accepted': len(machine_ids) + len(fingerprints)}), 202
+    
+    except Exception as e:
+        logger.error(f"Heartbeat error: {e}")
+        return jsonify({'error': 'Heartbeat failed'}), 500
+
+# =========================
+# Active machine counts
+# =========================
+@bp.route('/active', methods=['GET'])
+@read_replica
+def active_counts():
+    try:
+        minutes = request.args.get('minutes', 15, type=int)
+        since = datetime.utcnow() - timedelta(minutes=minutes)
+        
+        # Index range counts on last_seen / last_activity
+        return jsonify({
+            'minutes': minutes,
+            'machines': Machine.query.filter(Machine.last_seen >= since).count(),
+            'machine_logins': MachineLogin.query.filter(MachineLogin.last_activity >= since).count(),
+            'sessions': UserSession.query.filter(
+                UserSession.last_activity >= since,
+                UserSession.is_active.is_(True)
+            ).count(),
+            'pending_heartbeats': heartbeat_buffer.pending()
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Active counts error: {e}")
+        return jsonify({'error': 'Failed to count active machines'}), 500
+
 # =========================
 # Get single machine
 # =========================
 @bp.route('/<machine_id>', methods=['GET'])
+@token_auth
 def get_machine(machine_id):
     try:
-        user_id = request.args.get('user_id')
+        user_id = request_user_id(request.args.get('user_id'))
         if not user_id:
             return jsonify({'error': 'user_id required'}), 400
         
@@ -101,10 +166,11 @@ def get_machine(machine_id):
 # Update machine
 # =========================
 @bp.route('/<machine_id>', methods=['PUT'])
+@token_auth
 def update_machine(machine_id):
     try:
         data = request.get_json()
-        user_id = data.get('user_id')
+        user_id = request_user_id(data.get('user_id'))
         
         if not user_id:
             return jsonify({'error': 'user_id required'}), 400
@@ -139,10 +205,11 @@ def update_machine(machine_id):
 # Delete machine
 # =========================
 @bp.route('/<machine_id>', methods=['DELETE'])
+@token_auth
 def delete_machine(machine_id):
     try:
         data = request.get_json()
-        user_id = data.get('user_id')
+        user_id = request_user_id(data.get('user_id'))
         
         if not user_id:
             return jsonify({'error': 'user_id required'}), 400
@@ -2,7 +2,7 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta, timezone
 from models import db, OTP
 from email_service import email_service
-from email_worker import email_queue
+from email_worker import enqueue_otp_email
 import logging
 
 logger = logging.getLogger(__name__)
@@ -35,7 +35,7 @@ def send_otp():
         db.session.add(otp)
         db.session.commit()
 
-        email_queue.put((email, otp_code))
+        enqueue_otp_email(email, otp_code)
 
         return jsonify({'message': 'OTP queued'}), 200
 
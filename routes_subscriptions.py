@@ -1,7 +1,19 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, g
+import time
 from datetime import datetime, timedelta
-from models import db, User, License
+from models import db, User, License, MachineLogin, normalize_fingerprint
+from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
 from encryption import LicenseEncryption
+from db_routing import read_replica
+from idempotency import idempotent
+from auth_tokens import token_auth, request_user_id
+from fingerprint_index import index_license, find_similar
+from component_sets import components_digest, store_components, components_requested
+from license_notifier import license_notifier, license_changed, license_version
+from rollups import record_activation
+from event_log import record_event
+from pagination import parse_cursor, newest_first, next_cursor
 import uuid
 import logging
 
@@ -29,18 +41,35 @@ PLANS = {
     }
 }
 
+# Portfolio page size
+DEFAULT_PORTFOLIO_LIMIT = 50
+MAX_PORTFOLIO_LIMIT = 200
+LICENSE_STATUSES = ('active', 'expired', 'inactive')
+
+
+def _user_uuid(value):
+    """UUID for a token or legacy user_id value, None if malformed"""
+    if value is None or isinstance(value, uuid.UUID):
+        return value
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
 # =========================
 # Activate License
 # =========================
 @bp.route('/activate', methods=['POST'])
+@token_auth
+@idempotent
 def activate_license():
     try:
         data = request.get_json()
 
-        # user_id is now manual
-        user_id = data.get('user_id')
-        user = User.query.get(user_id)
-        if not user:
+        # Token holders are already authenticated; legacy clients send user_id
+        user_id = request_user_id(data.get('user_id'))
+        if not g.authenticated and not User.query.get(user_id):
             return jsonify({'error': 'Invalid user'}), 401
 
         required_fields = ['machine_fingerprint', 'plan_type']
@@ -50,8 +79,8 @@ def activate_license():
         if data['plan_type'] not in PLANS:
             return jsonify({'error': 'Invalid plan type'}), 400
 
-        machine_fingerprint = data['machine_fingerprint']
-        if len(machine_fingerprint) != 64:
+        machine_fingerprint = normalize_fingerprint(data['machine_fingerprint'])
+        if not machine_fingerprint:
             return jsonify({'error': 'Invalid fingerprint format'}), 400
 
         existing_license = License.query.filter_by(
@@ -69,19 +98,34 @@ def activate_license():
         plan_config = PLANS[data['plan_type']]
         activated_at = datetime.utcnow()
         expiry_date = activated_at + timedelta(days=plan_config['duration_days'])
+        components = data.get('fingerprint_components')
 
         if existing_license:
             # Upgrade
+            previous_plan = existing_license.plan_type
+            record_activation(data['plan_type'], plan_config['price'], activated_at,
+                              previous_plan=previous_plan)
+            record_event('upgrade', occurred_at=activated_at, license_id=existing_license.license_id,
+                         user_id=user_id, machine_fingerprint=machine_fingerprint,
+                         machine_id=data.get('machine_id'), plan_type=data['plan_type'],
+                         previous_plan_type=previous_plan)
             existing_license.plan_type = data['plan_type']
             existing_license.plan_name = plan_config['name']
             existing_license.plan_price = plan_config['price']
             existing_license.activated_at = activated_at
             existing_license.expiry_date = expiry_date
             existing_license.is_active = True
+            # Whoever pays for the upgrade owns the license
+            existing_license.user_id = _user_uuid(user_id) or existing_license.user_id
             existing_license.upgraded_at = activated_at
             existing_license.updated_at = activated_at
             existing_license.fingerprint_stability = data.get('fingerprint_stability', 0)
-            existing_license.fingerprint_components = data.get('fingerprint_components')
+            # Unchanged hardware: no component write and no re-index
+            components_hash = components_digest(components)
+            if existing_license.components_hash != components_hash:
+                store_components(components)
+                index_license(existing_license.license_id, components)
+                existing_license.components_hash = components_hash
             existing_license.last_verified_fingerprint = activated_at
             license_id = existing_license.license_id
         else:
@@ -89,10 +133,11 @@ def activate_license():
             license_id = f"LIC-{uuid.uuid4().hex[:12].upper()}"
             license_obj = License(
                 license_id=license_id,
+                user_id=_user_uuid(user_id),
                 machine_fingerprint=machine_fingerprint,
                 fingerprint_short=data.get('fingerprint_short'),
                 fingerprint_stability=data.get('fingerprint_stability', 0),
-                fingerprint_components=data.get('fingerprint_components'),
+                components_hash=store_components(components),
                 mac_address=data.get('mac_address'),
                 machine_id=data.get('machine_id'),
                 machine_name=data.get('machine_name'),
@@ -105,7 +150,14 @@ def activate_license():
                 last_verified_fingerprint=activated_at
             )
             db.session.add(license_obj)
-
+            db.session.flush()
+            index_license(license_id, components)
+            record_activation(data['plan_type'], plan_config['price'], activated_at)
+            record_event('activation', occurred_at=activated_at, license_id=license_id,
+                         user_id=user_id, machine_fingerprint=machine_fingerprint,
+                         machine_id=data.get('machine_id'), plan_type=data['plan_type'])
+
+        license_changed(machine_fingerprint)
         db.session.commit()
 
         # Encrypted response
@@ -137,6 +189,7 @@ def activate_license():
 # Verify License by ID
 # =========================
 @bp.route('/verify/<license_id>', methods=['GET'])
+@read_replica
 def verify_license(license_id):
     try:
         license_obj = License.query.filter_by(license_id=license_id).first()
@@ -153,8 +206,8 @@ def verify_license(license_id):
             'license_id': license_obj.license_id,
             'plan_name': license_obj.plan_name,
             'plan_type': license_obj.plan_type,
-            'activated_at': license_obj.activated_at.isoformat(),
-            'expiry_date': license_obj.expiry_date.isoformat(),
+            'activated_at': license_obj.activated_at,
+            'expiry_date': license_obj.expiry_date,
             'is_active': license_obj.is_active,
             'days_remaining': days_remaining,
             'expired': not is_valid
@@ -168,12 +221,16 @@ def verify_license(license_id):
 # Get User License
 # =========================
 @bp.route('/user/<user_id>', methods=['GET'])
+@read_replica
 def get_user_license(user_id):
     try:
         machine_fingerprint = request.args.get('machine_fingerprint')
         mac_address = request.args.get('mac_address')
 
         if machine_fingerprint:
+            machine_fingerprint = normalize_fingerprint(machine_fingerprint)
+            if not machine_fingerprint:
+                return jsonify({'error': 'Invalid fingerprint'}), 400
             license_obj = License.query.filter_by(
                 machine_fingerprint=machine_fingerprint,
                 is_active=True
@@ -184,7 +241,14 @@ def get_user_license(user_id):
                 is_active=True
             ).first()
         else:
-            return jsonify({'error': 'machine_fingerprint or mac_address required'}), 400
+            # No machine given: the user's most recently activated license
+            owner_id = _user_uuid(user_id)
+            if not owner_id:
+                return jsonify({'error': 'Invalid user_id'}), 400
+            license_obj = License.query.filter_by(
+                user_id=owner_id,
+                is_active=True
+            ).order_by(License.activated_at.desc()).first()
 
         if not license_obj:
             return jsonify({'license': None, 'has_active': False}), 200
@@ -193,7 +257,7 @@ def get_user_license(user_id):
         is_valid = license_obj.expiry_date > now
 
         return jsonify({
-            'license': license_obj.to_dict(),
+            'license': license_obj.to_dict(include_components=components_requested()),
             'has_active': is_valid,
             'days_remaining': max((license_obj.expiry_date - now).days, 0),
             'expired': not is_valid
@@ -203,13 +267,70 @@ def get_user_license(user_id):
         return jsonify({'error': 'Failed'}), 500
 
 
+# =========================
+# License portfolio
+# =========================
+@bp.route('/portfolio', methods=['GET'])
+@read_replica
+@token_auth
+def get_license_portfolio():
+    """
+    Every license the caller owns, newest activation first. Page with
+    ?before=<next_before of the previous page>&limit=; ?status= narrows to
+    active, expired or inactive licenses. Bearer token only.
+    """
+    try:
+        # New endpoint: no legacy ?user_id= fallback
+        if not g.get('authenticated'):
+            return jsonify({'error': 'Authorization required'}), 401
+        user_id = g.user_id
+
+        status = request.args.get('status')
+        if status and status not in LICENSE_STATUSES:
+            return jsonify({'error': f"status must be one of {', '.join(LICENSE_STATUSES)}"}), 400
+
+        try:
+            before = parse_cursor(request.args.get('before'))
+            limit = min(max(int(request.args.get('limit', DEFAULT_PORTFOLIO_LIMIT)), 1), MAX_PORTFOLIO_LIMIT)
+        except ValueError:
+            return jsonify({'error': 'before must be a cursor from next_before and limit an integer'}), 400
+
+        now = datetime.utcnow()
+        # One range read on ix_licenses_user_id_activated_at
+        query = License.query.filter(License.user_id == user_id)
+        if status == 'active':
+            query = query.filter(License.is_active.is_(True), License.expiry_date > now)
+        elif status == 'expired':
+            query = query.filter(License.is_active.is_(True), License.expiry_date <= now)
+        elif status == 'inactive':
+            query = query.filter(License.is_active.is_(False))
+        include_components = components_requested()
+        if include_components:
+            query = query.options(selectinload(License.component_set))
+        licenses = newest_first(query, License.activated_at, License.id, before).limit(limit).all()
+
+        return jsonify({
+            'licenses': [{
+                **lic.to_dict(include_components=include_components),
+                'status': lic.status(now),
+                'days_remaining': max((lic.expiry_date - now).days, 0),
+            } for lic in licenses],
+            'next_before': next_cursor(licenses, limit, 'activated_at')
+        }), 200
+
+    except Exception as e:
+        logger.error(f"License portfolio error: {e}")
+        return jsonify({'error': 'Failed to fetch licenses'}), 500
+
+
 # =========================
 # Get License by Fingerprint
 # =========================
 @bp.route('/machine/fingerprint/<machine_fingerprint>', methods=['GET'])
 def get_machine_license_by_fingerprint(machine_fingerprint):
     try:
-        if len(machine_fingerprint) != 64:
+        machine_fingerprint = normalize_fingerprint(machine_fingerprint)
+        if not machine_fingerprint:
             return jsonify({'error': 'Invalid fingerprint'}), 400
 
         license_obj = License.query.filter_by(
@@ -227,7 +348,7 @@ def get_machine_license_by_fingerprint(machine_fingerprint):
         db.session.commit()
 
         return jsonify({
-            'license': license_obj.to_dict(),
+            'license': license_obj.to_dict(include_components=components_requested()),
             'has_active': is_valid,
             'days_remaining': max((license_obj.expiry_date - now).days, 0),
             'expired': not is_valid,
@@ -239,10 +360,130 @@ def get_machine_license_by_fingerprint(machine_fingerprint):
         return jsonify({'error': 'Failed'}), 500
 
 
+# =========================
+# Long-poll for license changes
+# =========================
+@bp.route('/machine/fingerprint/<machine_fingerprint>/changes', methods=['GET'])
+def wait_for_license_change(machine_fingerprint):
+    """
+    Returns the license as soon as its version differs from ?version=, or
+    304 after ?timeout= seconds without a change.
+    """
+    try:
+        machine_fingerprint = normalize_fingerprint(machine_fingerprint)
+        if not machine_fingerprint:
+            return jsonify({'error': 'Invalid fingerprint'}), 400
+
+        config = current_app.config
+        known_version = request.args.get('version')
+        timeout = min(
+            request.args.get('timeout', config.get('LICENSE_POLL_MAX_SECONDS', 60), type=float),
+            config.get('LICENSE_POLL_MAX_SECONDS', 60)
+        )
+        deadline = time.monotonic() + max(timeout, 0)
+
+        with license_notifier.subscribe(machine_fingerprint) as changed:
+            while True:
+                # Cleared before the read: a change committed after it sets it again
+                changed.clear()
+                license_obj = License.query.filter_by(machine_fingerprint=machine_fingerprint).first()
+                version = license_version(license_obj)
+                if version != known_version:
+                    return jsonify({
+                        'license': license_obj.to_dict(include_components=components_requested()) if license_obj else None,
+                        'version': version,
+                        'changed': known_version is not None,
+                    }), 200
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return '', 304
+                # This request is one of the subscribers
+                if license_notifier.waiting() > config.get('LICENSE_POLL_MAX_WAITERS', 1000):
+                    # Worker is full: answer now and have the client back off
+                    return '', 304, {'Retry-After': str(int(timeout) or 1)}
+
+                # Do not hold a pooled connection while idle
+                db.session.remove()
+                if not changed.wait(remaining):
+                    return '', 304
+
+    except Exception as e:
+        logger.error(f"License change poll error: {e}")
+        return jsonify({'error': 'Failed'}), 500
+
+
+# =========================
+# Closest License by fingerprint components
+# =========================
+def _owns_license(user_id, lic):
+    """The user bought the license or has logged in on its machine"""
+    if lic.user_id == user_id:
+        return True
+    return db.session.query(MachineLogin.query.filter(
+        MachineLogin.user_id == user_id,
+        or_(MachineLogin.machine_fingerprint == lic.machine_fingerprint,
+            MachineLogin.machine_id == lic.machine_id)
+    ).exists()).scalar()
+
+
+@bp.route('/match', methods=['POST'])
+@token_auth
+def match_license():
+    """
+    Closest license to the posted components. Only the license's owner gets
+    the license itself; other callers get its license_id and similarity.
+    Bearer token only.
+    """
+    try:
+        if not g.get('authenticated'):
+            return jsonify({'error': 'Authorization required'}), 401
+
+        data = request.get_json()
+        components = data.get('fingerprint_components')
+        if not components:
+            return jsonify({'error': 'fingerprint_components required'}), 400
+
+        machine_fingerprint = data.get('machine_fingerprint')
+        if machine_fingerprint:
+            machine_fingerprint = normalize_fingerprint(machine_fingerprint)
+            if not machine_fingerprint:
+                return jsonify({'error': 'Invalid fingerprint'}), 400
+        threshold = current_app.config.get('FINGERPRINT_MATCH_THRESHOLD', 0.6)
+
+        candidates = find_similar(components, exclude_fingerprint=machine_fingerprint)
+        best, similarity = candidates[0] if candidates else (None, 0.0)
+        matched = best is not None and similarity >= threshold
+        owned = matched and _owns_license(g.user_id, best)
+
+        # Drifted fingerprint of the caller's own machine: record it on the license
+        if owned and machine_fingerprint:
+            best.fingerprint_mismatch_count = (best.fingerprint_mismatch_count or 0) + 1
+            db.session.commit()
+
+        return jsonify({
+            'license': best.to_dict(include_components=components_requested()) if owned else None,
+            'license_id': best.license_id if matched else None,
+            'similarity': round(similarity, 4),
+            'matched': matched,
+            'owned': owned,
+            'candidates': [
+                {'license_id': lic.license_id, 'similarity': round(score, 4)}
+                for lic, score in candidates
+            ]
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"License match error: {e}")
+        return jsonify({'error': 'Match failed'}), 500
+
+
 # =========================
 # Get License by MAC (deprecated)
 # =========================
 @bp.route('/machine/<mac_address>', methods=['GET'])
+@read_replica
 def get_machine_license(mac_address):
     try:
         license_obj = License.query.filter_by(
@@ -261,7 +502,7 @@ def get_machine_license(mac_address):
         is_valid = license_obj.expiry_date > now
 
         return jsonify({
-            'license': license_obj.to_dict(),
+            'license': license_obj.to_dict(include_components=components_requested()),
             'has_active': is_valid,
             'days_remaining': max((license_obj.expiry_date - now).days, 0),
             'expired': not is_valid
@@ -283,6 +524,9 @@ def deactivate_license(license_id):
             return jsonify({'error': 'License not found'}), 404
 
         lic.is_active = False
+        record_event('deactivation', license_id=lic.license_id, machine_fingerprint=lic.machine_fingerprint,
+                     machine_id=lic.machine_id, plan_type=lic.plan_type)
+        license_changed(lic.machine_fingerprint)
         db.session.commit()
 
         return jsonify({'message': 'License deactivated successfully'}), 200
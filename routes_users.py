@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
 from models import db, User
+from db_routing import read_replica
+from auth_tokens import token_auth, request_user_id
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,9 +11,11 @@ bp = Blueprint('users', __name__, url_prefix='/api/users')
 # Get current user profile
 # =========================
 @bp.route('/profile', methods=['GET'])
+@read_replica
+@token_auth
 def get_profile():
     try:
-        user_id = request.args.get('user_id')
+        user_id = request_user_id(request.args.get('user_id'))
         if not user_id:
             return jsonify({'error': 'user_id required'}), 400
 
@@ -29,9 +33,10 @@ def get_profile():
 # Update current user profile
 # =========================
 @bp.route('/profile', methods=['PUT'])
+@token_auth
 def update_profile():
     try:
-        user_id = request.args.get('user_id')
+        user_id = request_user_id(request.args.get('user_id'))
         if not user_id:
             return jsonify({'error': 'user_id required'}), 400
 
@@ -60,6 +65,7 @@ def update_profile():
 # Get any user (self only for now)
 # =========================
 @bp.route('/<user_id>', methods=['GET'])
+@read_replica
 def get_user(user_id):
     try:
         user = User.query.get(user_id)
@@ -76,6 +82,7 @@ def get_user(user_id):
 # List users (ADMIN only)
 # =========================
 @bp.route('', methods=['GET'])
+@read_replica
 def list_users():
     try:
         admin_email = request.args.get('admin_email')
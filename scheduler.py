@@ -0,0 +1,420 @@
+"""
+Single-leader scheduler for periodic maintenance jobs.
+
+Jobs are registered with ``@scheduler.job(name, every=... | cron=...,
+timeout=...)`` (see jobs.py). Every worker starts a scheduler thread in
+init_worker, but only the elected leader runs jobs: the holder of a
+Postgres session-level advisory lock, or of an exclusive file lock next to
+the database for SQLite deployments. The other workers retry the election
+every SCHEDULER_ELECTION_SECONDS and take over when the leader's
+connection or process goes away.
+
+Each run gets its own thread and app context, never a request thread. The
+run's database work is bounded by the job timeout through the statement
+budget (see statement_budget.job_deadline). A run still going after its
+timeout is counted as timed out, and the job is not started again until it
+returns. Schedules and per-job counters (runs, failures, timeouts, last
+duration and error) are kept in ``scheduled_jobs``, so they survive a change
+of leader and can be read from any worker.
+"""
+
+import fcntl
+import os
+import threading
+import time
+import zlib
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from models import db, ScheduledJob
+from statement_budget import job_deadline
+
+logger = logging.getLogger(__name__)
+
+ADVISORY_LOCK_KEY = zlib.crc32(b"biolic-scheduler")
+MAX_ERROR_LENGTH = 1000
+TICK_SECONDS = 1
+
+
+# =========================
+# Schedules
+# =========================
+class Cron:
+    """Five-field cron expression (minute hour day-of-month month day-of-week), UTC"""
+
+    # Day of week accepts 7 for Sunday, as well as 0
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        # Standard cron: when both day fields are restricted, either may match
+        self._any_day = fields[2] == '*' or fields[4] == '*'
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(','):
+            body, _, step = part.partition('/')
+            step = int(step) if step else 1
+            if body == '*':
+                start, end = low, high
+            elif '-' in body:
+                start, end = (int(v) for v in body.split('-', 1))
+            else:
+                # "5/15" means 5, 20, 35, 50
+                start = int(body)
+                end = high if step > 1 else start
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"Cron field {field!r} is outside {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment):
+        weekday = (moment.weekday() + 1) % 7  # cron: 0 = Sunday
+        in_days, in_weekdays = moment.day in self.days, weekday in self.weekdays
+        return (in_days and in_weekdays) if self._any_day else (in_days or in_weekdays)
+
+    def next_after(self, moment):
+        """First matching minute after `moment`"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+    def __str__(self):
+        return f"cron {self.expression}"
+
+
+class Every:
+    """Fixed interval, measured from the start of the previous run"""
+
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError("Interval must be positive")
+        self.seconds = seconds
+
+    def next_after(self, moment):
+        return moment + timedelta(seconds=self.seconds)
+
+    def __str__(self):
+        return f"every {self.seconds}s"
+
+
+class Job:
+    def __init__(self, name, fn, schedule, timeout):
+        self.name = name
+        self.fn = fn
+        self.schedule = schedule
+        self.timeout = timeout
+        self.next_run = None
+        self.thread = None
+        self.started = None
+        self.timed_out = False
+
+
+# =========================
+# Leader election
+# =========================
+class AdvisoryLock:
+    """Postgres session-level advisory lock held on a dedicated connection"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.conn = None
+
+    def acquire(self):
+        conn = self.engine.connect()
+        try:
+            got = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': ADVISORY_LOCK_KEY}).scalar()
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if not got:
+            conn.close()
+            return False
+        self.conn = conn
+        return True
+
+    def held(self):
+        """Still leader: the connection holding the lock is alive"""
+        try:
+            self.conn.execute(text("SELECT 1"))
+            self.conn.commit()
+            return True
+        except Exception as e:
+            logger.warning(f"Scheduler lost its advisory lock connection: {e}")
+            self.release()
+            return False
+
+    def release(self):
+        if self.conn is not None:
+            try:
+                # Closing returns the connection to the pool; unlock explicitly
+                self.conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': ADVISORY_LOCK_KEY})
+                self.conn.commit()
+                self.conn.close()
+            except Exception:
+                self.conn.invalidate()
+            self.conn = None
+
+
+class FileLock:
+    """Exclusive flock on a file; released by the kernel when the process dies"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def acquire(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self.fd = fd
+        return True
+
+    def held(self):
+        return self.fd is not None
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def leader_lock(app):
+    """Advisory lock on Postgres, file lock otherwise"""
+    engine = db.engines[None]
+    if engine.dialect.name == 'postgresql':
+        return AdvisoryLock(engine)
+
+    path = app.config.get('SCHEDULER_LOCK_FILE')
+    if not path:
+        database = engine.url.database
+        if database and database != ':memory:':
+            path = database + '.scheduler.lock'
+        else:
+            path = os.path.join(app.instance_path, 'scheduler.lock')
+            os.makedirs(app.instance_path, exist_ok=True)
+    return FileLock(path)
+
+
+# =========================
+# Scheduler
+# =========================
+class Scheduler:
+    def __init__(self):
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._leader = None
+        self._pid = None
+
+    def job(self, name, every=None, cron=None, timeout=300):
+        """Register fn as a periodic job (every=seconds or cron='m h dom mon dow')"""
+        if (every is None) == (cron is None):
+            raise ValueError("Give exactly one of every= or cron=")
+        schedule = Every(every) if every is not None else Cron(cron)
+
+        def decorator(fn):
+            if name in self.jobs:
+                raise ValueError(f"Job {name} is already registered")
+            self.jobs[name] = Job(name, fn, schedule, timeout)
+            return fn
+        return decorator
+
+    @property
+    def is_leader(self):
+        return self._leader is not None
+
+    def start(self, app):
+        """Start the scheduler thread once per process (safe to call after fork)"""
+        if not app.config.get('SCHEDULER_ENABLED', True) or not self.jobs:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Inherited from a parent: its lock and threads belong to the parent
+            self._leader = None
+            for job in self.jobs.values():
+                job.thread = None
+            self._pid = os.getpid()
+
+        threading.Thread(target=self._run, args=(app,), name="job-scheduler", daemon=True).start()
+
+    # -------------------------
+    # Scheduler thread
+    # -------------------------
+    def _run(self, app):
+        election = app.config.get('SCHEDULER_ELECTION_SECONDS', 15)
+        lock = None
+        checked = 0
+        while True:
+            if time.monotonic() - checked >= election:
+                checked = time.monotonic()
+                try:
+                    with app.app_context():
+                        lock = lock or leader_lock(app)
+                        if self._leader is None:
+                            if lock.acquire():
+                                self._leader = lock
+                                logger.info(f"Scheduler leader is pid {os.getpid()}")
+                                self._load_schedule()
+                        elif not lock.held():
+                            self._leader = None
+                        db.session.remove()
+                except Exception as e:
+                    logger.error(f"Scheduler election failed: {e}")
+
+            if self._leader is not None:
+                try:
+                    self._run_due(app)
+                except Exception as e:
+                    logger.error(f"Scheduler tick failed: {e}")
+            time.sleep(TICK_SECONDS)
+
+    def _load_schedule(self):
+        """Continue each job's schedule from its last recorded start"""
+        now = datetime.utcnow()
+        try:
+            last_started = dict(db.session.query(ScheduledJob.name, ScheduledJob.last_started_at))
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Could not read job history, scheduling from now: {e}")
+            last_started = {}
+        for job in self.jobs.values():
+            started = last_started.get(job.name)
+            job.next_run = job.schedule.next_after(started) if started else job.schedule.next_after(now)
+            if isinstance(job.schedule, Every) and not started:
+                # Never ran anywhere: run on the first tick
+                job.next_run = now
+
+    def _run_due(self, app):
+        now = datetime.utcnow()
+        for job in self.jobs.values():
+            if job.thread is not None:
+                if job.thread.is_alive():
+                    if time.monotonic() - job.started > job.timeout and self._mark_timed_out(job):
+                        logger.error(f"Job {job.name} exceeded its {job.timeout}s timeout")
+                        self._record(app, job, 'timeout', time.monotonic() - job.started, "timed out")
+                    continue
+                job.thread = None
+            if job.next_run is None or job.next_run > now:
+                continue
+
+            job.next_run = job.schedule.next_after(now)
+            job.started = time.monotonic()
+            job.timed_out = False
+            job.thread = threading.Thread(
+                target=self._execute, args=(app, job, now), name=f"job-{job.name}", daemon=True
+            )
+            job.thread.start()
+
+    # -------------------------
+    # Job threads
+    # -------------------------
+    def _execute(self, app, job, started_at):
+        self._record(app, job, 'running', None, None, started_at=started_at)
+        error = None
+        with app.app_context():
+            try:
+                with job_deadline(job.timeout):
+                    job.fn()
+            except Exception as e:
+                db.session.rollback()
+                error = f"{type(e).__name__}: {e}"
+                logger.error(f"Job {job.name} failed: {error}")
+            finally:
+                db.session.remove()
+
+        duration = time.monotonic() - job.started
+        if duration > job.timeout:
+            # Cancelled at the deadline, or finished late
+            if not self._mark_timed_out(job):
+                return  # already counted by the scheduler thread
+            self._record(app, job, 'timeout', duration, error or "timed out")
+            return
+        self._record(app, job, 'failed' if error else 'ok', duration, error)
+
+    def _mark_timed_out(self, job):
+        """True for the first caller only, so a timeout is counted once"""
+        with self._lock:
+            if job.timed_out:
+                return False
+            job.timed_out = True
+            return True
+
+    def _record(self, app, job, status, duration, error, started_at=None):
+        """Update the job's row in scheduled_jobs (own session; never raises)"""
+        with app.app_context():
+            try:
+                row = db.session.get(ScheduledJob, job.name)
+                if row is None:
+                    row = ScheduledJob(name=job.name, runs=0, failures=0, timeouts=0)
+                    db.session.add(row)
+                row.schedule = str(job.schedule)
+                row.next_run_at = job.next_run
+                row.last_status = status
+                if started_at is not None:
+                    row.last_started_at = started_at
+                    row.runs += 1
+                else:
+                    row.last_finished_at = datetime.utcnow()
+                    row.last_duration_ms = round(duration * 1000, 1)
+                    row.last_error = error[:MAX_ERROR_LENGTH] if error else None
+                    if status == 'failed':
+                        row.failures += 1
+                    elif status == 'timeout':
+                        row.timeouts += 1
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Could not record run of job {job.name}: {e}")
+            finally:
+                db.session.remove()
+
+    # -------------------------
+    # Reads and manual runs
+    # -------------------------
+    def status(self):
+        """This worker's view: leadership and the jobs it is running"""
+        return {
+            'pid': os.getpid(),
+            'leader': self.is_leader,
+            'running': sorted(
+                name for name, job in self.jobs.items()
+                if job.thread is not None and job.thread.is_alive()
+            ),
+        }
+
+    def run_now(self, name):
+        """Run one job in the current app context (CLI); bypasses the schedule and the lock"""
+        job = self.jobs[name]
+        with job_deadline(job.timeout):
+            return job.fn()
+
+# Singleton instance
+scheduler = Scheduler()
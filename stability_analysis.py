@@ -0,0 +1,210 @@
+"""
+Fleet-wide fingerprint stability analysis.
+
+``fingerprint_stability`` is whatever number the client reports. This job
+measures stability on the server instead: every license's component set is
+compared, component by component, with the set last reported by the
+machine login with the same machine_id.
+
+Licenses are streamed in keyset chunks. Each distinct component set in a
+chunk is encoded once into a row of 64-bit value hashes (0 = component
+missing) and the comparisons run on NumPy arrays. The analysis takes two
+passes, so memory is bounded by the chunk size plus 8 bytes per license
+per identifying component:
+
+1. per-component change rates (how often cpu, gpu, disk_serial... differ
+   between a license and its machine's latest login), and the identifying
+   values (serials, MAC, BIOS UUID) found on more than one license;
+2. a stability score per license, where a change to a component that is
+   normally stable costs more than a change to one that churns across the
+   fleet, and the licenses in each reuse cluster.
+
+Results are written in bulk: ``licenses.stability_score`` per chunk,
+``fingerprint_component_stats`` and ``fingerprint_reuse`` (both replaced on
+every run).
+"""
+
+import hashlib
+import json
+import time
+import logging
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import update
+
+from models import (
+    db, License, MachineLogin, FingerprintComponentStat, FingerprintReuse,
+)
+from component_sets import load_components
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 20000
+# Component names tracked per run; payloads with more distinct keys are truncated
+MAX_COMPONENTS = 64
+# Hardware identities: one value should belong to one machine
+IDENTIFYING_COMPONENTS = ('motherboard_serial', 'disk_serial', 'bios_uuid', 'mac_address')
+MIN_CLUSTER_SIZE = 2
+# Values shared by more licenses than this are placeholders ("To be filled by O.E.M."), not reuse
+MAX_CLUSTER_SIZE = 1000
+
+
+class _Encoder:
+    """Component name -> array column, component set -> row of value hashes"""
+
+    def __init__(self):
+        self.columns = {}
+
+    def _column(self, name):
+        column = self.columns.get(name)
+        if column is None and len(self.columns) < MAX_COMPONENTS:
+            column = self.columns[name] = len(self.columns)
+        return column
+
+    @staticmethod
+    def _hash(value):
+        raw = value if isinstance(value, str) else json.dumps(value, sort_keys=True)
+        digest = int.from_bytes(hashlib.blake2b(raw.encode(), digest_size=8).digest(), 'little')
+        return digest or 1
+
+    def encode(self, payloads):
+        """({digest: row index}, matrix) for {digest: components}; row 0 is all-missing"""
+        index = {}
+        matrix = np.zeros((len(payloads) + 1, MAX_COMPONENTS), dtype=np.uint64)
+        for row, (digest, components) in enumerate(payloads.items(), 1):
+            index[digest] = row
+            # List payloads carry no component names to compare by
+            if not isinstance(components, dict):
+                continue
+            for name, value in components.items():
+                if value in (None, '', [], {}):
+                    continue
+                column = self._column(name)
+                if column is not None:
+                    matrix[row, column] = self._hash(value)
+        return index, matrix
+
+
+def _chunks(encoder, chunk_size):
+    """Yield (license pks, license_ids, license values, login values) per chunk"""
+    last_id = ''
+    while True:
+        rows = db.session.query(
+            License.id, License.license_id, License.components_hash, MachineLogin.components_hash
+        ).outerjoin(
+            MachineLogin, MachineLogin.machine_id == License.machine_id
+        ).filter(
+            License.license_id > last_id
+        ).order_by(License.license_id).limit(chunk_size).all()
+        if not rows:
+            return
+        last_id = rows[-1][1]
+
+        index, matrix = encoder.encode(load_components(
+            digest for row in rows for digest in row[2:]
+        ))
+        license_rows = np.fromiter((index.get(row[2], 0) for row in rows), dtype=np.intp, count=len(rows))
+        login_rows = np.fromiter((index.get(row[3], 0) for row in rows), dtype=np.intp, count=len(rows))
+        yield [row[0] for row in rows], [row[1] for row in rows], matrix[license_rows], matrix[login_rows]
+
+
+def _compare(licenses, logins):
+    """(observed, changed) boolean matrices: both sides report it / the values differ"""
+    observed = (licenses != 0) & (logins != 0)
+    return observed, observed & (licenses != logins)
+
+
+def analyze(chunk_size=DEFAULT_CHUNK_SIZE, min_cluster_size=MIN_CLUSTER_SIZE):
+    """Run both passes and write the results; returns a summary"""
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    encoder = _Encoder()
+
+    # Pass 1: fleet-wide change counts and candidate reuse values
+    observed_total = np.zeros(MAX_COMPONENTS, dtype=np.int64)
+    changed_total = np.zeros(MAX_COMPONENTS, dtype=np.int64)
+    identities = {name: [] for name in IDENTIFYING_COMPONENTS}
+    licenses = 0
+    for _, _, license_values, login_values in _chunks(encoder, chunk_size):
+        observed, changed = _compare(license_values, login_values)
+        observed_total += observed.sum(axis=0)
+        changed_total += changed.sum(axis=0)
+        for name, parts in identities.items():
+            column = encoder.columns.get(name)
+            if column is not None:
+                values = license_values[:, column]
+                parts.append(values[values != 0])
+        licenses += len(license_values)
+        # Read-only: end the transaction so no snapshot is held for the whole pass
+        db.session.rollback()
+
+    rates = np.divide(changed_total, observed_total, out=np.zeros(MAX_COMPONENTS), where=observed_total > 0)
+    # A change to a component that rarely changes is strong evidence of another machine
+    weights = np.where(observed_total > 0, 1.0 - rates, 0.0)
+
+    clusters = {}
+    for name, parts in identities.items():
+        if not parts:
+            continue
+        values, counts = np.unique(np.concatenate(parts), return_counts=True)
+        keep = (counts >= min_cluster_size) & (counts <= MAX_CLUSTER_SIZE)
+        if keep.any():
+            clusters[name] = (values[keep], counts[keep])
+    del identities
+
+    stats = [
+        {'component': name, 'observed': int(observed_total[column]), 'changed': int(changed_total[column]),
+         'change_rate': float(rates[column]), 'computed_at': now}
+        for name, column in encoder.columns.items()
+        if observed_total[column]
+    ]
+    db.session.execute(FingerprintComponentStat.__table__.delete())
+    if stats:
+        db.session.execute(FingerprintComponentStat.__table__.insert(), stats)
+    db.session.execute(FingerprintReuse.__table__.delete())
+    db.session.commit()
+
+    # Pass 2: per-license scores and cluster members, written chunk by chunk
+    scored = clustered = 0
+    for pks, license_ids, license_values, login_values in _chunks(encoder, chunk_size):
+        observed, changed = _compare(license_values, login_values)
+        possible = observed @ weights
+        lost = changed @ weights
+        scores = np.rint(100 * (1 - np.divide(lost, possible, out=np.zeros_like(lost), where=possible > 0)))
+        has_score = possible > 0
+
+        db.session.execute(update(License), [
+            {'id': pk, 'stability_score': int(score) if ok else None}
+            for pk, score, ok in zip(pks, scores, has_score)
+        ])
+        scored += int(has_score.sum())
+
+        members = []
+        for name, (values, counts) in clusters.items():
+            column = encoder.columns[name]
+            column_values = license_values[:, column]
+            for i in np.nonzero(np.isin(column_values, values))[0]:
+                members.append({
+                    'component': name,
+                    'value_hash': f"{int(column_values[i]):016x}",
+                    'license_id': license_ids[i],
+                    'cluster_size': int(counts[np.searchsorted(values, column_values[i])]),
+                    'detected_at': now,
+                })
+        if members:
+            db.session.execute(FingerprintReuse.__table__.insert(), members)
+        clustered += len(members)
+        db.session.commit()
+
+    summary = {
+        'licenses': licenses,
+        'scored': scored,
+        'components': {stat['component']: round(stat['change_rate'], 4) for stat in stats},
+        'clusters': sum(len(values) for values, _ in clusters.values()),
+        'clustered_licenses': clustered,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    logger.info(f"Stability analysis: {summary['scored']}/{licenses} licenses scored, "
+                f"{summary['clusters']} reuse clusters in {summary['elapsed_ms'] / 1000:.1f}s")
+    return summary
@@ -0,0 +1,142 @@
+"""
+Per-route database latency budgets.
+
+Every request gets the statement budget of its blueprint
+(STATEMENT_TIMEOUTS_MS, e.g. 200 ms for ``subscriptions``, 5 s for
+``admin``). When the session begins a transaction the budget is applied to
+that connection: ``SET LOCAL statement_timeout`` on Postgres (reset by the
+server when the transaction ends), a progress-handler interrupt on SQLite
+(removed when the connection goes back to the pool). A statement that runs
+over is cancelled, so one slow admin search cannot hold a pool connection
+while license checks queue behind it; the request is answered with a 503
+and counted per endpoint (see /health/db).
+
+Scheduled jobs run outside requests under ``job_deadline(seconds)``: each
+transaction they begin gets the time left before the deadline as its
+budget, so a job's statements are cancelled once it overruns.
+"""
+
+import threading
+import time
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from db_routing import RoutingSession
+
+logger = logging.getLogger(__name__)
+
+PG_QUERY_CANCELED = "57014"
+SQLITE_PROGRESS_OPS = 1000  # VM instructions between deadline checks
+
+_lock = threading.Lock()
+_timeouts = Counter()  # endpoint -> cancelled requests
+_job = threading.local()  # deadline of the scheduled job on this thread
+
+
+def current_budget_ms():
+    """Statement budget of the current request (or time left of the current job) in ms, or None"""
+    if not has_request_context():
+        deadline = getattr(_job, 'deadline', None)
+        if deadline is None:
+            return None
+        return max((deadline - time.monotonic()) * 1000, 1)
+    return g.get('statement_budget_ms')
+
+
+@contextmanager
+def job_deadline(seconds):
+    """Bound the database work of a job on this thread to `seconds`"""
+    _job.deadline = time.monotonic() + seconds
+    try:
+        yield
+    finally:
+        _job.deadline = None
+
+
+def timeout_counts():
+    with _lock:
+        return dict(_timeouts)
+
+
+# =========================
+# Applying the budget
+# =========================
+@event.listens_for(RoutingSession, "after_begin")
+def _apply_budget(session, transaction, connection):
+    budget = current_budget_ms()
+    if not budget:
+        return
+
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(budget)}")
+    elif dialect == 'sqlite':
+        info = connection.info
+        info['statement_budget'] = budget / 1000
+        connection.connection.driver_connection.set_progress_handler(
+            lambda: _sqlite_overdue(info), SQLITE_PROGRESS_OPS
+        )
+
+
+def _sqlite_overdue(info):
+    deadline = info.get('statement_deadline')
+    return 1 if deadline is not None and time.monotonic() > deadline else 0
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_clock(conn, cursor, statement, parameters, context, executemany):
+    budget = conn.info.get('statement_budget')
+    if budget is not None:
+        conn.info['statement_deadline'] = time.monotonic() + budget
+
+
+@event.listens_for(Pool, "checkin")
+def _clear_budget(dbapi_connection, connection_record):
+    if connection_record.info.pop('statement_budget', None) is None:
+        return
+    connection_record.info.pop('statement_deadline', None)
+    if dbapi_connection is not None:
+        dbapi_connection.set_progress_handler(None, 0)
+
+
+@event.listens_for(Engine, "handle_error")
+def _detect_timeout(context):
+    if not has_request_context():
+        return
+    orig = context.original_exception
+    if getattr(orig, 'pgcode', None) == PG_QUERY_CANCELED or str(orig) == 'interrupted':
+        g.statement_timed_out = True
+
+
+# =========================
+# Flask hooks
+# =========================
+def setup_statement_budgets(app):
+    budgets = app.config.get('STATEMENT_TIMEOUTS_MS', {})
+    default = app.config.get('STATEMENT_TIMEOUT_DEFAULT_MS', 0)
+
+    @app.before_request
+    def set_budget():
+        g.statement_budget_ms = budgets.get(request.blueprint, default)
+
+    @app.after_request
+    def timeout_to_503(response):
+        # Views catch the error and return 500; the handle_error hook tells us why
+        if not g.get('statement_timed_out') or response.status_code < 500:
+            return response
+
+        endpoint = request.endpoint or 'unknown'
+        with _lock:
+            _timeouts[endpoint] += 1
+        logger.warning(f"Statement budget of {g.statement_budget_ms}ms exceeded on {endpoint}")
+
+        busy = jsonify({'error': 'Service busy, please retry'})
+        busy.status_code = 503
+        busy.headers['Retry-After'] = '1'
+        return busy
@@ -0,0 +1,143 @@
+"""
+Response content negotiation for the desktop client API.
+
+Views keep calling ``jsonify``. The app's JSON provider renders datetimes as
+ISO 8601 and UUIDs as strings, and remembers the Python payload on the
+response. For the blueprints in NEGOTIATED_BLUEPRINTS an after_request hook
+re-encodes that payload as MessagePack or CBOR when the client prefers it
+(``Accept: application/msgpack`` / ``application/cbor``), using the
+formats' native datetime and UUID types:
+
+* MessagePack: datetimes are the Timestamp extension (type -1), UUIDs are
+  extension type 37 holding the 16 raw bytes.
+* CBOR: datetimes are tag 1 (epoch seconds), UUIDs are tag 37.
+
+JSON stays the default; a format whose library is not installed is simply
+not offered.
+"""
+
+import uuid
+from datetime import date, datetime, timezone
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+NEGOTIATED_BLUEPRINTS = {'auth', 'subscriptions'}
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CBOR = 'application/cbor'
+ALIASES = {'application/x-msgpack': MSGPACK}
+
+UUID_EXT = 37
+
+
+def _wire_default(o):
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    return DefaultJSONProvider.default(o)
+
+
+class WireJSONProvider(DefaultJSONProvider):
+    """JSON with ISO datetimes; keeps the payload so it can be re-encoded"""
+
+    default = staticmethod(_wire_default)
+
+    def response(self, *args, **kwargs):
+        response = super().response(*args, **kwargs)
+        response.wire_payload = self._prepare_response_obj(args, kwargs)
+        return response
+
+
+# =========================
+# Encoders
+# =========================
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _utc(value):
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _encode_msgpack(payload):
+    import msgpack
+
+    def default(o):
+        if isinstance(o, datetime):
+            # Exact: Timestamp.from_datetime goes through a float and loses microseconds
+            delta = _utc(o) - EPOCH
+            return msgpack.Timestamp(delta.days * 86400 + delta.seconds, delta.microseconds * 1000)
+        if isinstance(o, date):
+            return o.isoformat()
+        if isinstance(o, uuid.UUID):
+            return msgpack.ExtType(UUID_EXT, o.bytes)
+        raise TypeError(f"Cannot encode {type(o).__name__}")
+
+    return msgpack.packb(payload, default=default, use_bin_type=True)
+
+
+def _encode_cbor(payload):
+    import cbor2
+    return cbor2.dumps(payload, datetime_as_timestamp=True, timezone=timezone.utc)
+
+
+def available_formats():
+    """Mimetypes this process can produce, JSON first"""
+    formats = [JSON]
+    try:
+        import msgpack  # noqa: F401
+        formats.append(MSGPACK)
+    except ImportError:
+        pass
+    try:
+        import cbor2  # noqa: F401
+        formats.append(CBOR)
+    except ImportError:
+        pass
+    return formats
+
+
+ENCODERS = {MSGPACK: _encode_msgpack, CBOR: _encode_cbor}
+
+
+def preferred_format(accept, formats):
+    """Best of `formats` for an Accept header; JSON wins ties and wildcards"""
+    offered = formats + [alias for alias, target in ALIASES.items() if target in formats]
+    best = accept.best_match(offered, default=JSON)
+    return ALIASES.get(best, best)
+
+
+# =========================
+# Flask hook
+# =========================
+def setup_wire_format(app):
+    app.json = WireJSONProvider(app)
+    formats = available_formats()
+    if len(formats) == 1:
+        return
+
+    @app.after_request
+    def negotiate(response):
+        if request.blueprint not in NEGOTIATED_BLUEPRINTS:
+            return response
+
+        response.vary.add('Accept')
+        if response.mimetype != JSON or response.direct_passthrough:
+            return response
+
+        mimetype = preferred_format(request.accept_mimetypes, formats)
+        if mimetype == JSON:
+            return response
+
+        # Replayed (idempotent) responses only have the stored JSON body
+        payload = getattr(response, 'wire_payload', None)
+        if payload is None:
+            payload = response.get_json(silent=True)
+            if payload is None:
+                return response
+
+        response.set_data(ENCODERS[mimetype](payload))
+        response.mimetype = mimetype
+        return response